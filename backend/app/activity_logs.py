@@ -1,9 +1,13 @@
 from fastapi import FastAPI, Request
+from collections import deque
 from datetime import datetime
+import os
 
 app = FastAPI()
 
-activity_logs = []
+# Only the most recent entries are kept; the list used to grow for the life of the worker.
+ACTIVITY_LOG_LIMIT = int(os.getenv("ACTIVITY_LOG_LIMIT", "1000"))
+activity_logs = deque(maxlen=ACTIVITY_LOG_LIMIT)
 
 @app.post("/log_activity")
 async def log_activity(request: Request):
@@ -18,4 +22,4 @@ async def log_activity(request: Request):
 
 @app.get("/get_logs")
 async def get_logs():
-    return {"logs": activity_logs}
\ No newline at end of file
+    return {"logs": list(activity_logs)}
\ No newline at end of file
@@ -1,6 +1,11 @@
 import base64
+import copy
 import hashlib
-from typing import Optional, Tuple, Dict, Any
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple, Dict, Any, List
 
 from algosdk.v2client import algod
 from algosdk import encoding
@@ -16,6 +21,9 @@ except Exception:
         future_txn = None
 
 from .config import settings
+from .metrics import cache_events, stage_timer
+
+logger = logging.getLogger(__name__)
 
 
 def _parse_headers(raw: str | None) -> dict:
@@ -44,7 +52,7 @@ def _parse_headers(raw: str | None) -> dict:
     return headers
 
 
-def get_algod_client() -> algod.AlgodClient:
+def _client_config() -> tuple:
     address = settings.ALGOD_ADDRESS or settings.ALGOD_URL
     if not address:
         raise RuntimeError("Algod address not configured: set ALGOD_ADDRESS or ALGOD_URL in .env")
@@ -52,14 +60,93 @@ def get_algod_client() -> algod.AlgodClient:
     raw_headers = _parse_headers(settings.ALGOD_HEADER_KV)
     # Sanitize headers: never override Content-Type so SDK can send application/x-binary for raw txns
     headers = {k: v for k, v in raw_headers.items() if k.lower() not in ("content-type", "content_type")}
-    try:
-        if raw_headers and raw_headers != headers:
-            removed = [k for k in raw_headers.keys() if k.lower() in ("content-type", "content_type")]
-            print(f"[ALGOD CLIENT] Removed custom Content-Type from ALGOD_HEADER_KV: {removed}")
-        print(f"[ALGOD CLIENT] Using headers keys: {list(headers.keys())}")
-    except Exception:
-        pass
-    return algod.AlgodClient(token, address, headers)
+    return address, token, raw_headers, headers
+
+
+class AlgodService:
+    """Process-wide algod access: one client plus short-lived caches.
+
+    - client: built once per configuration (header diagnostics print only then)
+    - suggested_params(): cached for PARAMS_TTL_SECONDS (about one round); each
+      caller gets its own copy so it can tweak fee fields freely
+    - last_round(): last round seen by either a params fetch or status(), cached
+      for the same TTL
+    """
+
+    PARAMS_TTL_SECONDS = float(os.getenv("ALGOD_PARAMS_TTL_SECONDS", "3.0"))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._config = None
+        self._params = None
+        self._params_at = 0.0
+        self._round = None
+        self._round_at = 0.0
+
+    @property
+    def client(self) -> algod.AlgodClient:
+        address, token, raw_headers, headers = _client_config()
+        config = (address, token, tuple(sorted(headers.items())))
+        client = self._client
+        if client is not None and config == self._config:
+            return client
+        with self._lock:
+            if self._client is None or config != self._config:
+                try:
+                    if raw_headers and raw_headers != headers:
+                        removed = [k for k in raw_headers.keys() if k.lower() in ("content-type", "content_type")]
+                        logger.debug("Removed custom Content-Type from ALGOD_HEADER_KV: %s", removed)
+                    logger.debug("Using algod header keys: %s", list(headers.keys()))
+                except Exception:
+                    pass
+                self._client = algod.AlgodClient(token, address, headers)
+                self._config = config
+                self._params = None
+                self._round = None
+            return self._client
+
+    def suggested_params(self):
+        now = time.monotonic()
+        params = self._params
+        if params is None or now - self._params_at > self.PARAMS_TTL_SECONDS:
+            client = self.client
+            with self._lock:
+                if self._params is None or time.monotonic() - self._params_at > self.PARAMS_TTL_SECONDS:
+                    cache_events.inc("algod_params", "miss")
+                    with stage_timer("algod"):
+                        self._params = client.suggested_params()
+                    self._params_at = time.monotonic()
+                    # /v2/transactions/params reports the node's last round as `first`
+                    if getattr(self._params, "first", None):
+                        self._round, self._round_at = int(self._params.first), self._params_at
+                params = self._params
+        else:
+            cache_events.inc("algod_params", "hit")
+        return copy.copy(params)
+
+    def last_round(self) -> int:
+        now = time.monotonic()
+        if self._round is None or now - self._round_at > self.PARAMS_TTL_SECONDS:
+            with stage_timer("algod"):
+                status = self.client.status()
+            current_round = status.get("last-round") or status.get("lastRound") or 0
+            with self._lock:
+                self._round, self._round_at = int(current_round), time.monotonic()
+        return self._round
+
+    def invalidate(self) -> None:
+        """Drop cached params/round (e.g. after the node rejected a txn as expired)."""
+        with self._lock:
+            self._params = None
+            self._round = None
+
+
+algod_service = AlgodService()
+
+
+def get_algod_client() -> algod.AlgodClient:
+    return algod_service.client
 
 
 def send_raw_transaction_bytes(signed_bytes: bytes) -> str:
@@ -117,6 +204,38 @@ def hex_to_bytes(h: str) -> bytes:
     return bytes.fromhex(h)
 
 
+# Protocol limits: at most 16 transactions per atomic group and at most 8 foreign
+# references (accounts + assets + apps + boxes) per app call. Box references are
+# shared by every app call in the group, so they can be spread across it.
+MAX_GROUP_SIZE = 16
+MAX_BOX_REFS_PER_TXN = 8
+
+
+def _register_args(sender: str, sha256_hex: str, cid: str, nonce_str: Optional[str]):
+    """App args and (media_key, reg_key) for one ProofChain register call."""
+    H = hex_to_bytes(sha256_hex)
+    media_key = compute_media_key(H)
+    if nonce_str is None:
+        # Fallback to sender+round using the cached current round; caller may override.
+        current_round = algod_service.last_round()
+        nonce_bytes = (sender.encode("utf-8") + int(current_round).to_bytes(8, "big"))
+    else:
+        nonce_bytes = nonce_str.encode("utf-8")
+    reg_key = compute_reg_key(media_key, nonce_bytes)
+
+    app_args = [
+        b"register",
+        H,
+        cid.encode("utf-8"),
+        nonce_bytes,
+    ]
+    return app_args, media_key, reg_key
+
+
+def _txn_b64(txn) -> str:
+    return base64.b64encode(encoding.msgpack_encode(txn).encode("utf-8")).decode("utf-8")
+
+
 def build_register_app_call(
     sender: str,
     app_id: int,
@@ -137,28 +256,8 @@ def build_register_app_call(
     Returns:
         (txn_dict, txn_b64, media_key, reg_key)
     """
-    client = get_algod_client()
-    params = client.suggested_params()
-
-    H = hex_to_bytes(sha256_hex)
-    media_key = compute_media_key(H)
-    if nonce_str is None:
-        # Fallback to sender+round by querying the current round; caller may override.
-        status = client.status()
-        current_round = status.get("last-round") or status.get("lastRound")
-        if current_round is None:
-            current_round = 0
-        nonce_bytes = (sender.encode("utf-8") + int(current_round).to_bytes(8, "big"))
-    else:
-        nonce_bytes = nonce_str.encode("utf-8")
-    reg_key = compute_reg_key(media_key, nonce_bytes)
-
-    app_args = [
-        b"register",
-        H,
-        cid.encode("utf-8"),
-        nonce_bytes,
-    ]
+    params = algod_service.suggested_params()
+    app_args, media_key, reg_key = _register_args(sender, sha256_hex, cid, nonce_str)
 
     # Boxes must be declared to access/create them in the app call
     boxes = [(app_id, media_key), (app_id, reg_key)]
@@ -173,5 +272,95 @@ def build_register_app_call(
 
     # Return dict and base64 msgpack for client-side signing
     txn_dict = txn.dictify()
-    txn_b64 = base64.b64encode(encoding.msgpack_encode(txn).encode("utf-8")).decode("utf-8")
+    txn_b64 = _txn_b64(txn)
     return txn_dict, txn_b64, media_key, reg_key
+
+
+def build_register_app_group(
+    sender: str,
+    app_id: int,
+    items: List[Tuple[str, str, Optional[str]]],
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Build up to MAX_GROUP_SIZE register app calls as one atomic group.
+
+    Args:
+        sender: Wallet address that will sign every transaction in the group.
+        app_id: Deployed PyTeal application id.
+        items: (sha256_hex, cid, nonce_str) per registration.
+
+    Each call needs two box references (media key and reg key). Box references
+    are available to every call in the group, so they are packed
+    MAX_BOX_REFS_PER_TXN per transaction starting from the first call; later
+    calls carry none.
+
+    Returns:
+        (entries, group_id_b64) where each entry is
+        {"txn", "txn_b64", "media_key", "reg_key"} in group order.
+    """
+    if not items:
+        raise ValueError("At least one item is required")
+    if len(items) > MAX_GROUP_SIZE:
+        raise ValueError(f"At most {MAX_GROUP_SIZE} registrations fit in one atomic group")
+
+    params = algod_service.suggested_params()
+    built = [_register_args(sender, sha256_hex, cid, nonce_str) for sha256_hex, cid, nonce_str in items]
+    reg_keys = [reg_key for _, _, reg_key in built]
+    if len(set(reg_keys)) != len(reg_keys):
+        # Identical calls would also hash to the same txid and be rejected by algod.
+        raise ValueError("Duplicate registration in group (same content and nonce)")
+
+    box_refs = []
+    for _, media_key, reg_key in built:
+        for key in (media_key, reg_key):
+            if (app_id, key) not in box_refs:
+                box_refs.append((app_id, key))
+    if len(box_refs) > MAX_BOX_REFS_PER_TXN * len(built):
+        raise ValueError("Too many box references for the group size")
+
+    txns = []
+    for i, (app_args, _, _) in enumerate(built):
+        boxes = box_refs[i * MAX_BOX_REFS_PER_TXN:(i + 1) * MAX_BOX_REFS_PER_TXN]
+        txns.append(future_txn.ApplicationNoOpTxn(
+            sender=sender,
+            sp=params,
+            index=app_id,
+            app_args=app_args,
+            boxes=boxes or None,
+        ))
+    txns = future_txn.assign_group_id(txns)
+
+    entries = [
+        {
+            "txn": txn.dictify(),
+            "txn_b64": _txn_b64(txn),
+            "media_key": media_key.hex(),
+            "reg_key": reg_key.hex(),
+        }
+        for txn, (_, media_key, reg_key) in zip(txns, built)
+    ]
+    group_id_b64 = base64.b64encode(txns[0].group).decode("utf-8")
+    return entries, group_id_b64
+
+
+def decode_signed_group(signed_b64_list: List[str]) -> Tuple[bytes, List[str], Optional[str]]:
+    """Validate a signed atomic group and concatenate it for a single submission.
+
+    Returns (raw_bytes, txids, group_id_b64). Raises ValueError when the
+    transactions do not all carry the same group id.
+    """
+    raw = b""
+    txids = []
+    groups = set()
+    for b64 in signed_b64_list:
+        stx = encoding.msgpack_decode(b64)
+        txn = getattr(stx, "transaction", None)
+        if txn is None:
+            raise ValueError("Expected signed transactions")
+        groups.add(txn.group)
+        txids.append(stx.get_txid())
+        raw += base64.b64decode(b64)
+    if len(groups) != 1 or None in groups:
+        raise ValueError("All transactions must belong to the same atomic group")
+    group = groups.pop()
+    return raw, txids, base64.b64encode(group).decode("utf-8") if group else None
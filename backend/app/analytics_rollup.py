@@ -0,0 +1,399 @@
+"""Event-driven analytics rollups for /api/analytics and /api/user-stats.
+
+Registry appends and classify outcomes are folded into per-hour and per-day
+counters as they happen; distinct signers per day are tracked with a small
+HyperLogLog sketch. Queries only touch the buckets inside the requested range,
+never the registry itself.
+
+The store is persisted to ``data/analytics_rollup.json`` and shared by all
+workers: each one merges its own events into the file under a lock, from a
+background thread, so neither the classify path nor the registry writers wait on
+disk. On first start (no store yet) it is seeded from the existing registry
+using each record's ``registered_at`` (or ``generation_time`` for older rows);
+upload counts are recounted the same way after a registry rewrite.
+"""
+import atexit
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from . import registry
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; single-worker there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FILE = registry.DATA_PATH / "analytics_rollup.json"
+
+# Hourly buckets older than this are dropped on flush; daily buckets are kept.
+HOURLY_RETENTION_DAYS = 14
+# Seconds the background flusher waits after an event before persisting.
+FLUSH_INTERVAL_SECONDS = 5.0
+
+CLASSIFY_STATUSES = ("exact_registered", "derivative", "unregistered")
+
+
+class HyperLogLog:
+    """Minimal HyperLogLog cardinality sketch (2**p one-byte registers)."""
+
+    def __init__(self, p: int = 10, registers: bytes | None = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        idx = x >> (64 - self.p)
+        rest = (x << self.p) & 0xFFFFFFFFFFFFFFFF
+        rank = min(64 - rest.bit_length(), 64 - self.p) + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        regs = self.registers
+        for i, r in enumerate(other.registers):
+            if r > regs[i]:
+                regs[i] = r
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_b64(self) -> str:
+        return base64.b64encode(bytes(self.registers)).decode("ascii")
+
+    @classmethod
+    def from_b64(cls, data: str, p: int = 10) -> "HyperLogLog":
+        return cls(p, base64.b64decode(data))
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_when(value) -> datetime | None:
+    if not value or not isinstance(value, str):
+        return None
+    text = value.strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        when = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc)
+
+
+def _new_counters() -> dict:
+    counters = {"uploads": 0, "verifications": 0}
+    for status in CLASSIFY_STATUSES:
+        counters[f"classify_{status}"] = 0
+    return counters
+
+
+class _Buckets:
+    """Hourly/daily counters, per-day signer sketches and running totals."""
+
+    def __init__(self):
+        self.hourly: dict[int, dict] = {}
+        self.daily: dict[str, dict] = {}
+        self.daily_signers: dict[str, HyperLogLog] = {}
+        self.totals: dict = {}
+
+    def bump(self, when: datetime, name: str) -> None:
+        hour = int(when.timestamp() // 3600)
+        day = when.date().isoformat()
+        self.hourly.setdefault(hour, _new_counters())[name] += 1
+        self.daily.setdefault(day, _new_counters())[name] += 1
+        self.totals[name] = self.totals.get(name, 0) + 1
+
+    def add_registration(self, record: dict, when: datetime) -> None:
+        self.bump(when, "uploads")
+        signer = record.get("signer_address")
+        if signer:
+            day = when.date().isoformat()
+            self.daily_signers.setdefault(day, HyperLogLog()).add(str(signer).upper())
+
+    def merge(self, other: "_Buckets", skip: tuple = ()) -> None:
+        """Add `other`'s counters (except the names in `skip`) and union its sketches."""
+        for mine, theirs in ((self.hourly, other.hourly), (self.daily, other.daily)):
+            for key, counters in theirs.items():
+                row = mine.setdefault(key, _new_counters())
+                for name, n in counters.items():
+                    if name not in skip:
+                        row[name] = row.get(name, 0) + n
+        for name, n in other.totals.items():
+            if name not in skip:
+                self.totals[name] = self.totals.get(name, 0) + n
+        if "uploads" not in skip:
+            for day, hll in other.daily_signers.items():
+                self.daily_signers.setdefault(day, HyperLogLog()).merge(hll)
+
+    def replace_uploads(self, seeded: "_Buckets") -> None:
+        """Take upload counters and signer sketches from `seeded`, keeping everything else."""
+        for mine, theirs in ((self.hourly, seeded.hourly), (self.daily, seeded.daily)):
+            for row in mine.values():
+                row["uploads"] = 0
+            for key, counters in theirs.items():
+                mine.setdefault(key, _new_counters())["uploads"] = counters["uploads"]
+        self.totals["uploads"] = seeded.totals.get("uploads", 0)
+        self.daily_signers = seeded.daily_signers
+
+    def trim_hourly(self, cutoff: int) -> None:
+        self.hourly = {h: c for h, c in self.hourly.items() if h >= cutoff}
+
+    def to_json(self) -> dict:
+        return {
+            "hourly": {str(h): c for h, c in self.hourly.items()},
+            "daily": self.daily,
+            "daily_signers": {day: hll.to_b64() for day, hll in self.daily_signers.items()},
+            "totals": self.totals,
+        }
+
+    @classmethod
+    def from_json(cls, raw: dict) -> "_Buckets":
+        buckets = cls()
+        buckets.hourly = {int(k): v for k, v in raw.get("hourly", {}).items()}
+        buckets.daily = raw.get("daily", {})
+        buckets.daily_signers = {
+            day: HyperLogLog.from_b64(b64) for day, b64 in raw.get("daily_signers", {}).items()
+        }
+        buckets.totals = {**_new_counters(), **raw.get("totals", {})}
+        return buckets
+
+
+def _seed_from_registry() -> _Buckets:
+    seeded = _Buckets()
+    seeded.totals = _new_counters()
+    for item in registry.snapshot().records:
+        if isinstance(item, dict):
+            when = _parse_when(item.get("registered_at")) or _parse_when(item.get("generation_time"))
+            if when is not None:
+                seeded.add_registration(item, when)
+    return seeded
+
+
+class AnalyticsRollup:
+    """Rollup store shared by every worker through the JSON file.
+
+    Each worker serves queries from its last merged view plus its own pending
+    events. Events are kept as a separate delta that a background thread folds
+    into the file under an exclusive ``flock`` (re-reading whatever the other
+    workers wrote), so concurrent workers add up instead of overwriting each
+    other. A registry "reset" (records rewritten rather than appended) makes the
+    next flush recount uploads and signers from the registry.
+    """
+
+    def __init__(self, path=ROLLUP_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._view = _Buckets()
+        self._pending = _Buckets()
+        self._dirty = False
+        self._rebuild_uploads = False
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- loading / persistence ---
+
+    def _read_store(self) -> _Buckets | None:
+        if not self.path.exists():
+            return None
+        try:
+            return _Buckets.from_json(json.loads(self.path.read_text()))
+        except Exception as e:
+            logger.warning("Failed to load rollup store, reseeding from registry: %s", e)
+            return None
+
+    def _ensure_loaded(self) -> bool:
+        """Load the store; seed from the registry when no store exists yet.
+
+        Returns True when the registry was used as the seed (it then already
+        contains any record being appended right now).
+        """
+        if self._loaded:
+            return False
+        self._loaded = True
+        stored = self._read_store()
+        if stored is not None:
+            self._view = stored
+            return False
+        self._view = _seed_from_registry()
+        self._rebuild_uploads = True
+        self._mark_dirty()
+        return True
+
+    def _file_lock(self):
+        lock_path = self.path.with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(lock_path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def flush(self) -> None:
+        """Merge this worker's pending events into the store file."""
+        with self._lock:
+            if not self._dirty:
+                return
+            pending, self._pending = self._pending, _Buckets()
+            rebuild, self._rebuild_uploads = self._rebuild_uploads, False
+            self._dirty = False
+        try:
+            handle = self._file_lock()
+            try:
+                merged = self._read_store()
+                if merged is None:
+                    merged, rebuild = _Buckets(), True
+                    merged.totals = _new_counters()
+                if rebuild:
+                    # The registry already contains every pending upload.
+                    merged.replace_uploads(_seed_from_registry())
+                    merged.merge(pending, skip=("uploads",))
+                else:
+                    merged.merge(pending)
+                merged.trim_hourly(int(_utc_now().timestamp() // 3600) - HOURLY_RETENTION_DAYS * 24)
+                tmp = self.path.with_suffix(f".json.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(merged.to_json()))
+                os.replace(tmp, self.path)
+            finally:
+                handle.close()
+        except Exception as e:
+            logger.error("Failed to persist rollup store: %s", e)
+            with self._lock:
+                pending.merge(self._pending)
+                self._pending = pending
+                self._rebuild_uploads |= rebuild
+                self._dirty = True
+            return
+        with self._lock:
+            # Events that arrived during the merge stay pending and visible.
+            merged.merge(self._pending)
+            self._view = merged
+
+    def _start_flusher(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name="analytics-rollup-flush", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._wakeup.wait()
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            self.flush()
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        self._start_flusher()
+        self._wakeup.set()
+
+    # --- event ingestion ---
+
+    def on_registry_change(self, event: str, records, snapshot) -> None:
+        with self._lock:
+            if self._ensure_loaded():
+                return
+            if event == "append":
+                for record in records:
+                    if isinstance(record, dict):
+                        when = _parse_when(record.get("registered_at")) or _utc_now()
+                        self._view.add_registration(record, when)
+                        self._pending.add_registration(record, when)
+            elif event == "update":
+                # Records were only updated in place; upload counts are unchanged.
+                return
+            else:
+                self._rebuild_uploads = True
+            self._mark_dirty()
+
+    def record_classification(self, status: str) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            when = _utc_now()
+            names = ["verifications"]
+            if status in CLASSIFY_STATUSES:
+                names.append(f"classify_{status}")
+            for name in names:
+                self._view.bump(when, name)
+                self._pending.bump(when, name)
+            self._mark_dirty()
+
+    # --- queries ---
+
+    def daily_series(self, start: date, end: date) -> list[dict]:
+        with self._lock:
+            self._ensure_loaded()
+            out = []
+            day = start
+            while day <= end:
+                key = day.isoformat()
+                row = {"date": key, **_new_counters()}
+                row.update(self._view.daily.get(key, {}))
+                out.append(row)
+                day += timedelta(days=1)
+            return out
+
+    def hourly_series(self, start: datetime, end: datetime) -> list[dict]:
+        with self._lock:
+            self._ensure_loaded()
+            out = []
+            first = int(start.timestamp() // 3600)
+            last = int(end.timestamp() // 3600)
+            for hour in range(first, last + 1):
+                row = {"hour": datetime.fromtimestamp(hour * 3600, timezone.utc).isoformat(), **_new_counters()}
+                row.update(self._view.hourly.get(hour, {}))
+                out.append(row)
+            return out
+
+    def _union_signers(self, predicate) -> HyperLogLog:
+        merged = HyperLogLog()
+        for day, hll in self._view.daily_signers.items():
+            if predicate(day):
+                merged.merge(hll)
+        return merged
+
+    def engagement(self, start: date, end: date) -> dict:
+        """Distinct signers in range, split into first-seen (new) and returning."""
+        start_key, end_key = start.isoformat(), end.isoformat()
+        with self._lock:
+            self._ensure_loaded()
+            active = self._union_signers(lambda d: start_key <= d <= end_key).count()
+            before = self._union_signers(lambda d: d < start_key).count()
+            through_end = self._union_signers(lambda d: d <= end_key).count()
+        new_users = max(0, min(active, through_end - before))
+        return {
+            "active_users": active,
+            "new_users": new_users,
+            "returning_users": active - new_users,
+        }
+
+    def totals(self) -> dict:
+        with self._lock:
+            self._ensure_loaded()
+            totals = dict(self._view.totals)
+            totals["signers"] = self._union_signers(lambda d: True).count()
+            return totals
+
+
+analytics_rollup = AnalyticsRollup()
+registry.subscribe(analytics_rollup.on_registry_change)
+atexit.register(analytics_rollup.flush)
@@ -0,0 +1,212 @@
+"""Admission control for expensive routes.
+
+Sync endpoints share one threadpool per worker, so a burst of classifications
+can occupy every thread and stall cheap reads like ``/media/tx_status``. Routes
+are grouped into classes (ROUTE_CLASSES) and each class is a bulkhead: at most
+``limit`` of its requests run at once, up to ``queue`` more wait on the event
+loop (not in a thread) for at most ``max_wait`` seconds, and anything beyond
+that is shed straight away with 503 and a Retry-After estimate. Unlisted routes
+are not limited.
+
+Waiters are served by lane: ``interactive`` (the default) before ``batch``.
+Callers doing bulk work mark themselves with ``X-Priority: batch``; the batch
+lane may only fill half of a class's queue so it cannot crowd out interactive
+callers.
+
+Limits are per worker process (they protect that worker's threadpool) and are
+set with BULKHEADS, e.g. ``ml=4/16/5,write=8/32/10`` (limit/queue/max_wait).
+Queue times, shed counts and occupancy are exported through /metrics.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+
+from .metrics import Counter, Gauge, Histogram
+
+LANES = ("interactive", "batch")
+
+# class -> (limit, queue, max_wait seconds)
+DEFAULT_CLASSES = {
+    "ml": (4, 16, 5.0),
+    "write": (8, 32, 10.0),
+}
+ROUTE_CLASSES = {
+    "/media/classify": "ml",
+    "/media/search_similar": "ml",
+    "/media/remove_watermark": "ml",
+    "/media/generate": "ml",
+    "/ai/generate": "ml",
+    "/media/register": "write",
+    "/media/register_debug": "write",
+    "/media/upload": "write",
+    "/media/server_pay": "write",
+    "/media/broadcast_signed_tx": "write",
+    "/media/broadcast_signed_app_tx": "write",
+    "/media/broadcast_signed_group": "write",
+}
+
+queue_seconds = Histogram(
+    "proofchain_bulkhead_queue_seconds", "Time admitted requests waited for a bulkhead slot", ("class", "lane"))
+shed_total = Counter(
+    "proofchain_bulkhead_shed_total", "Requests rejected by a bulkhead", ("class", "lane", "reason"))
+in_flight = Gauge("proofchain_bulkhead_in_flight", "Requests running per bulkhead", ("class",))
+queued = Gauge("proofchain_bulkhead_queued", "Requests waiting per bulkhead", ("class",))
+
+
+def _parse_classes(raw: str | None) -> dict[str, tuple[int, int, float]]:
+    classes = dict(DEFAULT_CLASSES)
+    for part in (raw or "").split(","):
+        name, _, spec = part.partition("=")
+        if not name.strip() or not spec.strip():
+            continue
+        try:
+            limit, queue, max_wait = spec.split("/")
+            classes[name.strip()] = (max(1, int(limit)), max(0, int(queue)), max(0.0, float(max_wait)))
+        except ValueError:
+            pass
+    return classes
+
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    """Concurrency limit with a bounded, two-lane FIFO wait queue.
+
+    Only touched from the event loop thread, so no locking. A released slot is
+    handed directly to the next waiter rather than returned to the pool.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, max_wait: float):
+        self.name, self.limit, self.queue, self.max_wait = name, limit, queue, max_wait
+        self.active = 0
+        self._waiters = {lane: deque() for lane in LANES}
+        self._service_ewma = 1.0
+        self._stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0}
+
+    def waiting(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+    def retry_after(self) -> float:
+        # Time for the current backlog to drain at the observed service rate.
+        return self._service_ewma * (self.waiting() + 1) / self.limit
+
+    def _publish(self) -> None:
+        in_flight.set(self.active, self.name)
+        queued.set(self.waiting(), self.name)
+
+    async def acquire(self, lane: str) -> float:
+        """Wait for a slot; returns the time spent queued or raises Shed."""
+        if self.active < self.limit and not self.waiting():
+            self.active += 1
+            self._stats["admitted"] += 1
+            self._publish()
+            return 0.0
+        room = self.queue if lane == "interactive" else self.queue // 2
+        if self.waiting() >= room or self.max_wait <= 0:
+            self._stats["shed_queue_full"] += 1
+            raise Shed("queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        self._stats["queued"] += 1
+        self._publish()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived as we gave up; pass it on.
+                self.release()
+            else:
+                try:
+                    self._waiters[lane].remove(waiter)
+                except ValueError:
+                    pass
+                self._publish()
+            if isinstance(e, asyncio.TimeoutError):
+                self._stats["shed_timeout"] += 1
+                raise Shed("timeout", self.retry_after()) from None
+            raise
+        self._stats["admitted"] += 1
+        return time.perf_counter() - started
+
+    def release(self, service_seconds: float | None = None) -> None:
+        if service_seconds is not None:
+            self._service_ewma += 0.2 * (service_seconds - self._service_ewma)
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self._publish()
+                    return
+        self.active -= 1
+        self._publish()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "max_wait_s": self.max_wait,
+            "active": self.active,
+            "waiting": {lane: len(w) for lane, w in self._waiters.items()},
+            "service_ewma_ms": round(self._service_ewma * 1000, 1),
+            **self._stats,
+        }
+
+
+bulkheads = {name: Bulkhead(name, *spec) for name, spec in _parse_classes(os.getenv("BULKHEADS")).items()}
+
+
+def stats() -> dict:
+    return {name: bulkhead.stats() for name, bulkhead in bulkheads.items()}
+
+
+def _lane(scope: dict) -> str:
+    for key, value in scope.get("headers") or ():
+        if key == b"x-priority":
+            return "batch" if value.decode("latin-1").strip().lower() == "batch" else "interactive"
+    return "interactive"
+
+
+class BulkheadMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        bulkhead = bulkheads.get(ROUTE_CLASSES.get(scope.get("path"))) if scope["type"] == "http" else None
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+        lane = _lane(scope)
+        try:
+            waited = await bulkhead.acquire(lane)
+        except Shed as e:
+            shed_total.inc(bulkhead.name, lane, e.reason)
+            body = json.dumps({"detail": "Server busy, please retry shortly."}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(e.retry_after))).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        queue_seconds.observe(waited, bulkhead.name, lane)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            bulkhead.release(time.perf_counter() - started)
@@ -0,0 +1,227 @@
+"""Local mirror of the ProofChain application's boxes (``data/chain_mirror.sqlite3``).
+
+The contract (contracts/proofchain_pyteal.py) stores two kinds of boxes:
+  - media_key = sha256(H)            -> IPFS CID bytes
+  - reg_key   = sha256(media_key||n) -> 32-byte sender public key
+
+Both names are bare 32-byte hashes and a CID may be any length, so the kind of a
+box cannot be told from the box itself. The mirror stores boxes by name only;
+callers know which kind of key they hold (a record's content_key is its
+media_key, its unique_reg_key the reg_key) and query with it.
+
+Each sync lists the app's box names, diffs them against the mirror and fetches
+only the boxes it has not seen (ProofChain boxes are written once), then
+records the round the listing was taken at. A sync is skipped when the node has
+not advanced past the checkpoint. New boxes are committed in batches as they
+are fetched, so an interrupted catch-up resumes from what is already stored;
+removals and the round checkpoint are committed together at the end.
+
+The mirror is keyed to (genesis hash, app id); if either changes, or the node
+reports a round behind the checkpoint (a reset network or a different node),
+the mirror is wiped and rebuilt from scratch.
+
+Trust queries read only from the mirror (see media_trust's check_onchain).
+"""
+import base64
+import logging
+import sqlite3
+import threading
+import time
+
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+MIRROR_FILE = registry.DATA_PATH / "chain_mirror.sqlite3"
+SYNC_INTERVAL_SECONDS = 15.0
+FETCH_BATCH = 200
+# Reg boxes are created with exactly this size (the sender's public key).
+REG_BOX_SIZE = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS boxes (
+    name_hex TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    synced_round INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ChainMirror:
+    def __init__(self, path=MIRROR_FILE, client_factory=None):
+        self.path = path
+        self._client_factory = client_factory
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.last_error = None
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(boxes)")}
+            if "kind" in columns:
+                # Mirrors built with value-length classification: rebuild from scratch.
+                conn.executescript("DROP TABLE boxes; DROP TABLE IF EXISTS meta;")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _client(self):
+        if self._client_factory is not None:
+            return self._client_factory()
+        from .algorand_app_utils import get_algod_client
+        return get_algod_client()
+
+    @staticmethod
+    def _app_id() -> int | None:
+        from .config import settings
+        app_id = getattr(settings, "proofchain_app_id", None)
+        return int(app_id) if app_id else None
+
+    def _meta(self) -> dict:
+        return dict(self._db().execute("SELECT key, value FROM meta").fetchall())
+
+    # --- sync ---
+
+    def sync_once(self, app_id: int | None = None) -> dict:
+        """Bring the mirror up to the node's current round. Returns a summary."""
+        app_id = app_id or self._app_id()
+        if not app_id:
+            return {"synced": False, "reason": "proofchain_app_id not configured"}
+        with self._sync_lock:
+            client = self._client()
+            status = client.status()
+            node_round = int(status.get("last-round") or status.get("lastRound") or 0)
+            genesis = client.versions().get("genesis_hash_b64")
+            meta = self._meta()
+            checkpoint = int(meta.get("synced_round") or 0)
+            db = self._db()
+            if meta and (meta.get("genesis") != genesis or meta.get("app_id") != str(app_id) or node_round < checkpoint):
+                logger.warning("Resetting mirror (genesis/app changed or node behind checkpoint %s)", checkpoint)
+                db.execute("BEGIN IMMEDIATE")
+                db.execute("DELETE FROM boxes")
+                db.execute("DELETE FROM meta")
+                db.execute("COMMIT")
+                checkpoint = 0
+            elif checkpoint and node_round <= checkpoint:
+                # Still current: refresh synced_at so is_fresh() holds while the node is idle.
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)", (str(time.time()),))
+                return {"synced": True, "round": checkpoint, "added": 0, "removed": 0}
+
+            listed = client.application_boxes(app_id).get("boxes", [])
+            names = {base64.b64decode(b["name"]).hex() for b in listed}
+            known = {row[0] for row in db.execute("SELECT name_hex FROM boxes")}
+            new_names = sorted(names - known)
+            gone = known - names
+
+            # Tag the mirror with its network/app before writing any rows so
+            # partial progress from an interrupted catch-up is attributable.
+            db.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("genesis", genesis), ("app_id", str(app_id))],
+            )
+            # Boxes are write-once, so fetched batches are committed as they come:
+            # a restart resumes the catch-up from whatever is already stored.
+            added = 0
+            for i in range(0, len(new_names), FETCH_BATCH):
+                batch = []
+                for name_hex in new_names[i:i + FETCH_BATCH]:
+                    box = client.application_box_by_name(app_id, bytes.fromhex(name_hex))
+                    value = base64.b64decode(box.get("value", ""))
+                    batch.append((name_hex, value, node_round))
+                db.execute("BEGIN IMMEDIATE")
+                db.executemany(
+                    "INSERT OR REPLACE INTO boxes (name_hex, value, synced_round) VALUES (?, ?, ?)",
+                    batch,
+                )
+                db.execute("COMMIT")
+                added += len(batch)
+
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if gone:
+                    db.executemany("DELETE FROM boxes WHERE name_hex = ?", [(n,) for n in gone])
+                db.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("synced_round", str(node_round)), ("synced_at", str(time.time()))],
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            if added or gone:
+                logger.info("round %s: +%s -%s boxes", node_round, added, len(gone))
+            return {"synced": True, "round": node_round, "added": added, "removed": len(gone)}
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if not self._app_id():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="chain-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("sync failed: %s", e)
+            self._stopping.wait(SYNC_INTERVAL_SECONDS)
+
+    # --- queries ---
+
+    def synced_round(self) -> int | None:
+        value = self._meta().get("synced_round")
+        return int(value) if value else None
+
+    def is_fresh(self, max_age: float = 4 * SYNC_INTERVAL_SECONDS) -> bool:
+        """True when the last completed sync finished within `max_age` seconds."""
+        value = self._meta().get("synced_at")
+        return bool(value) and time.time() - float(value) <= max_age
+
+    def box_value(self, name_hex: str | None) -> bytes | None:
+        if not name_hex:
+            return None
+        row = self._db().execute("SELECT value FROM boxes WHERE name_hex = ?", (name_hex.lower(),)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def media_cid(self, media_key_hex: str | None) -> str | None:
+        """CID stored in the media box named `media_key_hex` (a record's content_key)."""
+        value = self.box_value(media_key_hex)
+        return value.decode("utf-8", errors="replace") if value is not None else None
+
+    def reg_sender(self, reg_key_hex: str | None) -> str | None:
+        """Sender address stored in the reg box named `reg_key_hex` (a record's unique_reg_key)."""
+        value = self.box_value(reg_key_hex)
+        if value is None or len(value) != REG_BOX_SIZE:
+            return None
+        from algosdk import encoding
+        return encoding.encode_address(value)
+
+    def stats(self) -> dict:
+        db = self._db()
+        return {
+            "synced_round": self.synced_round(),
+            "boxes": db.execute("SELECT COUNT(*) FROM boxes").fetchone()[0],
+            "running": bool(self._thread and self._thread.is_alive()),
+            "last_error": self.last_error,
+        }
+
+
+chain_mirror = ChainMirror()
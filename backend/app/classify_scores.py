@@ -0,0 +1,57 @@
+"""Similarity scores of a classify query against every registry record.
+
+Scores are cached per query key and tagged with the registry generation. Within
+one generation records are only appended (registry.save_media downgrades an
+"append" that does not extend the current records to a rewrite) or updated in
+place without touching embeddings, so cached scores stay valid for the prefix
+they cover and only the new records are scored. A new generation (rewrite or reload) rescans everything. Identical
+concurrent lookups share one scan.
+"""
+import math
+from array import array
+from typing import Callable
+
+from .coalesce import SingleFlight, TTLCache
+from .metrics import cache_events, stage_timer
+
+
+class ScoreCache:
+    def __init__(self, name: str, similarity: Callable, maxsize: int, ttl: float):
+        self.name = name
+        self.similarity = similarity
+        self._cache = TTLCache(name, maxsize=maxsize, ttl=ttl)
+        self._flight = SingleFlight(name)
+
+    def score_records(self, query_emb: list[float], records) -> array:
+        """Similarity of query_emb to each record's embedding, NaN where there is none."""
+        sims = array("d")
+        for item in records:
+            emb2 = item.get("embedding") if isinstance(item, dict) else None
+            sims.append(self.similarity(query_emb, emb2) if isinstance(emb2, list) else math.nan)
+        return sims
+
+    def scores(self, key, query_emb: list[float], snap) -> array:
+        """Scores aligned with snap.records; the array is shared and must not be modified."""
+        sims = self._cache.get(key, snap.generation)
+        if sims is not None and len(sims) >= len(snap.records):
+            return sims
+
+        def score():
+            cached = self._cache.get(key, snap.generation)
+            if cached is not None and len(cached) >= len(snap.records):
+                return cached
+            with stage_timer("search"):
+                if cached is None:
+                    sims = self.score_records(query_emb, snap.records)
+                else:
+                    # Copy so readers holding the old array are unaffected.
+                    sims = array("d", cached)
+                    sims.extend(self.score_records(query_emb, snap.records[len(cached):]))
+                    cache_events.inc(self.name, "patched")
+            self._cache.put(key, sims, snap.generation)
+            return sims
+
+        return self._flight.do((key, snap.generation, len(snap.records)), score)
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,117 @@
+"""Request coalescing helpers for the sync (threadpool) endpoints.
+
+- :class:`SingleFlight` runs one computation per key at a time; callers that
+  arrive while it is running wait for it and share its result (or exception).
+- :class:`TTLCache` keeps results briefly, each tagged with the state it was
+  computed against (e.g. the registry version); a lookup with a different tag
+  is a miss.
+
+Both report to ``proofchain_cache_events_total`` under their name, with result
+hit/miss for the cache and "coalesced" for callers that joined a flight.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from .metrics import cache_events
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+
+    def do(self, key, fn):
+        """Return fn(), sharing one call among concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            cache_events.inc(self.name, "coalesced")
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class TTLCache:
+    """Small LRU of (tag, value) entries that expire `ttl` seconds after being stored.
+
+    Bounded by entry count and, when `max_bytes` is given, by the total of
+    `sizeof(value)` over all entries; a value larger than max_bytes is not stored.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, *,
+                 max_bytes: int | None = None, sizeof: Callable = len):
+        self.name, self.maxsize, self.ttl = name, maxsize, ttl
+        self.max_bytes, self.sizeof = max_bytes, sizeof
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key, tag):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] <= now or entry[1] != tag):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        cache_events.inc(self.name, "miss" if entry is None else "hit")
+        return None if entry is None else entry[2]
+
+    def put(self, key, value, tag) -> None:
+        if self.ttl <= 0:
+            return
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, tag, value, size)
+            self._bytes += size
+            while len(self._entries) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key) -> None:
+        self._bytes -= self._entries.pop(key)[3]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the stored values (0 unless max_bytes is set)."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,69 @@
+"""Conditional GET for endpoints that only depend on the registry.
+
+:func:`cached_json` serializes a response once per (endpoint, query params,
+registry state) and serves the stored bytes to every later poll. Each body gets
+a weak ETag built from the snapshot's etag_version (the registry file's
+mtime plus its signature token, identical in every worker and increasing with
+each write) and the params; a request whose ``If-None-Match`` matches is
+answered ``304 Not Modified`` without building or sending the body. The tag is
+weak and responses carry ``Vary: Accept-Encoding`` because the compression
+middleware may send the same representation gzip- or brotli-encoded, which a
+strong ETag would claim is byte-identical to the identity body.
+
+Responses that also depend on something outside the registry (IPFS
+availability) pass ``ttl``: the time epoch ``now // ttl`` becomes part of the
+ETag and cache tag, so they are rebuilt at most once per ttl seconds per worker.
+
+Stored bodies are bounded by RESPONSE_CACHE_BYTES in total (per worker), so a
+few multi-megabyte listings with embeddings cannot pin unbounded memory.
+"""
+import hashlib
+import os
+import time
+from typing import Callable
+
+from . import registry
+from .coalesce import SingleFlight, TTLCache
+from .json_response import dumps
+
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+_cache = TTLCache("http_response", maxsize=256, ttl=3600,
+                  max_bytes=RESPONSE_CACHE_BYTES, sizeof=lambda entry: len(entry[1]))
+_flight = SingleFlight("http_response")
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison.
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def cached_json(request, name: str, params: tuple, build: Callable, *, ttl: float | None = None):
+    """Response for `build(snapshot)`, reusing the serialized body while the registry is unchanged."""
+    from fastapi import Response
+
+    snap = registry.snapshot()
+    tag = snap.etag_version if ttl is None else f"{snap.etag_version}.{int(time.time() // ttl)}"
+    key = (name, params)
+    entry = _cache.get(key, tag)
+    if entry is None:
+        def render():
+            cached = _cache.get(key, tag)
+            if cached is not None:
+                return cached
+            digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=6).hexdigest()
+            rendered = (f'W/"{tag}-{digest}"', dumps(build(snap)))
+            _cache.put(key, rendered, tag)
+            return rendered
+
+        entry = _flight.do((key, tag), render)
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,6 +1,9 @@
+import logging
 import os
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 # Support both pydantic v2 (BaseSettings moved to pydantic-settings)
 # and pydantic v1 where BaseSettings lived in pydantic.
 try:
@@ -47,6 +50,9 @@ class Settings(BaseSettings):
     ALGOD_ADDRESS: str | None = None
     ALGOD_TOKEN: str | None = None
     ALGOD_HEADER_KV: str | None = None
+    # Optional indexer, used by the reconciliation sweep to look up old transactions
+    INDEXER_ADDRESS: str | None = None
+    INDEXER_TOKEN: str | None = None
 
     LUTE_MNEMONIC: str | None = None
     DEPLOYER_MNEMONIC: str | None = None
@@ -99,5 +105,5 @@ def _mask_secret(s: str | None) -> str:
         return s
     return f"{s[:4]}...{s[-4:]}"
 
-print(f"[CONFIG] PINATA_API_KEY={_mask_secret(settings.PINATA_API_KEY)}")
-print(f"[CONFIG] PINATA_API_SECRET={_mask_secret(settings.PINATA_API_SECRET)}")
+logger.debug("PINATA_API_KEY=%s", _mask_secret(settings.PINATA_API_KEY))
+logger.debug("PINATA_API_SECRET=%s", _mask_secret(settings.PINATA_API_SECRET))
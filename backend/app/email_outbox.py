@@ -0,0 +1,275 @@
+"""Persistent outbox for outgoing email, drained by a background sender.
+
+Messages are written to ``data/email_outbox.sqlite3`` and the caller returns
+immediately. A daemon thread claims due messages in batches, sends them over a
+long-lived authenticated SMTP session (checked with NOOP after idling, reopened
+on failure) and retries failures with exponential backoff.
+
+Several workers may share the same outbox file: rows are claimed with a lease
+inside an immediate transaction, and a lease that expires (worker crashed
+mid-send) makes the row due again.
+"""
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_FILE = registry.DATA_PATH / "email_outbox.sqlite3"
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 5.0
+BACKOFF_MAX_SECONDS = 15 * 60.0
+LEASE_SECONDS = 120.0
+# Close the SMTP session after this long without traffic; probe it with NOOP
+# before reuse once it has been idle for NOOP_AFTER_SECONDS.
+IDLE_CLOSE_SECONDS = 60.0
+NOOP_AFTER_SECONDS = 10.0
+POLL_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_addrs TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    html TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class EmailOutbox:
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._metrics = {"sent": 0, "retried": 0, "failed": 0, "connections_opened": 0, "connection_reuses": 0}
+        self._last_error = None
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # --- producer side ---
+
+    def enqueue(self, to_addrs, subject: str, body: str, html: str | None = None) -> int:
+        """Persist a message for delivery and return its outbox id."""
+        to_list = [to_addrs] if isinstance(to_addrs, str) else list(to_addrs or [])
+        if not to_list:
+            raise ValueError("No recipients provided")
+        now = time.time()
+        cur = self._db().execute(
+            "INSERT INTO outbox (to_addrs, subject, body, html, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (json.dumps(to_list), subject, body or "", html, now, now),
+        )
+        self.start()
+        self._wake.set()
+        return cur.lastrowid
+
+    def stats(self) -> dict:
+        """Queue depth and sender counters (counters are per process)."""
+        now = time.time()
+        db = self._db()
+        depth = dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        due = db.execute(
+            "SELECT COUNT(*) FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?)"
+            " OR (status = 'sending' AND lease_until < ?)", (now, now),
+        ).fetchone()[0]
+        oldest = db.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+        return {
+            "pending": depth.get("pending", 0),
+            "sending": depth.get("sending", 0),
+            "due": due,
+            "failed_total": depth.get("failed", 0),
+            "oldest_pending_age_seconds": round(now - oldest, 1) if oldest else 0.0,
+            "sender_running": bool(self._thread and self._thread.is_alive()),
+            "last_error": self._last_error,
+            **self._metrics,
+        }
+
+    # --- sender side ---
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close_smtp()
+
+    def _claim(self, limit: int) -> list:
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT id, to_addrs, subject, body, html, attempts FROM outbox"
+                " WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND lease_until < ?)"
+                " ORDER BY next_attempt_at LIMIT ?", (now, now, limit),
+            ).fetchall()
+            if rows:
+                db.executemany(
+                    "UPDATE outbox SET status = 'sending', lease_until = ? WHERE id = ?",
+                    [(now + LEASE_SECONDS, row[0]) for row in rows],
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _next_due_in(self) -> float:
+        row = self._db().execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+        ).fetchone()
+        if not row or row[0] is None:
+            return POLL_SECONDS
+        return max(0.0, min(POLL_SECONDS, row[0] - time.time()))
+
+    def _close_smtp(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                try:
+                    self._smtp.close()
+                except Exception:
+                    pass
+            self._smtp = None
+
+    def _connection(self):
+        from .utils_email import open_smtp_connection
+        if self._smtp is not None and time.monotonic() - self._smtp_last_used > NOOP_AFTER_SECONDS:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._close_smtp()
+            except Exception:
+                self._close_smtp()
+        if self._smtp is None:
+            self._smtp = open_smtp_connection()
+            self._smtp_last_used = time.monotonic()
+            self._metrics["connections_opened"] += 1
+        else:
+            self._metrics["connection_reuses"] += 1
+        return self._smtp
+
+    def _send_one(self, to_list: list, subject: str, body: str, html: str | None) -> None:
+        import smtplib
+        from .utils_email import SMTP_FROM, build_message
+        msg = build_message(to_list, subject, body, html=html)
+        for attempt in range(2):
+            server = self._connection()
+            try:
+                server.send_message(msg, from_addr=SMTP_FROM, to_addrs=to_list)
+                self._smtp_last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Stale session: reopen once before counting this as a failed attempt.
+                self._close_smtp()
+                if attempt:
+                    raise
+
+    def _process_batch(self) -> int:
+        rows = self._claim(BATCH_SIZE)
+        db = self._db()
+        for msg_id, to_addrs, subject, body, html, attempts in rows:
+            try:
+                self._send_one(json.loads(to_addrs), subject, body, html)
+            except Exception as e:
+                attempts += 1
+                self._last_error = f"{type(e).__name__}: {e}"
+                if attempts >= MAX_ATTEMPTS:
+                    db.execute(
+                        "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, lease_until = NULL WHERE id = ?",
+                        (attempts, self._last_error, msg_id),
+                    )
+                    self._metrics["failed"] += 1
+                    logger.error("Giving up on message %s after %s attempts: %s", msg_id, attempts, e)
+                else:
+                    db.execute(
+                        "UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, lease_until = NULL,"
+                        " next_attempt_at = ? WHERE id = ?",
+                        (attempts, self._last_error, time.time() + _backoff(attempts), msg_id),
+                    )
+                    self._metrics["retried"] += 1
+                    logger.warning("Send failed for message %s (attempt %s), will retry: %s", msg_id, attempts, e)
+                if isinstance(e, RuntimeError) or self._smtp is None:
+                    # Configuration problem or server down: back off the whole batch.
+                    self._release(rows, msg_id)
+                    break
+                continue
+            db.execute("DELETE FROM outbox WHERE id = ?", (msg_id,))
+            self._metrics["sent"] += 1
+        return len(rows)
+
+    def _release(self, rows: list, failed_id: int) -> None:
+        """Return claimed-but-unsent rows after a connection-level failure."""
+        remaining = [row[0] for row in rows]
+        remaining = remaining[remaining.index(failed_id) + 1:]
+        if remaining:
+            retry_at = time.time() + BACKOFF_BASE_SECONDS
+            self._db().executemany(
+                "UPDATE outbox SET status = 'pending', lease_until = NULL, next_attempt_at = ? WHERE id = ?",
+                [(retry_at, msg_id) for msg_id in remaining],
+            )
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                processed = self._process_batch()
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"
+                logger.error("Outbox sender error: %s", e)
+                processed = 0
+            if processed >= BATCH_SIZE:
+                continue
+            if self._smtp is not None and time.monotonic() - self._smtp_last_used > IDLE_CLOSE_SECONDS:
+                self._close_smtp()
+            try:
+                wait = self._next_due_in()
+            except Exception:
+                wait = POLL_SECONDS
+            self._wake.wait(wait)
+            self._wake.clear()
+        self._close_smtp()
+
+
+email_outbox = EmailOutbox()
@@ -0,0 +1,306 @@
+"""IPFS gateway pool with latency-aware selection and hedged fetches.
+
+Gateways come from IPFS_GATEWAYS (comma separated base URLs, e.g.
+``https://ipfs.io,http://127.0.0.1:8081``); when unset the pool is the primary
+gateway (PINATA_GATEWAY_DOMAIN, or gateway.pinata.cloud) plus ipfs.io. The
+primary one is also what :func:`public_url` uses for the ``file_url`` stored in
+the registry.
+
+Each gateway keeps an EWMA of its latency and error rate plus a window of recent
+latencies. :meth:`GatewayPool.fetch` asks the best-scoring gateway first and,
+if it has not answered within that gateway's p95 latency, hedges with the next
+best; the first response that passes verification wins and the requests still
+running for that fetch are abandoned at their next chunk. Hedging is bounded:
+at most IPFS_MAX_HEDGES extra requests per fetch run at once, and none are
+started while all IPFS_FETCH_WORKERS workers are busy (a failed request is
+still replaced by the next gateway). When the expected sha256 of the content is
+known, a response that does not match is logged, counted as a gateway error and
+the next gateway is tried; callers that pass ``allow_unverified`` get the first
+mismatching body back if no gateway returns a verified one.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .metrics import Counter, Gauge
+from .metrics import errors as error_counter
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 64
+# Hedge delay bounds; the default applies until a gateway has latency samples.
+HEDGE_MIN_SECONDS = 0.2
+HEDGE_MAX_SECONDS = 5.0
+HEDGE_DEFAULT_SECONDS = 1.0
+FETCH_TIMEOUT_SECONDS = 30.0
+FETCH_WORKERS = int(os.getenv("IPFS_FETCH_WORKERS", "16"))
+# Extra gateways one fetch may hedge to while its earlier requests still run.
+MAX_HEDGES = int(os.getenv("IPFS_MAX_HEDGES", "1"))
+CHUNK_BYTES = 64 * 1024
+
+fetch_queued = Gauge("proofchain_ipfs_fetch_queued", "Gateway requests waiting for a fetch worker")
+fetch_in_flight = Gauge("proofchain_ipfs_fetch_in_flight", "Gateway requests being fetched")
+hedges = Counter("proofchain_ipfs_hedges_total", "Hedge decisions by result (launched, capped, saturated)",
+                 ("result",))
+
+
+def _normalize_base(domain: str) -> str:
+    d = str(domain).strip().rstrip('/')
+    if d.startswith("http://") or d.startswith("https://"):
+        return d
+    return f"https://{d}"
+
+
+def primary_base() -> str:
+    from .config import settings
+    domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
+    return _normalize_base(domain) if domain else "https://gateway.pinata.cloud"
+
+
+def public_url(cid: str | None) -> str | None:
+    """Gateway URL recorded for a CID (the primary gateway)."""
+    return f"{primary_base()}/ipfs/{cid}" if cid else None
+
+
+class FetchError(Exception):
+    pass
+
+
+class _Abandoned(FetchError):
+    """The fetch no longer needs this request (another gateway won or it timed out)."""
+
+
+class _TooLarge(FetchError):
+    """Content exceeds the caller's max_bytes; not the gateway's fault."""
+
+
+class _Mismatch(FetchError):
+    def __init__(self, message: str, content: bytes, url: str):
+        super().__init__(message)
+        self.content, self.url = content, url
+
+
+class _Gateway:
+    def __init__(self, base: str):
+        self.base = base
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, latency: float | None, ok: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+            self.ewma_latency = latency if self.ewma_latency is None else (
+                (1 - EWMA_ALPHA) * self.ewma_latency + EWMA_ALPHA * latency)
+
+    def score(self) -> float:
+        # Untried gateways rank as if they matched the default hedge delay.
+        latency = self.ewma_latency if self.ewma_latency is not None else HEDGE_DEFAULT_SECONDS
+        return latency * (1 + 4 * self.error_rate)
+
+    def p95(self) -> float | None:
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "base": self.base,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class GatewayPool:
+    def __init__(self, bases: list[str] | None = None, workers: int = FETCH_WORKERS):
+        self._configured = bases
+        self._lock = threading.Lock()
+        self._gateways: dict[str, _Gateway] = {}
+        self.workers = workers
+        self._queued = 0
+        self._running = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ipfs-fetch")
+
+    def _bases(self) -> list[str]:
+        if self._configured:
+            return [_normalize_base(b) for b in self._configured]
+        env = os.getenv("IPFS_GATEWAYS")
+        if env:
+            return [_normalize_base(b) for b in env.split(",") if b.strip()]
+        bases = [primary_base(), "https://ipfs.io"]
+        return list(dict.fromkeys(bases))
+
+    def ranked(self) -> list[_Gateway]:
+        with self._lock:
+            gateways = []
+            for base in self._bases():
+                gw = self._gateways.get(base)
+                if gw is None:
+                    gw = self._gateways[base] = _Gateway(base)
+                gateways.append(gw)
+        # Stable sort keeps configuration order among untried gateways.
+        return sorted(gateways, key=lambda g: g.score())
+
+    # --- worker accounting ---
+
+    def _count(self, queued: int, running: int) -> None:
+        with self._lock:
+            self._queued += queued
+            self._running += running
+            fetch_queued.set(self._queued)
+            fetch_in_flight.set(self._running)
+
+    def saturated(self) -> bool:
+        """True when no fetch worker is idle."""
+        return self._queued > 0 or self._running >= self.workers
+
+    def _get(self, gw: _Gateway, cid: str, expected: set, timeout: float,
+             abandoned: threading.Event, max_bytes: int | None) -> tuple:
+        self._count(-1, 1)
+        try:
+            return self._download(gw, cid, expected, timeout, abandoned, max_bytes)
+        finally:
+            self._count(0, -1)
+
+    def _request(self, gw: _Gateway, url: str, timeout: float,
+                 abandoned: threading.Event, max_bytes: int | None) -> bytes:
+        """Stream the body of `url`, stopping at the next chunk once `abandoned` is set."""
+        import requests
+        with requests.get(url, timeout=timeout, stream=True) as r:
+            if r.status_code >= 400:
+                raise FetchError(f"{gw.base}: HTTP {r.status_code}")
+            chunks, size = [], 0
+            for chunk in r.iter_content(CHUNK_BYTES):
+                if abandoned.is_set():
+                    raise _Abandoned(f"{gw.base}: abandoned")
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise _TooLarge(f"{gw.base}: content larger than {max_bytes} bytes")
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+    def _download(self, gw: _Gateway, cid: str, expected: set, timeout: float,
+                  abandoned: threading.Event, max_bytes: int | None) -> tuple:
+        url = f"{gw.base}/ipfs/{cid}"
+        started = time.monotonic()
+        try:
+            if abandoned.is_set():
+                raise _Abandoned(f"{gw.base}: abandoned")
+            content = self._request(gw, url, timeout, abandoned, max_bytes)
+        except (_Abandoned, _TooLarge):
+            raise
+        except Exception as e:
+            with self._lock:
+                gw.record(None, ok=False)
+            error_counter.inc("ipfs_gateway")
+            raise e if isinstance(e, FetchError) else FetchError(f"{gw.base}: {e}")
+        latency = time.monotonic() - started
+        if expected:
+            digest = hashlib.sha256(content).hexdigest()
+            if digest not in expected:
+                logger.warning("%s returned %s for %s; expected %s", gw.base, digest, cid, ", ".join(sorted(expected)))
+                with self._lock:
+                    gw.record(None, ok=False)
+                error_counter.inc("ipfs_gateway")
+                raise _Mismatch(f"{gw.base}: content does not match expected sha256", content, url)
+        with self._lock:
+            gw.record(latency, ok=True)
+        return content, url
+
+    def fetch(self, cid: str, expected_sha256=None, timeout: float = FETCH_TIMEOUT_SECONDS, *,
+              allow_unverified: bool = False, max_bytes: int | None = None) -> tuple:
+        """Fetch CID content; returns (bytes, url). Raises FetchError if every gateway fails.
+
+        expected_sha256: a hex digest or an iterable of acceptable digests.
+        allow_unverified: if every gateway fails and some returned content that did
+            not match expected_sha256, return the first such body instead of raising.
+        max_bytes: give up on (not penalize) gateways whose content is larger.
+        """
+        if isinstance(expected_sha256, str):
+            expected_sha256 = [expected_sha256]
+        expected = {h.lower().removeprefix("0x") for h in (expected_sha256 or []) if h}
+        gateways = self.ranked()
+        abandoned = threading.Event()
+        pending = set()
+        errors = []
+        unverified = None
+        next_index = 0
+        deadline = time.monotonic() + timeout
+
+        def launch():
+            nonlocal next_index
+            gw = gateways[next_index]
+            next_index += 1
+            self._count(1, 0)
+            pending.add(self._executor.submit(self._get, gw, cid, expected, timeout, abandoned, max_bytes))
+            p95 = gw.p95()
+            return min(HEDGE_MAX_SECONDS, max(HEDGE_MIN_SECONDS, p95 if p95 is not None else HEDGE_DEFAULT_SECONDS))
+
+        hedge_after = launch()
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                can_launch = next_index < len(gateways)
+                done, pending = wait(pending, timeout=min(hedge_after, remaining) if can_launch else remaining,
+                                     return_when=FIRST_COMPLETED)
+                for fut in done:
+                    try:
+                        return fut.result()
+                    except _Mismatch as e:
+                        errors.append(str(e))
+                        unverified = unverified or (e.content, e.url)
+                    except FetchError as e:
+                        errors.append(str(e))
+                if not can_launch:
+                    continue
+                if not pending:
+                    # Everything so far failed: move on to the next gateway regardless of load.
+                    hedge_after = launch()
+                elif len(pending) > MAX_HEDGES:
+                    hedges.inc("capped")
+                elif self.saturated():
+                    hedges.inc("saturated")
+                else:
+                    hedges.inc("launched")
+                    hedge_after = launch()
+        finally:
+            abandoned.set()
+            for fut in pending:
+                if fut.cancel():
+                    self._count(-1, 0)
+        if unverified is not None and allow_unverified:
+            logger.warning("no gateway returned verified content for %s; using unverified bytes from %s",
+                           cid, unverified[1])
+            error_counter.inc("ipfs_unverified")
+            return unverified
+        raise FetchError("; ".join(errors) or f"timed out fetching {cid}")
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [gw.stats() for gw in self._gateways.values()]
+
+    def load(self) -> dict:
+        """Fetch worker usage: pool size, requests running and requests queued."""
+        with self._lock:
+            return {"workers": self.workers, "in_flight": self._running, "queued": self._queued}
+
+
+gateway_pool = GatewayPool()
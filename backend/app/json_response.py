@@ -0,0 +1,78 @@
+"""JSON encoding for large responses.
+
+- JSON_RESPONSE=orjson switches the media and registration routers to
+  ``ORJSONResponse`` and :func:`dumps` (used for cached registry listings) to
+  orjson. It falls back to the stdlib encoder when orjson is not installed.
+  orjson is typically several times faster on the big lists of dicts these
+  routes return.
+- :func:`shape_embeddings` lets listing endpoints trim the 512-float embedding
+  carried by every record: ``round`` to a few decimals, ``f16`` to replace it
+  with base64 little-endian float16 (``embedding_f16``, 1 KiB per record), or
+  ``omit`` to drop it.
+
+Compression is handled by the GZip middleware in main.py (GZIP_MIN_BYTES).
+"""
+import base64
+import json
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODES = ("full", "round", "f16", "omit")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USE_ORJSON = os.getenv("JSON_RESPONSE", "").strip().lower() == "orjson"
+if USE_ORJSON and orjson is None:
+    logger.warning("JSON_RESPONSE=orjson but orjson is not installed; using the stdlib encoder")
+    USE_ORJSON = False
+
+
+def response_class():
+    """Default response class for the large-payload routers."""
+    if USE_ORJSON:
+        from fastapi.responses import ORJSONResponse
+        return ORJSONResponse
+    from fastapi.responses import JSONResponse
+    return JSONResponse
+
+
+def dumps(content) -> bytes:
+    if USE_ORJSON:
+        return orjson.dumps(content)
+    # Same encoding as starlette's JSONResponse.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _f16(values: list) -> str | None:
+    try:
+        return base64.b64encode(struct.pack(f"<{len(values)}e", *values)).decode("ascii")
+    except (struct.error, TypeError, OverflowError):
+        return None
+
+
+def shape_embeddings(records, mode: str = "full", precision: int = 4) -> list:
+    """Records with their embedding reshaped per `mode`; records are copied, never modified."""
+    if mode not in EMBEDDING_MODES or mode == "full":
+        return list(records)
+    out = []
+    for item in records:
+        emb = item.get("embedding") if isinstance(item, dict) else None
+        if not isinstance(emb, list):
+            out.append(item)
+            continue
+        item = dict(item)
+        if mode == "omit":
+            del item["embedding"]
+        elif mode == "round":
+            item["embedding"] = [round(x, precision) if isinstance(x, float) else x for x in emb]
+        else:
+            del item["embedding"]
+            item["embedding_f16"] = _f16(emb)
+        out.append(item)
+    return out
@@ -0,0 +1,236 @@
+"""KYC record store with per-record encryption (``data/kyc.json``).
+
+On disk every record is its own Fernet token:
+
+    {"format": "per_record_fernet", "records": {"<kyc id>": "<token>", ...}}
+
+so a write re-encrypts only the record that changed. Decrypted records are kept
+in memory together with a wallet-address index, making status lookups O(1).
+When another worker rewrites the file (detected by its (inode, mtime_ns, size)
+signature) only the tokens that differ from the cached ones are decrypted again.
+Writes hold ``flock`` on ``kyc.lock`` and re-read the file before changing their
+one record, so workers writing at the same time keep each other's records.
+
+Older layouts are converted on first load: a single Fernet blob of the whole
+``{id: record}`` map, or the same map (or a list of records) as plain JSON.
+Plain legacy files can still be read without ENCRYPTION_KEY; they are converted
+once a key is available.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from . import registry
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; only the thread lock applies there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+KYC_FILE = registry.DATA_PATH / "kyc.json"
+FORMAT = "per_record_fernet"
+
+
+def _wallet_key(address) -> str | None:
+    return address.lower() if isinstance(address, str) and address else None
+
+
+class KYCStore:
+    def __init__(self, path=KYC_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._fernet = None
+        self._signature = False  # False = never loaded; None = file missing
+        self._tokens: dict[str, str] = {}
+        self._records: dict[str, dict] = {}
+        self._by_wallet: dict[str, str] = {}
+
+    def encryptor(self):
+        if self._fernet is None:
+            key = os.getenv("ENCRYPTION_KEY")
+            if not key:
+                raise RuntimeError("ENCRYPTION_KEY environment variable is not set.")
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(key)
+        return self._fernet
+
+    def _file_signature(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the thread lock and, via flock, the file against other workers (re-entrant)."""
+        with self._lock:
+            handle = None
+            if self._lock_depth == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                handle = open(self.path.with_suffix(".lock"), "a+b")
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if handle is not None:
+                    handle.close()
+
+    # --- loading ---
+
+    def _reindex(self) -> None:
+        self._by_wallet = {}
+        for kyc_id, rec in self._records.items():
+            wallet = _wallet_key(rec.get("wallet_address"))
+            if wallet:
+                self._by_wallet.setdefault(wallet, kyc_id)
+
+    def _load_legacy(self, text: str) -> dict:
+        try:
+            raw = json.loads(text)
+        except ValueError:
+            raw = json.loads(self.encryptor().decrypt(text.encode()).decode())
+        if isinstance(raw, list):
+            raw = {rec.get("id") or str(i): rec for i, rec in enumerate(raw) if isinstance(rec, dict)}
+        return {str(k): v for k, v in (raw or {}).items() if isinstance(v, dict)}
+
+    def _ensure_fresh(self) -> None:
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            if signature is None:
+                self._tokens, self._records, self._by_wallet = {}, {}, {}
+                self._signature = None
+                return
+            try:
+                text = self.path.read_text()
+                raw = json.loads(text) if text.lstrip().startswith("{") else None
+            except ValueError:
+                raw = None
+            if isinstance(raw, dict) and raw.get("format") == FORMAT:
+                tokens = raw.get("records", {})
+                records = {}
+                for kyc_id, token in tokens.items():
+                    if self._tokens.get(kyc_id) == token and kyc_id in self._records:
+                        records[kyc_id] = self._records[kyc_id]
+                    else:
+                        records[kyc_id] = json.loads(self.encryptor().decrypt(token.encode()).decode())
+                self._tokens, self._records = dict(tokens), records
+                self._signature = signature
+            else:
+                try:
+                    self._records = self._load_legacy(text)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to load KYC data: {e}")
+                self._tokens = {}
+                self._signature = signature
+                if os.getenv("ENCRYPTION_KEY"):
+                    self._convert_legacy()
+            self._reindex()
+
+    def _convert_legacy(self) -> None:
+        with self._exclusive():
+            if self._file_signature() != self._signature:
+                # Another worker rewrote (probably converted) it meanwhile; load that instead.
+                self._signature = False
+                return
+            logger.info("Converting %s legacy records to per-record encryption", len(self._records))
+            self._tokens = {k: self._encrypt(v) for k, v in self._records.items()}
+            self._persist()
+
+    # --- writing ---
+
+    def _encrypt(self, rec: dict) -> str:
+        return self.encryptor().encrypt(json.dumps(rec).encode()).decode()
+
+    def _persist(self) -> None:
+        # Caller holds _exclusive() and has just re-read the file (_ensure_fresh).
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"format": FORMAT, "records": self._tokens}))
+        os.replace(tmp, self.path)
+        self._signature = self._file_signature()
+
+    def _write(self, kyc_id: str, rec: dict) -> None:
+        if not self._tokens and self._records:
+            # Still holding a legacy file read without a key: convert it now.
+            self._tokens = {k: self._encrypt(v) for k, v in self._records.items()}
+        self._tokens[kyc_id] = self._encrypt(rec)
+        self._records[kyc_id] = rec
+        wallet = _wallet_key(rec.get("wallet_address"))
+        if wallet:
+            self._by_wallet.setdefault(wallet, kyc_id)
+        self._persist()
+
+    # --- public API; records returned are copies ---
+
+    def get(self, kyc_id: str) -> dict | None:
+        self._ensure_fresh()
+        rec = self._records.get(kyc_id)
+        return dict(rec) if rec is not None else None
+
+    def by_wallet(self, address: str | None) -> dict | None:
+        wallet = _wallet_key(address)
+        if not wallet:
+            return None
+        self._ensure_fresh()
+        with self._lock:
+            kyc_id = self._by_wallet.get(wallet)
+            rec = self._records.get(kyc_id) if kyc_id else None
+            return dict(rec) if rec is not None else None
+
+    def all(self) -> list[dict]:
+        self._ensure_fresh()
+        with self._lock:
+            return [dict(rec) for rec in self._records.values()]
+
+    def add(self, rec: dict) -> bool:
+        """Insert a new record; returns False if its wallet already has one."""
+        with self._exclusive():
+            self._ensure_fresh()
+            wallet = _wallet_key(rec.get("wallet_address"))
+            if wallet and wallet in self._by_wallet:
+                return False
+            self._write(rec["id"], dict(rec))
+            return True
+
+    def update(self, kyc_id: str, **fields) -> dict | None:
+        """Apply `fields` to one record and persist it; None if the id is unknown."""
+        with self._exclusive():
+            self._ensure_fresh()
+            rec = self._records.get(kyc_id)
+            if rec is None:
+                return None
+            rec = {**rec, **fields}
+            old_wallet = _wallet_key(self._records[kyc_id].get("wallet_address"))
+            self._write(kyc_id, rec)
+            if old_wallet != _wallet_key(rec.get("wallet_address")):
+                self._reindex()
+            return dict(rec)
+
+    def delete(self, kyc_id: str) -> bool:
+        with self._exclusive():
+            self._ensure_fresh()
+            if kyc_id not in self._records:
+                return False
+            if not self._tokens:
+                self._tokens = {k: self._encrypt(v) for k, v in self._records.items()}
+            del self._records[kyc_id]
+            self._tokens.pop(kyc_id, None)
+            self._persist()
+            self._reindex()
+            return True
+
+
+kyc_store = KYCStore()
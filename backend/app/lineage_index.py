@@ -0,0 +1,106 @@
+"""In-memory provenance adjacency index over the media registry.
+
+Keeps three maps up to date as registrations arrive:
+  - content_key -> registrations sharing the same content
+  - parent key (`near_duplicate_of`) -> declared children
+  - unique_reg_key -> registration (child -> parent lookups)
+
+so the provenance graph builder only touches the nodes it actually renders.
+"""
+import threading
+
+from . import registry
+
+
+class LineageIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._by_content_key: dict[str, list[dict]] = {}
+        self._children: dict[str, list[dict]] = {}
+        self._by_reg_key: dict[str, dict] = {}
+
+    def _reset(self, media, version) -> None:
+        self._by_content_key = {}
+        self._children = {}
+        self._by_reg_key = {}
+        for item in media:
+            self._add(item)
+        self._version = version
+        self._loaded = True
+
+    def _add(self, item) -> None:
+        if not isinstance(item, dict):
+            return
+        content_key = item.get("content_key")
+        if content_key:
+            self._by_content_key.setdefault(content_key, []).append(item)
+        parent_key = item.get("near_duplicate_of")
+        if parent_key:
+            self._children.setdefault(parent_key, []).append(item)
+        reg_key = item.get("unique_reg_key")
+        if reg_key:
+            self._by_reg_key[reg_key] = item
+
+    def _replace(self, old, new) -> None:
+        # In-place updates keep the keys, so only the stored record objects change.
+        for index, key in ((self._by_content_key, old.get("content_key")),
+                           (self._children, old.get("near_duplicate_of"))):
+            items = index.get(key) if key else None
+            for i, item in enumerate(items or ()):
+                if item is old:
+                    items[i] = new
+        reg_key = old.get("unique_reg_key")
+        if reg_key and self._by_reg_key.get(reg_key) is old:
+            self._by_reg_key[reg_key] = new
+
+    def on_registry_change(self, event: str, records, snapshot) -> None:
+        with self._lock:
+            if not self._loaded:
+                # Nothing built yet; the next refresh() builds from the snapshot.
+                return
+            if event == "append":
+                for item in records:
+                    self._add(item)
+                self._version = snapshot.version
+            elif event == "update":
+                for old, new in records:
+                    self._replace(old, new)
+                self._version = snapshot.version
+            else:
+                self._reset(records, snapshot.version)
+
+    def refresh(self) -> None:
+        """Build lazily from the shared registry snapshot on first use.
+
+        Later changes (including reloads after out-of-process writes) arrive
+        through registry notifications.
+        """
+        snap = registry.snapshot()
+        with self._lock:
+            if self._loaded and snap.version == self._version:
+                return
+            self._reset(snap.records, snap.version)
+
+    def same_content(self, content_key: str | None) -> list[dict]:
+        if not content_key:
+            return []
+        with self._lock:
+            return list(self._by_content_key.get(content_key, ()))
+
+    def children(self, parent_key: str | None) -> list[dict]:
+        if not parent_key:
+            return []
+        with self._lock:
+            return list(self._children.get(parent_key, ()))
+
+    def get(self, unique_reg_key: str | None) -> dict | None:
+        if not unique_reg_key:
+            return None
+        with self._lock:
+            return self._by_reg_key.get(unique_reg_key)
+
+
+lineage_index = LineageIndex()
+registry.subscribe(lineage_index.on_registry_change)
@@ -0,0 +1,150 @@
+"""Structured, non-blocking logging for the backend.
+
+:func:`configure_logging` routes every record through a ``QueueHandler``; a
+``QueueListener`` thread formats and writes them, so request handlers never wait
+on stdout. Records are emitted as one JSON object per line (LOG_FORMAT=text for
+the previous human-readable layout) and carry the request's correlation id.
+
+Environment:
+  LOG_LEVEL         root level (default INFO)
+  LOG_FORMAT        json | text (default json)
+  LOG_SAMPLE_RATES  per-logger sampling of records below WARNING, e.g.
+                    ``proofchain.access=0.1,app.routes.media=0.5``; a rate
+                    applies to the named logger and its children
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("correlation_id", default=None)
+
+_listener = None
+
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "correlation_id"}
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _parse_rates(raw: str | None) -> dict[str, float]:
+    rates = {}
+    for part in (raw or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            try:
+                rates[name.strip()] = max(0.0, min(1.0, float(value)))
+            except ValueError:
+                pass
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the current correlation id and drops sampled-out records.
+
+    Runs on the QueueHandler, i.e. in the thread that logged, where the
+    request's context variables are visible.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: dict[str, float | None] = {}
+
+    def _rate(self, name: str) -> float | None:
+        if name not in self._cache:
+            rate, probe = None, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition(".")[0]
+            self._cache[name] = rate
+        return self._cache[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        if record.levelno < logging.WARNING and self.rates:
+            rate = self._rate(record.name)
+            if rate is not None and random.random() >= rate:
+                return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = None
+        return super().format(record)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (the listener must not touch
+        # caller-owned objects later) but leave formatting to the listener.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging() -> None:
+    """Install the queue-backed root handler (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    formatter = TextFormatter() if os.getenv("LOG_FORMAT", "json").lower() == "text" else JsonFormatter()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(ContextFilter(_parse_rates(os.getenv("LOG_SAMPLE_RATES"))))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,91 @@
+"""Event-loop lag monitor.
+
+A heartbeat task on the loop records when it last ran; a watchdog thread checks
+that timestamp. When the loop has not ticked for longer than the threshold, the
+watchdog captures the loop thread's current stack (the code that is blocking it)
+and logs it once per stall, then logs the total stall time after the loop
+recovers. Heartbeat lateness is also tracked so short hiccups show up in stats().
+
+Threshold and interval come from LOOP_LAG_THRESHOLD_MS / LOOP_LAG_INTERVAL_MS.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250")) / 1000.0
+INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000.0
+
+
+class LoopMonitor:
+    def __init__(self, threshold: float = THRESHOLD_SECONDS, interval: float = INTERVAL_SECONDS):
+        self.threshold = threshold
+        self.interval = interval
+        self._loop_thread_id = None
+        self._last_beat = 0.0
+        self._task = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+        self._stats = {"max_lag_ms": 0.0, "last_lag_ms": 0.0, "stalls": 0, "longest_stall_ms": 0.0}
+
+    def start(self) -> None:
+        """Start monitoring the running loop (call from inside it, e.g. on startup)."""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._task = loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, now - expected) * 1000.0
+            self._stats["last_lag_ms"] = round(lag_ms, 2)
+            if lag_ms > self._stats["max_lag_ms"]:
+                self._stats["max_lag_ms"] = round(lag_ms, 2)
+            self._last_beat = now
+
+    def _loop_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "<loop thread stack unavailable>"
+        return "".join(traceback.format_stack(frame))
+
+    def _watch(self) -> None:
+        stalled_since = None
+        while not self._stopping.wait(self.threshold / 2):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for > self.threshold:
+                if stalled_since is None:
+                    stalled_since = self._last_beat
+                    self._stats["stalls"] += 1
+                    logger.warning("Event loop blocked for %.0f ms; loop thread stack:\n%s",
+                                   blocked_for * 1000, self._loop_stack())
+            elif stalled_since is not None:
+                stall_ms = (self._last_beat - stalled_since) * 1000.0
+                self._stats["longest_stall_ms"] = max(self._stats["longest_stall_ms"], round(stall_ms, 1))
+                logger.warning("Event loop recovered after ~%.0f ms", stall_ms)
+                stalled_since = None
+
+    def stats(self) -> dict:
+        return {"threshold_ms": self.threshold * 1000.0, **self._stats}
+
+
+loop_monitor = LoopMonitor()
@@ -1,4 +1,7 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import APIRouter, FastAPI, Depends, HTTPException
+# Install the queued JSON logging pipeline before route modules log at import.
+from .log_setup import configure_logging, correlation_id, new_correlation_id, shutdown_logging
+configure_logging()
 from .routes import media
 from .routes import auth
 from .routes import registrations
@@ -7,56 +10,75 @@ from .routes import analytics
 from .config import settings
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import os
 from fastapi.responses import JSONResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from .websocket import app as websocket_app
 from .activity_logs import app as activity_logs_app
-from slowapi.middleware import SlowAPIMiddleware
-from routes.user_stats import router as user_stats_router
+from .routes.user_stats import router as user_stats_router
+from . import metrics
+from .memory_monitor import memory_monitor
+from fastapi.responses import PlainTextResponse
+from fastapi.middleware.gzip import GZipMiddleware
+import time
 
 app = FastAPI(title="ProofChain Backend")
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger("ProofChain Backend")
+# One line per request; sample it with LOG_SAMPLE_RATES=proofchain.access=<rate>.
+access_logger = logging.getLogger("proofchain.access")
 
 # Log startup message
 logger.info("Starting ProofChain Backend API")
 
-# Middleware to log requests and responses
+# Middleware to log requests and responses and record per-route latency
 @app.middleware("http")
 async def log_requests(request, call_next):
-    logger.info(f"Incoming request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
+    # Correlation id: taken from X-Request-ID when the caller sends one.
+    request_id = request.headers.get("x-request-id") or new_correlation_id()
+    token = correlation_id.set(request_id)
+    started = time.perf_counter()
+    mem_start = memory_monitor.request_started()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Label by route template (e.g. /media/tx_status/{txid}) to keep cardinality bounded.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.http_request_seconds.observe(time.perf_counter() - started, request.method, route, str(status))
+        if status >= 500:
+            metrics.errors.inc("http_5xx")
+        if mem_start is not None:
+            memory_monitor.request_finished(mem_start, route)
+        access_logger.info(
+            "%s %s %s", request.method, request.url.path, status,
+            extra={"route": route, "status": status, "duration_ms": round((time.perf_counter() - started) * 1000, 2)},
+        )
+        correlation_id.reset(token)
+    response.headers["X-Request-ID"] = request_id
     return response
 
 # Middleware to log unhandled exceptions
 @app.exception_handler(Exception)
 async def log_exceptions(request, exc):
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
+    metrics.errors.inc("unhandled")
     return await app.default_exception_handler(request, exc)
 
-# Initialize the rate limiter
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
+# Concurrency limits per route class so ML work cannot starve cheap reads (see bulkhead.py)
+from .bulkhead import BulkheadMiddleware
+app.add_middleware(BulkheadMiddleware)
+
+# Per-client token buckets shared by all workers; expensive routes cost more (see rate_limit.py)
+from .rate_limit import RateLimitMiddleware
+app.add_middleware(RateLimitMiddleware)
 
-# Add rate limit exception handler
-@app.exception_handler(RateLimitExceeded)
-async def rate_limit_exceeded_handler(request, exc):
-    return JSONResponse(
-        status_code=429,
-        content={"detail": "Rate limit exceeded. Please try again later."},
-    )
+# Opt-in per-request sampling profiler (X-Profile header / PROFILE_SAMPLE_RATE)
+from .request_profiler import RequestProfilerMiddleware
+app.add_middleware(RequestProfilerMiddleware)
 
 # Updated CORS Middleware to include 127.0.0.1:8000
 app.add_middleware(
@@ -85,6 +107,15 @@ app.add_middleware(
     ],
 )
 
+# Compress large responses (registry listings, provenance graphs). Brotli is
+# used when brotli-asgi is installed; it falls back to gzip for other clients.
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "4096"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=GZIP_MIN_BYTES, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=5)
+
 # Disabled HTTPSRedirectMiddleware for local development
 # app.add_middleware(HTTPSRedirectMiddleware)
 
@@ -101,6 +132,62 @@ app.mount("/websocket", websocket_app)
 # Include Activity Logs routes
 app.mount("/activity_logs", activity_logs_app)
 
+@app.on_event("startup")
+def check_registry_schema():
+    from . import registry
+    from .registry_migrations import pending_migrations
+    pending = pending_migrations()
+    if pending:
+        logger.warning(
+            "Registry schema is at v%s, expected v%s; run `python scripts/migrate_registry.py` to apply migrations %s",
+            registry.schema_version(), registry.SCHEMA_VERSION, pending,
+        )
+
+@app.on_event("startup")
+def start_email_outbox():
+    # Drain messages left over from a previous run.
+    from .email_outbox import email_outbox
+    email_outbox.start()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    from .loop_monitor import loop_monitor
+    loop_monitor.start()
+
+@app.on_event("startup")
+async def start_tx_tracker():
+    from .tx_tracker import tx_tracker
+    tx_tracker.start()
+
+@app.on_event("startup")
+def start_chain_mirror():
+    from .chain_mirror import chain_mirror
+    chain_mirror.start()
+
+@app.on_event("startup")
+def start_memory_monitor():
+    memory_monitor.start()
+
+@app.on_event("shutdown")
+def stop_email_outbox():
+    from .email_outbox import email_outbox
+    email_outbox.stop()
+
+@app.on_event("shutdown")
+def stop_payout_batcher():
+    # Submit payouts still waiting for their batch to fill.
+    from .payout_batcher import payout_batcher
+    payout_batcher.stop()
+
+@app.on_event("shutdown")
+def stop_chain_mirror():
+    from .chain_mirror import chain_mirror
+    chain_mirror.stop()
+
+@app.on_event("shutdown")
+def flush_logs():
+    shutdown_logging()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Mock function to decode token and retrieve user role
@@ -116,16 +203,118 @@ def get_user_role(token: str = Depends(oauth2_scheme)):
         raise HTTPException(status_code=403, detail="Invalid or missing role")
     return role
 
-@app.get("/admin/protected")
+def require_admin(role: str = Depends(get_user_role)):
+    if role != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required")
+    return role
+
+# Operator endpoints under /admin; every route on this router needs the admin role.
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@admin_router.get("/protected")
 async def protected_endpoint():
     return {"message": "Welcome, admin!"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@admin_router.get("/profiles")
+def list_request_profiles():
+    from .request_profiler import list_profiles
+    return {"profiles": list_profiles()}
+
+@admin_router.get("/profiles/{profile_id}")
+def get_request_profile(profile_id: str, format: str = "speedscope"):
+    from .request_profiler import load_profile
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"] + "\n")
+    if format == "meta":
+        return profile["meta"]
+    return JSONResponse(profile["speedscope"], headers={
+        "Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'})
+
+@admin_router.get("/memory")
+def memory_status():
+    return memory_monitor.sample()
+
+@admin_router.post("/memory/tracemalloc/start")
+def start_tracemalloc(frames: int = 10):
+    memory_monitor.start_tracing(frames)
+    return memory_monitor.sample()
+
+@admin_router.post("/memory/tracemalloc/stop")
+def stop_tracemalloc():
+    memory_monitor.stop_tracing()
+    return memory_monitor.sample()
+
+@admin_router.post("/memory/snapshot")
+def memory_snapshot(limit: int = 25):
+    try:
+        return memory_monitor.snapshot(limit=limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@admin_router.get("/memory/diff")
+def memory_diff(base: str, target: str | None = None, limit: int = 25):
+    try:
+        return memory_monitor.diff(base, target, limit=limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown snapshot id")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@admin_router.get("/loop_lag")
+def loop_lag():
+    from .loop_monitor import loop_monitor
+    return loop_monitor.stats()
+
+@admin_router.get("/chain_mirror")
+def chain_mirror_status():
+    from .chain_mirror import chain_mirror
+    return chain_mirror.stats()
+
+@admin_router.get("/ipfs_gateways")
+def ipfs_gateway_stats():
+    from .ipfs_gateways import gateway_pool
+    return {"gateways": gateway_pool.stats(), "fetch": gateway_pool.load()}
+
+@admin_router.get("/payouts")
+def payout_stats():
+    from .payout_batcher import payout_batcher
+    return payout_batcher.stats()
+
+@admin_router.post("/reconcile")
+async def start_reconcile(restart: bool = False):
+    from .reconcile import reconcile_job
+    started = reconcile_job.start(restart=restart)
+    return {"started": started, **reconcile_job.status()}
+
+@admin_router.get("/reconcile")
+def reconcile_status():
+    from .reconcile import reconcile_job
+    return reconcile_job.status()
+
+@admin_router.get("/bulkheads")
+def bulkhead_stats():
+    from . import bulkhead
+    return bulkhead.stats()
+
+@admin_router.get("/rate_limit")
+def rate_limit_stats():
+    from .rate_limit import rate_limiter
+    return rate_limiter.stats()
+
+# Registered last: include_router copies the routes defined on admin_router so far.
+app.include_router(admin_router)
+
 @app.get("/health")
-@limiter.limit("5/minute")
-def health(request: Request):
+def health():
     return {"status": "ok"}
 
 @app.get("/secure-endpoint")
-@limiter.limit("5/minute")
-async def secure_endpoint(request: Request):
+async def secure_endpoint():
     return {"message": "This endpoint is rate-limited."}
@@ -0,0 +1,206 @@
+"""Process memory instrumentation.
+
+- Gauges (exported through /metrics): resident set size, Python heap traced by
+  tracemalloc (when tracing), registry record count and gc generation counts,
+  refreshed every MEMORY_SAMPLE_SECONDS by a daemon thread.
+- Per-request peak allocation: while tracemalloc is tracing, requests that run
+  alone have their peak traced allocation above the starting point recorded in
+  ``proofchain_request_peak_alloc_bytes`` by route. tracemalloc's peak is
+  process-wide, so requests that overlap another one are counted but not
+  measured. Without tracing the middleware does nothing.
+- Snapshots: :meth:`MemoryMonitor.snapshot` keeps the last MAX_SNAPSHOTS
+  tracemalloc snapshots by id and reports the top allocation sites;
+  :meth:`MemoryMonitor.diff` compares two of them (or one against now).
+
+Tracing costs CPU and memory of its own, so it is off unless MEMORY_TRACE=1 or
+started from ``POST /admin/memory/tracemalloc/start`` (admin role only).
+"""
+import gc
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+
+from .metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SECONDS = float(os.getenv("MEMORY_SAMPLE_SECONDS", "15"))
+MAX_SNAPSHOTS = 5
+TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+
+_MB = 1024 * 1024
+rss_bytes = Gauge("proofchain_process_resident_memory_bytes", "Resident set size of this worker")
+traced_bytes = Gauge("proofchain_python_traced_memory_bytes", "Memory traced by tracemalloc", ("kind",))
+registry_records = Gauge("proofchain_registry_records", "Records in the shared registry snapshot")
+gc_counts = Gauge("proofchain_gc_pending_objects", "Objects pending collection per gc generation", ("generation",))
+request_peak = Histogram(
+    "proofchain_request_peak_alloc_bytes", "Peak traced allocation per request (tracing only)", ("route",),
+    buckets=(64 * 1024, 256 * 1024, _MB, 4 * _MB, 16 * _MB, 64 * _MB, 256 * _MB, 1024 * _MB))
+request_peak_skipped = Counter(
+    "proofchain_request_peak_skipped_total", "Requests not measured because they overlapped another")
+
+
+def _rss() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss is a peak, in KiB on Linux and bytes on macOS; better than nothing.
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+    except Exception:
+        return None
+
+
+def _top(stats, limit: int) -> list[dict]:
+    out = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        entry = {"site": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024, 1),
+                 "count": stat.count}
+        if hasattr(stat, "size_diff"):
+            entry["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+            entry["count_diff"] = stat.count_diff
+        out.append(entry)
+    return out
+
+
+class MemoryMonitor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: OrderedDict[str, tuple] = OrderedDict()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._in_flight = 0
+        self._overlapped = False
+
+    # --- gauges ---
+
+    def sample(self) -> dict:
+        rss = _rss()
+        if rss is not None:
+            rss_bytes.set(rss)
+        current = peak = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            traced_bytes.set(current, "current")
+            traced_bytes.set(peak, "peak")
+        from . import registry
+        records = len(registry.snapshot().records)
+        registry_records.set(records)
+        for generation, count in enumerate(gc.get_count()):
+            gc_counts.set(count, str(generation))
+        return {
+            "rss_mb": round(rss / _MB, 1) if rss is not None else None,
+            "tracing": tracemalloc.is_tracing(),
+            "traced_current_mb": round(current / _MB, 1) if current is not None else None,
+            "traced_peak_mb": round(peak / _MB, 1) if peak is not None else None,
+            "registry_records": records,
+            "gc_counts": list(gc.get_count()),
+            "snapshots": [{"id": sid, "taken_at": taken_at} for sid, (taken_at, _) in self._snapshots.items()],
+        }
+
+    def start(self) -> None:
+        if os.getenv("MEMORY_TRACE", "").lower() in ("1", "true", "yes"):
+            self.start_tracing()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning("sample failed: %s", e)
+            self._stopping.wait(SAMPLE_SECONDS)
+
+    # --- tracemalloc ---
+
+    def start_tracing(self, frames: int = TRACE_FRAMES) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info("tracemalloc started (%s frames)", frames)
+
+    def stop_tracing(self) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def snapshot(self, limit: int = 25) -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        snapshot_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._snapshots[snapshot_id] = (time.time(), snap)
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        stats = snap.statistics("lineno")
+        return {
+            "id": snapshot_id,
+            "total_kb": round(sum(s.size for s in stats) / 1024, 1),
+            "top": _top(stats, limit),
+        }
+
+    def diff(self, base_id: str, target_id: str | None = None, limit: int = 25) -> dict:
+        """Top allocation growth from snapshot base_id to target_id (default: a fresh snapshot)."""
+        with self._lock:
+            base = self._snapshots.get(base_id)
+            target = self._snapshots.get(target_id) if target_id else None
+        if base is None or (target_id and target is None):
+            raise KeyError("unknown snapshot id")
+        if target is None:
+            target_id = self.snapshot(limit=0)["id"]
+            target = self._snapshots[target_id]
+        stats = target[1].compare_to(base[1], "lineno")
+        return {
+            "base": base_id,
+            "target": target_id,
+            "size_diff_kb": round(sum(s.size_diff for s in stats) / 1024, 1),
+            "top": _top(stats, limit),
+        }
+
+    # --- per-request peaks ---
+
+    def request_started(self) -> int | None:
+        """Returns the traced size at request start, or None when not measuring."""
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            self._in_flight += 1
+            if self._in_flight == 1:
+                self._overlapped = False
+                tracemalloc.reset_peak()
+            else:
+                self._overlapped = True
+        return tracemalloc.get_traced_memory()[0]
+
+    def request_finished(self, start: int, route: str) -> None:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            self._in_flight -= 1
+            alone = not self._overlapped
+        if alone and peak:
+            request_peak.observe(max(0, peak - start), route)
+        else:
+            request_peak_skipped.inc()
+
+
+memory_monitor = MemoryMonitor()
@@ -0,0 +1,243 @@
+"""Batched server payouts from the deployer account.
+
+Callers (server_pay, the generate_media fee payout) enqueue a payment and get a
+:class:`PayoutJob` back. A daemon thread collects queued payments and submits
+them as one atomic group of up to MAX_GROUP_SIZE transactions, flushing when a
+group is full or FLUSH_SECONDS after the first payment of the batch arrived.
+Each payment keeps its own txid, which is handed to the tx tracker; a lease
+derived from the job's idempotency key (or id) keeps txids unique within a
+group.
+
+The deployer key is derived from DEPLOYER_MNEMONIC once and cached. A group
+that algod rejects is retried one transaction at a time, so a single bad
+payment fails alone instead of taking the rest of the batch with it. Transport
+errors are not retried, since the group may already have been committed.
+
+An idempotency key passed to :meth:`PayoutBatcher.submit` returns the existing
+job for that key (kept for the last MAX_JOBS jobs, in memory), so a retried
+request does not pay twice.
+"""
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+MAX_GROUP_SIZE = 16
+FLUSH_SECONDS = float(os.getenv("PAYOUT_FLUSH_MS", "250")) / 1000.0
+MAX_JOBS = 10_000
+
+
+def _rejected_by_node(error: Exception) -> bool:
+    from algosdk.error import AlgodHTTPError
+    return isinstance(error, AlgodHTTPError)
+
+
+class PayoutJob:
+    def __init__(self, receiver: str, amount: int, note: bytes | None, idempotency_key: str | None):
+        self.id = uuid.uuid4().hex
+        self.receiver = receiver
+        self.amount = int(amount)
+        self.note = note
+        self.idempotency_key = idempotency_key
+        self.status = "queued"
+        self.txid = None
+        self.group_id = None
+        self.error = None
+        self.created_at = time.time()
+        self._done = threading.Event()
+
+    @property
+    def lease(self) -> bytes:
+        """32-byte txn lease from the idempotency key (else the job id).
+
+        Jobs in a group share suggested params, so without it two payments with
+        the same receiver, amount and note would have the same txid. Algod also
+        rejects a second txn with the same sender and lease while the first is
+        valid, which backs the idempotency key across workers.
+        """
+        return hashlib.sha256(f"proofchain-payout:{self.idempotency_key or self.id}".encode("utf-8")).digest()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until the payment was submitted or failed; False on timeout."""
+        return self._done.wait(timeout)
+
+    def _finish(self, status: str, txid: str | None = None, error: str | None = None) -> None:
+        self.status, self.txid, self.error = status, txid, error
+        self._done.set()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "txid": self.txid,
+            "group_id": self.group_id,
+            "amount": self.amount,
+            "error": self.error,
+            "created_at": self.created_at,
+        }
+
+
+class PayoutBatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._queue: list[PayoutJob] = []
+        self._jobs: OrderedDict[str, PayoutJob] = OrderedDict()
+        self._by_key: dict[str, PayoutJob] = {}
+        self._thread = None
+        self._stopping = False
+        self._signer_cache = None
+        self._stats = {"groups": 0, "payments": 0, "failed": 0, "fallbacks": 0}
+
+    # --- producers ---
+
+    def submit(self, receiver: str, amount: int, note: bytes | None = None,
+               idempotency_key: str | None = None) -> PayoutJob:
+        with self._lock:
+            existing = self._by_key.get(idempotency_key) if idempotency_key else None
+            if existing is not None and existing.status != "failed":
+                return existing
+            job = PayoutJob(receiver, amount, note, idempotency_key)
+            self._jobs[job.id] = job
+            if idempotency_key:
+                self._by_key[idempotency_key] = job
+            while len(self._jobs) > MAX_JOBS:
+                _, old = self._jobs.popitem(last=False)
+                # A failed job's key may since point at its retry; keep that one.
+                if old.idempotency_key and self._by_key.get(old.idempotency_key) is old:
+                    del self._by_key[old.idempotency_key]
+            self._queue.append(job)
+        self.start()
+        self._wake.set()
+        return job
+
+    def job(self, job_id: str) -> PayoutJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"queued": len(self._queue), **self._stats,
+                    "running": bool(self._thread and self._thread.is_alive())}
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="payout-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued, then stop the worker."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- worker ---
+
+    def _signer(self) -> tuple:
+        """(private_key, address) for DEPLOYER_MNEMONIC, derived once per mnemonic."""
+        from .config import settings
+        mn = (getattr(settings, 'DEPLOYER_MNEMONIC', None) or "").replace('"', '').strip()
+        if not mn:
+            raise RuntimeError("DEPLOYER_MNEMONIC not configured on server")
+        cached = self._signer_cache
+        if cached is None or cached[0] != mn:
+            from algosdk import account, mnemonic
+            priv = mnemonic.to_private_key(mn)
+            cached = self._signer_cache = (mn, priv, account.address_from_private_key(priv))
+        return cached[1], cached[2]
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            batch, self._queue = self._queue[:MAX_GROUP_SIZE], self._queue[MAX_GROUP_SIZE:]
+        return batch
+
+    def _send(self, jobs: list) -> None:
+        """Sign and submit `jobs` as one group (or a single txn); raises on rejection."""
+        from algosdk import transaction
+        from .algorand_app_utils import algod_service
+        priv, sender = self._signer()
+        params = algod_service.suggested_params()
+        txns = [transaction.PaymentTxn(sender, params, job.receiver, job.amount, None, job.note, lease=job.lease)
+                for job in jobs]
+        group_id = None
+        if len(txns) > 1:
+            transaction.assign_group_id(txns)
+            group_id = txns[0].group
+        signed = [txn.sign(priv) for txn in txns]
+        with stage_timer("algod"):
+            algod_service.client.send_transactions(signed)
+        from .tx_tracker import tx_tracker
+        for job, txn in zip(jobs, txns):
+            txid = txn.get_txid()
+            job.group_id = base64.b64encode(group_id).decode() if group_id else None
+            job._finish("submitted", txid=txid)
+            tx_tracker.track(txid, last_valid=txn.last_valid_round)
+
+    def _process(self, batch: list) -> None:
+        try:
+            self._send(batch)
+            self._stats["groups"] += 1
+            self._stats["payments"] += len(batch)
+            return
+        except Exception as e:
+            # Only a rejection by the node proves nothing was committed; after a
+            # transport error the group may have landed, so it is not resent.
+            if len(batch) == 1 or not _rejected_by_node(e):
+                logger.error("%s payment(s) failed: %s", len(batch), e)
+                for job in batch:
+                    job._finish("failed", error=str(e))
+                self._stats["failed"] += len(batch)
+                return
+            logger.warning("group of %s rejected (%s); retrying individually", len(batch), e)
+            self._stats["fallbacks"] += 1
+        for job in batch:
+            self._process([job])
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                pending = len(self._queue)
+            if not pending:
+                if self._stopping:
+                    return
+                continue
+            if pending < MAX_GROUP_SIZE and not self._stopping:
+                # Give concurrent requests a moment to join this group.
+                deadline = time.monotonic() + FLUSH_SECONDS
+                while time.monotonic() < deadline:
+                    with self._lock:
+                        if len(self._queue) >= MAX_GROUP_SIZE:
+                            break
+                    time.sleep(0.01)
+            batch = self._take_batch()
+            if batch:
+                try:
+                    self._process(batch)
+                except Exception as e:
+                    for job in batch:
+                        if not job._done.is_set():
+                            job._finish("failed", error=str(e))
+            with self._lock:
+                if self._queue or self._stopping:
+                    self._wake.set()
+
+
+payout_batcher = PayoutBatcher()
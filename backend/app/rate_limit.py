@@ -0,0 +1,369 @@
+"""Per-client rate limiting shared by every worker process.
+
+Each client (by remote address) has one token bucket holding up to
+RATE_LIMIT_BURST tokens, refilled at RATE_LIMIT_PER_MINUTE tokens a minute. A
+request spends its route's cost (1 unless listed in ROUTE_COSTS or
+RATE_LIMIT_COSTS), so one classify costs as much as ten cheap reads. When the
+bucket cannot cover the cost the request is answered with 429 and a Retry-After
+header telling the client when it can.
+
+Buckets live in a shared store so limits hold across uvicorn workers:
+
+- ``mmap`` (default): a fixed-size hash table in ``data/ratelimit.bin``,
+  memory-mapped by every worker on the host and updated under ``flock``.
+  When all slots in a key's probe window are taken, the least recently used
+  one is reused; that client simply starts again with a full bucket.
+- ``redis``: one hash per client updated by a Lua script, for a local
+  Redis-compatible server at RATE_LIMIT_REDIS_URL (needs the ``redis``
+  package). Store errors fail open.
+- ``memory``: per-process dict, for single-worker runs and platforms without
+  ``fcntl``.
+
+Select with RATE_LIMIT_BACKEND; RATE_LIMIT_ENABLED=false turns limiting off.
+The store is built at import; a backend that cannot be used falls back to the
+next one (redis -> mmap -> memory) with a warning.
+
+The middleware takes local stores' locks without blocking the event loop: if
+another worker holds the mmap flock, the check is retried in a thread.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from . import registry
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+BACKEND = os.getenv("RATE_LIMIT_BACKEND", "mmap").strip().lower()
+BURST = float(os.getenv("RATE_LIMIT_BURST", "60"))
+PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "120"))
+MMAP_FILE = registry.DATA_PATH / "ratelimit.bin"
+MMAP_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+PROBE_LIMIT = 16
+REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Budget spent per request, by exact path. Anything else costs 1.
+ROUTE_COSTS = {
+    "/media/classify": 10,
+    "/media/register": 10,
+    "/media/register_debug": 10,
+    "/media/search_similar": 8,
+    "/media/remove_watermark": 10,
+    "/media/generate": 20,
+    "/ai/generate": 20,
+    "/media/upload": 5,
+    "/media/server_pay": 10,
+    "/media/broadcast_signed_tx": 3,
+    "/media/broadcast_signed_app_tx": 3,
+    "/media/broadcast_signed_group": 3,
+    "/api/kyc/start": 5,
+    "/api/kyc/send_email": 5,
+    "/api/kyc/send_otp": 5,
+}
+# Never limited: metrics scrapes. /admin routes are limited like any other.
+EXEMPT_PREFIXES = ("/metrics",)
+
+limited_total = Counter("proofchain_rate_limited_total", "Requests rejected by the rate limiter", ("path",))
+
+
+def _parse_costs(raw: str | None) -> dict[str, float]:
+    costs = {}
+    for part in (raw or "").split(","):
+        path, _, value = part.partition("=")
+        if path.strip() and value.strip():
+            try:
+                costs[path.strip()] = float(value)
+            except ValueError:
+                pass
+    return costs
+
+
+def _refill(tokens: float, last: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - last) * rate)
+
+
+class MemoryBucketStore:
+    """Buckets in a dict; only shared between threads of one process."""
+
+    name = "memory"
+    remote = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, key: str, cost: float, capacity: float, rate: float,
+             blocking: bool = True) -> tuple[bool, float] | None:
+        """Spend `cost` tokens from `key`'s bucket. Returns (allowed, tokens left).
+
+        With blocking=False, returns None instead of waiting for a busy lock.
+        """
+        now = time.time()
+        if not self._lock.acquire(blocking):
+            return None
+        try:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, last, now, capacity, rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MMAP_SLOTS:
+                # Drop buckets idle long enough to be full again.
+                horizon = now - capacity / rate
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= horizon}
+        finally:
+            self._lock.release()
+        return allowed, tokens
+
+
+class MmapBucketStore:
+    """Open-addressed table of (key hash, tokens, last update) slots in a shared file.
+
+    flock serialises worker processes; the thread lock covers threads of this
+    process, which share one open file description and so one flock.
+    """
+
+    name = "mmap"
+    remote = False
+    _HEADER = struct.Struct("<4sII")
+    _SLOT = struct.Struct("<Qdd")
+    _MAGIC = b"PCRL"
+    _VERSION = 1
+
+    def __init__(self, path=MMAP_FILE, slots: int = MMAP_SLOTS):
+        import fcntl  # noqa: F401  (fail here on platforms without it)
+        self.path = path
+        self.slots = slots
+        self.size = self._HEADER.size + slots * self._SLOT.size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _open(self) -> None:
+        # Reopen after fork so each worker holds its own lock.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        import fcntl
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0, os.SEEK_END)
+            fresh = f.tell() != self.size
+            if not fresh:
+                f.seek(0)
+                magic, version, slots = self._HEADER.unpack(f.read(self._HEADER.size))
+                fresh = (magic, version, slots) != (self._MAGIC, self._VERSION, self.slots)
+            if fresh:
+                f.truncate(0)
+                f.truncate(self.size)
+                f.seek(0)
+                f.write(self._HEADER.pack(self._MAGIC, self._VERSION, self.slots))
+                f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        self._file = f
+        self._map = mmap.mmap(f.fileno(), self.size)
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # 0 marks an empty slot.
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def take(self, key: str, cost: float, capacity: float, rate: float,
+             blocking: bool = True) -> tuple[bool, float] | None:
+        import fcntl
+        h = self._hash(key)
+        now = time.time()
+        if not self._lock.acquire(blocking):
+            return None
+        try:
+            if self._pid != os.getpid():
+                self._open()
+            m = self._map
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                target = victim = None
+                victim_last = math.inf
+                for i in range(PROBE_LIMIT):
+                    offset = self._HEADER.size + ((h + i) % self.slots) * self._SLOT.size
+                    slot_hash, tokens, last = self._SLOT.unpack_from(m, offset)
+                    if slot_hash == h:
+                        target = offset
+                        tokens = _refill(tokens, last, now, capacity, rate)
+                        break
+                    if slot_hash == 0:
+                        target, tokens = offset, capacity
+                        break
+                    if last < victim_last:
+                        victim, victim_last = offset, last
+                if target is None:
+                    target, tokens = victim, capacity
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._SLOT.pack_into(m, target, h, tokens, now)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+        return allowed, tokens
+
+
+_REDIS_TAKE = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local last = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Buckets in a Redis-compatible server, updated atomically by a Lua script."""
+
+    name = "redis"
+    remote = True
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "proofchain:ratelimit:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the 'redis' package") from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._take = self._client.register_script(_REDIS_TAKE)
+
+    def take(self, key: str, cost: float, capacity: float, rate: float,
+             blocking: bool = True) -> tuple[bool, float]:
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, rate, cost, time.time()])
+        return bool(allowed), float(tokens)
+
+
+def _make_store(backend: str = BACKEND):
+    if backend == "redis":
+        try:
+            return RedisBucketStore()
+        except Exception as e:
+            logger.warning("redis rate limit store unavailable (%s); falling back to mmap", e)
+            backend = "mmap"
+    if backend == "mmap":
+        try:
+            return MmapBucketStore()
+        except ImportError:
+            logger.warning("fcntl unavailable; rate limits are per process")
+    elif backend != "memory":
+        logger.warning("unknown RATE_LIMIT_BACKEND %r; using memory", backend)
+    return MemoryBucketStore()
+
+
+class RateLimiter:
+    def __init__(self, capacity: float = BURST, per_minute: float = PER_MINUTE, costs: dict | None = None,
+                 store=None):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.costs = {**ROUTE_COSTS, **_parse_costs(os.getenv("RATE_LIMIT_COSTS")), **(costs or {})}
+        self.store = store if store is not None else _make_store()
+        self._stats = {"allowed": 0, "limited": 0, "store_errors": 0, "deferred": 0}
+
+    def cost(self, path: str) -> float:
+        # A cost above the burst could never be paid.
+        return min(self.costs.get(path, 1), self.capacity)
+
+    def check(self, client: str, path: str, blocking: bool = True) -> tuple[bool, float] | None:
+        """Charge `client` for a request to `path`. Returns (allowed, retry_after seconds).
+
+        With blocking=False, returns None (nothing charged) if the store's lock is busy.
+        """
+        cost = self.cost(path)
+        try:
+            taken = self.store.take(client, cost, self.capacity, self.rate, blocking=blocking)
+        except Exception as e:
+            # Fail open: an unavailable store must not take the API down.
+            self._stats["store_errors"] += 1
+            logger.warning("rate limit store error, allowing request: %s", e)
+            return True, 0.0
+        if taken is None:
+            return None
+        allowed, tokens = taken
+        if allowed:
+            self._stats["allowed"] += 1
+            return True, 0.0
+        self._stats["limited"] += 1
+        return False, (cost - tokens) / self.rate
+
+    async def acheck(self, client: str, path: str) -> tuple[bool, float]:
+        """check() for the event loop: network stores and contended local locks are waited on in a thread."""
+        if not self.store.remote:
+            result = self.check(client, path, blocking=False)
+            if result is not None:
+                return result
+            self._stats["deferred"] += 1
+        return await asyncio.to_thread(self.check, client, path)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ENABLED,
+            "backend": self.store.name,
+            "burst": self.capacity,
+            "per_minute": self.rate * 60.0,
+            "costs": self.costs,
+            **self._stats,
+        }
+
+
+rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (not ENABLED or scope["type"] != "http" or scope.get("method") == "OPTIONS"
+                or path.startswith(EXEMPT_PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+        client = (scope.get("client") or ("unknown", 0))[0]
+        allowed, retry_after = await self.limiter.acheck(client, path)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+        limited_total.inc(path if path in self.limiter.costs else "other")
+        body = json.dumps({"detail": "Rate limit exceeded. Please try again later."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
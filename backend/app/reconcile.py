@@ -0,0 +1,276 @@
+"""Registry <-> chain reconciliation sweep.
+
+Walks the registry in pages and, for every record, checks against the chain:
+  - algo_tx / app_tx: confirmed or not (records the tx tracker already marked
+    confirmed are skipped). Old transactions are only visible to an indexer, so
+    INDEXER_ADDRESS is used when configured; plain algod only knows pending and
+    recently confirmed ones and anything else is reported as "unknown".
+  - unique_reg_key: whether the registration box exists. A box found in the
+    local chain mirror is present; "missing" is only taken from the mirror
+    while it is fresh (synced recently), otherwise algod is asked.
+
+Lookups for a page run concurrently on a bounded worker pool (CONCURRENCY
+in-flight calls) behind a token bucket (RATE_PER_SECOND), with identical
+txids/box keys in a page looked up once. Results are written back as
+``<field>_status`` / ``<field>_confirmed_round``, ``reg_box_status`` and
+``reconciled_at`` through registry.update_media in batches of WRITE_EVERY
+records (in-place updates, so listeners and caches are kept); a checkpoint is
+written after each batch, so an interrupted sweep resumes there.
+
+Run with ``python scripts/reconcile_registry.py`` or via ``POST /admin/reconcile``.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = registry.DATA_PATH / "reconcile.checkpoint.json"
+PAGE_SIZE = 1000
+CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "32"))
+RATE_PER_SECOND = float(os.getenv("RECONCILE_RATE_PER_SECOND", "200"))
+WRITE_EVERY = int(os.getenv("RECONCILE_WRITE_EVERY", "10000"))
+TX_FIELDS = ("algo_tx", "app_tx")
+
+
+class _TokenBucket:
+    """Async token bucket: allows `rate` acquisitions per second with bursts up to `rate`."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _indexer():
+    from .config import settings
+    address = getattr(settings, "INDEXER_ADDRESS", None)
+    if not address:
+        return None
+    from algosdk.v2client import indexer
+    return indexer.IndexerClient(getattr(settings, "INDEXER_TOKEN", None) or "", address)
+
+
+def _read_checkpoint() -> dict:
+    try:
+        return json.loads(CHECKPOINT_FILE.read_text())
+    except Exception:
+        return {}
+
+
+def _write_checkpoint(next_index: int, started_at: float) -> None:
+    tmp = CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"next_index": next_index, "started_at": started_at}))
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+class Reconciler:
+    def __init__(self, page_size: int = PAGE_SIZE, concurrency: int = CONCURRENCY,
+                 rate: float = RATE_PER_SECOND, progress: Callable[[str], None] = print,
+                 write_every: int = WRITE_EVERY):
+        self.page_size = page_size
+        self.write_every = max(write_every, page_size)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.progress = progress
+        self.status = {"state": "idle"}
+        self._app_id = None
+        self._algod = None
+        self._indexer = None
+        self._bucket = None
+        self._executor = None
+
+    # --- blocking lookups (run in worker threads) ---
+
+    def _lookup_tx(self, txid: str) -> dict:
+        if self._indexer is not None:
+            try:
+                info = self._indexer.transaction(txid).get("transaction", {})
+                confirmed = info.get("confirmed-round")
+                if confirmed:
+                    return {"status": "confirmed", "confirmed_round": confirmed}
+            except Exception:
+                pass
+        try:
+            info = self._algod.pending_transaction_info(txid)
+        except Exception:
+            # Not in the pool or recent history; only an indexer could tell more.
+            return {"status": "missing" if self._indexer is not None else "unknown", "confirmed_round": None}
+        confirmed = info.get("confirmed-round") or info.get("confirmed_round")
+        if confirmed:
+            return {"status": "confirmed", "confirmed_round": confirmed}
+        if info.get("pool-error"):
+            return {"status": "failed", "confirmed_round": None}
+        return {"status": "pending", "confirmed_round": None}
+
+    def _lookup_box(self, reg_key_hex: str) -> str:
+        from .chain_mirror import chain_mirror
+        if chain_mirror.synced_round() is not None:
+            if chain_mirror.reg_sender(reg_key_hex):
+                return "present"
+            if chain_mirror.is_fresh():
+                return "missing"
+        try:
+            self._algod.application_box_by_name(self._app_id, bytes.fromhex(reg_key_hex))
+            return "present"
+        except Exception as e:
+            if "not found" in str(e).lower():
+                return "missing"
+            return "unknown"
+
+    # --- sweep ---
+
+    async def _run_bounded(self, keys, fn) -> dict:
+        sem = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def one(key):
+            async with sem:
+                await self._bucket.acquire()
+                return key, await loop.run_in_executor(self._executor, fn, key)
+
+        return dict(await asyncio.gather(*(one(k) for k in keys)))
+
+    async def _check_page(self, page: list) -> dict:
+        """Look up every unresolved txid / reg key in the page; returns {index: (reg_key, algo_tx, patch)}."""
+        txids, boxes = set(), set()
+        for _, item in page:
+            for field in TX_FIELDS:
+                if item.get(field) and item.get(f"{field}_status") != "confirmed":
+                    txids.add(item[field])
+            if item.get("unique_reg_key") and self._app_id and item.get("reg_box_status") != "present":
+                boxes.add(item["unique_reg_key"])
+        tx_results, box_results = await asyncio.gather(
+            self._run_bounded(txids, self._lookup_tx),
+            self._run_bounded(boxes, self._lookup_box),
+        )
+        now = time.time()
+        patches = {}
+        for index, item in page:
+            patch = {}
+            for field in TX_FIELDS:
+                result = tx_results.get(item.get(field))
+                if result is not None:
+                    patch[f"{field}_status"] = result["status"]
+                    if result["confirmed_round"]:
+                        patch[f"{field}_confirmed_round"] = result["confirmed_round"]
+            box = box_results.get(item.get("unique_reg_key"))
+            if box is not None:
+                patch["reg_box_status"] = box
+            patch["reconciled_at"] = now
+            patches[index] = (item.get("unique_reg_key"), item.get("algo_tx"), patch)
+        return patches
+
+    @staticmethod
+    def _write_back(patches: dict) -> None:
+        # Applied under the registry lock to the current records, so writes made
+        # by requests during the lookups are kept; a patch only lands if its
+        # record is still at the same position.
+        def apply(media: list) -> bool:
+            changed = False
+            for index, (reg_key, algo_tx, patch) in patches.items():
+                if index < len(media) and isinstance(media[index], dict):
+                    item = media[index]
+                    if item.get("unique_reg_key") == reg_key and item.get("algo_tx") == algo_tx:
+                        item.update(patch)
+                        changed = True
+            return changed
+
+        registry.update_media(apply, in_place=True)
+
+    async def run(self, restart: bool = False) -> dict:
+        from .config import settings
+        from .algorand_app_utils import algod_service
+        self._algod = algod_service.client
+        self._indexer = _indexer()
+        self._app_id = int(settings.proofchain_app_id) if getattr(settings, "proofchain_app_id", None) else None
+        self._bucket = _TokenBucket(self.rate)
+
+        checkpoint = {} if restart else _read_checkpoint()
+        start = checkpoint.get("next_index", 0)
+        started_at = checkpoint.get("started_at") or time.time()
+        # snapshot() may re-parse the registry file; keep that off the event loop.
+        total = len((await asyncio.to_thread(registry.snapshot)).records)
+        if start:
+            self.progress(f"[reconcile] resuming at record {start}/{total}")
+        if self._indexer is None:
+            self.progress("[reconcile] INDEXER_ADDRESS not set: old transactions will be reported as 'unknown'")
+        self.status = {"state": "running", "total": total, "done": start, "started_at": started_at}
+        counts: dict[str, int] = {}
+        t0 = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reconcile")
+        pending: dict = {}
+        try:
+            for page_start in range(start, total, self.page_size):
+                records = (await asyncio.to_thread(registry.snapshot)).records
+                page = [(i, records[i]) for i in range(page_start, min(page_start + self.page_size, len(records)))
+                        if isinstance(records[i], dict)]
+                patches = await self._check_page(page)
+                pending.update(patches)
+                page_end = page_start + self.page_size
+                if len(pending) >= self.write_every or page_end >= total:
+                    await asyncio.to_thread(self._write_back, pending)
+                    pending = {}
+                    _write_checkpoint(min(page_end, total), started_at)
+                for _, _, patch in patches.values():
+                    for key in ("algo_tx_status", "reg_box_status"):
+                        if key in patch:
+                            label = f"{key}:{patch[key]}"
+                            counts[label] = counts.get(label, 0) + 1
+                done = min(page_end, total)
+                self.status.update(done=done, counts=dict(counts))
+                self.progress(f"[reconcile] {done}/{total} records, {time.monotonic() - t0:.1f}s, {counts}")
+        finally:
+            self._executor.shutdown(wait=False)
+        CHECKPOINT_FILE.unlink(missing_ok=True)
+        self.status.update(state="finished", finished_at=time.time(), counts=dict(counts))
+        return self.status
+
+
+class ReconcileJob:
+    """Runs at most one sweep at a time as a task on the server's event loop."""
+
+    def __init__(self):
+        self._task = None
+        self.reconciler = None
+
+    def start(self, restart: bool = False) -> bool:
+        if self._task is not None and not self._task.done():
+            return False
+        self.reconciler = Reconciler(progress=logger.info)
+        self._task = asyncio.get_running_loop().create_task(self._run(restart))
+        return True
+
+    async def _run(self, restart: bool) -> None:
+        try:
+            await self.reconciler.run(restart=restart)
+        except Exception as e:
+            logger.error("sweep failed: %s", e)
+            self.reconciler.status.update(state="failed", error=str(e))
+
+    def status(self) -> dict:
+        if self.reconciler is None:
+            return {"state": "idle", "checkpoint": _read_checkpoint() or None}
+        return self.reconciler.status
+
+
+reconcile_job = ReconcileJob()
@@ -0,0 +1,329 @@
+"""Access helpers for the local media registry (``data/registered_media.json``).
+
+The registry is parsed once per process into a :class:`RegistrySnapshot` that
+every read path shares. The snapshot is swapped when:
+  - this process writes the registry (no re-parse needed), or
+  - the file's (inode, mtime_ns, size) signature changes because another worker
+    or a script rewrote it, in which case it is re-read on the next access.
+
+Snapshot records are shared between requests and must be treated as read-only.
+Request handlers and background jobs change records through :func:`update_media`
+or :func:`append_media`, which re-read and write the file while holding an
+exclusive lock (a thread lock plus ``flock`` on ``registered_media.lock`` across
+workers), so concurrent writers cannot overwrite each other's changes.
+:func:`load_media` / :func:`save_media` remain for offline scripts.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from functools import cached_property
+from pathlib import Path
+from typing import Callable
+
+from .metrics import cache_events, stage_timer
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; only the thread lock applies there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = Path(__file__).resolve().parent / "data"
+MEDIA_FILE = DATA_PATH / "registered_media.json"
+META_FILE = DATA_PATH / "registry_meta.json"
+LOCK_FILE = DATA_PATH / "registered_media.lock"
+
+# Bump together with a new entry in registry_migrations.MIGRATIONS.
+SCHEMA_VERSION = 1
+
+# Listeners are called as listener(event, records, snapshot) whenever the shared
+# snapshot changes:
+#   - event "append": `records` were appended to the registry
+#   - event "update": existing records were replaced in place (same positions,
+#                     nothing added or removed, see update_media(in_place=True));
+#                     `records` is a list of (old, new) record pairs
+#   - event "reset":  the registry was rewritten or reloaded; `records` is the full list
+# `snapshot` is the new RegistrySnapshot.
+_listeners: list[Callable] = []
+_lock = threading.RLock()
+_lock_depth = 0
+_current = None
+_version = 0
+_generation = 0
+
+
+def _normalize_sha(value) -> str | None:
+    if not isinstance(value, str) or not value:
+        return None
+    return (value[2:] if value.startswith("0x") else value).lower()
+
+
+class RegistrySnapshot:
+    """Immutable view of the registry plus lazily built lookup indexes.
+
+    - version:    bumped on every change seen by this process
+    - generation: bumped only when records were rewritten (not just appended
+                  or updated in place)
+    - token:      derived from the file signature; identical across workers
+                  looking at the same file contents
+    - etag_version: token prefixed with the file mtime, so it also increases
+    """
+
+    def __init__(self, records: tuple, signature, version: int, generation: int):
+        self.records = records
+        self.signature = signature
+        self.version = version
+        self.generation = generation
+
+    @property
+    def exists(self) -> bool:
+        return self.signature is not None
+
+    @cached_property
+    def token(self) -> str:
+        return hashlib.sha256(repr(self.signature).encode("utf-8")).hexdigest()[:16]
+
+    @cached_property
+    def etag_version(self) -> str:
+        """Registry version for HTTP validators: the file's mtime_ns (increasing with
+        every write, the same in all workers) qualified by the token."""
+        if self.signature is None:
+            return "0"
+        return f"{self.signature[1]:x}.{self.token[:8]}"
+
+    @cached_property
+    def by_sha256(self) -> dict:
+        """Normalized (lowercase, no 0x) sha256_hash -> first matching record."""
+        index = {}
+        for item in self.records:
+            if isinstance(item, dict):
+                key = _normalize_sha(item.get("sha256_hash"))
+                if key and key not in index:
+                    index[key] = item
+        return index
+
+    @cached_property
+    def by_content_key(self) -> dict:
+        index: dict[str, list] = {}
+        for item in self.records:
+            if isinstance(item, dict) and item.get("content_key"):
+                index.setdefault(item["content_key"], []).append(item)
+        return index
+
+    @cached_property
+    def by_cid(self) -> dict:
+        index: dict[str, list] = {}
+        for item in self.records:
+            if isinstance(item, dict) and item.get("ipfs_cid"):
+                index.setdefault(item["ipfs_cid"], []).append(item)
+        return index
+
+    def file_url_for_cid(self, cid: str | None) -> str | None:
+        """file_url of the first record with this CID that has one."""
+        for item in self.by_cid.get(cid, ()) if cid else ():
+            if item.get("file_url"):
+                return item["file_url"]
+        return None
+
+
+def subscribe(listener: Callable) -> Callable:
+    """Register a change listener (usable as a decorator)."""
+    _listeners.append(listener)
+    return listener
+
+
+def _notify(event: str, records, snapshot: RegistrySnapshot) -> None:
+    for listener in list(_listeners):
+        try:
+            listener(event, records, snapshot)
+        except Exception as e:
+            logger.error("listener %s failed: %s", getattr(listener, '__name__', listener), e)
+
+
+def file_signature() -> tuple | None:
+    """Cheap change detector for the registry file: (inode, mtime_ns, size)."""
+    try:
+        st = MEDIA_FILE.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_file() -> list:
+    if not MEDIA_FILE.exists():
+        return []
+    try:
+        with stage_timer("registry_parse"):
+            media = json.loads(MEDIA_FILE.read_text())
+    except Exception:
+        return []
+    return media if isinstance(media, list) else []
+
+
+def _install(records: tuple, signature, *, rewritten: bool) -> RegistrySnapshot:
+    global _current, _version, _generation
+    _version += 1
+    if rewritten:
+        _generation += 1
+    _current = RegistrySnapshot(records, signature, _version, _generation)
+    return _current
+
+
+def snapshot() -> RegistrySnapshot:
+    """Return the shared snapshot, re-reading the file only if it changed on disk."""
+    signature = file_signature()
+    current = _current
+    if current is not None and current.signature == signature:
+        cache_events.inc("registry_snapshot", "hit")
+        return current
+    cache_events.inc("registry_snapshot", "miss")
+    with _lock:
+        current = _current
+        if current is not None and current.signature == signature:
+            return current
+        records = tuple(_read_file())
+        # Signature taken before the read; a write racing the read is picked up next time.
+        snap = _install(records, signature, rewritten=True)
+    _notify("reset", records, snap)
+    return snap
+
+
+def invalidate() -> None:
+    """Drop the shared snapshot so the next access re-reads the file."""
+    global _current
+    with _lock:
+        _current = None
+
+
+@contextmanager
+def _exclusive():
+    """Hold the registry lock in this process and, via flock, against other workers (re-entrant)."""
+    global _lock_depth
+    with _lock:
+        handle = None
+        if _lock_depth == 0:
+            DATA_PATH.mkdir(parents=True, exist_ok=True)
+            handle = open(LOCK_FILE, "a+b")
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if handle is not None:
+                handle.close()
+
+
+def _write(media: list, *, rewritten: bool) -> RegistrySnapshot:
+    """Write `media` and install it as the snapshot; caller holds _exclusive()."""
+    tmp = MEDIA_FILE.with_suffix(f".json.{os.getpid()}.tmp")
+    with stage_timer("persist"):
+        tmp.write_text(json.dumps(media, indent=2))
+        os.replace(tmp, MEDIA_FILE)
+    return _install(tuple(media), file_signature(), rewritten=rewritten)
+
+
+def _extends_current(media: list, added: int) -> bool:
+    """True if `media` is the current snapshot's records followed by `added` new ones."""
+    current = snapshot()
+    prefix = len(media) - added
+    if prefix != len(current.records):
+        return False
+    return all(a is b or a == b for a, b in zip(current.records, media[:prefix]))
+
+
+def load_media() -> list:
+    """Mutable copy of the registry for code that edits records before save_media()."""
+    return [dict(item) if isinstance(item, dict) else item for item in snapshot().records]
+
+
+def save_media(media: list, *, appended: list | None = None) -> None:
+    """Persist the full registry list, swap the shared snapshot and notify listeners.
+
+    Pass `appended` when the only change is new records at the end of `media`;
+    listeners can then update incrementally instead of rebuilding. That is only
+    trusted when the rest of `media` still equals the current snapshot (another
+    writer may have saved in between); otherwise the save is a "reset". The
+    records in `media` become the shared snapshot and must not be modified
+    afterwards.
+    """
+    with _exclusive():
+        if appended is not None and not _extends_current(media, len(appended)):
+            logger.info("save_media(appended=...) does not extend the current registry; saving as a rewrite")
+            appended = None
+        snap = _write(media, rewritten=appended is None)
+    if appended is not None:
+        _notify("append", appended, snap)
+    else:
+        _notify("reset", snap.records, snap)
+
+
+def _changed_in_place(old: tuple, media: list) -> list | None:
+    """(old, new) pairs for the records of `media` that differ from `old`, or None
+    if records were added, removed or moved."""
+    if len(media) != len(old):
+        return None
+    changed = []
+    for before, after in zip(old, media):
+        if before != after:
+            if not (isinstance(before, dict) and isinstance(after, dict)):
+                return None
+            changed.append((before, after))
+    return changed
+
+
+def update_media(patch: Callable[[list], bool], *, in_place: bool = False) -> bool:
+    """Locked read-modify-write: apply `patch` to a fresh copy of the registry.
+
+    The copy is taken under the exclusive lock, so it includes every write that
+    finished before, and it is saved only if `patch` returns True. Keep `patch`
+    fast; do slow work (fetching, embedding) before calling.
+
+    The save is a "reset" unless `in_place` is set: then `patch` promises to only
+    change bookkeeping fields of existing records (tx status, confirmed round,
+    timestamps), nothing listeners index or classify scores depend on, and the
+    save is an "update" that keeps the generation. A patch that adds, removes or
+    reorders records is saved as a "reset" regardless.
+    """
+    with _exclusive():
+        old = snapshot().records
+        media = load_media()
+        if not patch(media):
+            return False
+        changed = _changed_in_place(old, media) if in_place else None
+        if in_place and changed is None:
+            logger.info("update_media(in_place=True) changed the record list; saving as a rewrite")
+        snap = _write(media, rewritten=changed is None)
+    if changed is not None:
+        if changed:
+            _notify("update", changed, snap)
+    else:
+        _notify("reset", snap.records, snap)
+    return True
+
+
+def append_media(records: list) -> None:
+    """Append `records` to the current registry under the exclusive lock (an "append" event)."""
+    with _exclusive():
+        media = list(snapshot().records)
+        media.extend(records)
+        snap = _write(media, rewritten=False)
+    _notify("append", records, snap)
+
+
+def schema_version() -> int:
+    """Schema version the registry file was last migrated to (0 = legacy, never migrated)."""
+    try:
+        return int(json.loads(META_FILE.read_text()).get("schema_version", 0))
+    except Exception:
+        return 0
+
+
+def set_schema_version(version: int) -> None:
+    DATA_PATH.mkdir(parents=True, exist_ok=True)
+    META_FILE.write_text(json.dumps({"schema_version": int(version)}, indent=2))
@@ -0,0 +1,134 @@
+"""Versioned migrations for the media registry.
+
+Run with ``python scripts/migrate_registry.py`` from the backend directory; the
+server may keep running. Each migration upgrades records one batch at a time,
+applying every batch under the registry lock and writing a checkpoint after it
+so an interrupted run resumes where it stopped.
+Every migration step only fills in missing fields, so replaying a batch after a
+crash is harmless.
+
+The request path never touches legacy rows: it only checks the stored schema
+version (see :func:`pending_migrations`).
+"""
+import hashlib
+import json
+import os
+import secrets
+import time
+from typing import Callable
+
+from . import registry
+from .kyc_store import kyc_store
+
+CHECKPOINT_FILE = registry.DATA_PATH / "registry_migration.checkpoint.json"
+
+
+def _v1_backfill(item: dict, ctx: dict) -> bool:
+    """Backfill email/phone from KYC and derive missing content_key / unique_reg_key."""
+    changed = False
+    sa = item.get("signer_address")
+    if sa and (not item.get("email") or not item.get("phone")):
+        kyc = kyc_store.by_wallet(str(sa))
+        if kyc:
+            email = item.get("email") or kyc.get("email")
+            phone = item.get("phone") or kyc.get("phone")
+            if email != item.get("email") or phone != item.get("phone"):
+                item["email"], item["phone"] = email, phone
+                changed = True
+    try:
+        if not item.get("content_key") and item.get("sha256_hash"):
+            h_hex = item.get("sha256_hash")
+            h_hex = h_hex[2:] if isinstance(h_hex, str) and h_hex.startswith('0x') else h_hex
+            item["content_key"] = hashlib.sha256(bytes.fromhex(h_hex)).hexdigest()
+            changed = True
+        if not item.get("unique_reg_key") and item.get("content_key"):
+            # Use txn id if present, else signer:created_time
+            nonce_src = item.get("algo_tx") or f"{item.get('signer_address','')}:{time.time_ns()}:{secrets.token_hex(4)}"
+            item["unique_reg_key"] = hashlib.sha256(bytes.fromhex(item["content_key"]) + nonce_src.encode('utf-8')).hexdigest()
+            changed = True
+    except Exception:
+        pass
+    return changed
+
+
+# version -> (description, context factory, per-record step)
+MIGRATIONS: dict[int, tuple[str, Callable[[], dict], Callable[[dict, dict], bool]]] = {
+    1: ("backfill KYC contacts and registration keys on legacy rows",
+        lambda: {},
+        _v1_backfill),
+}
+
+
+def pending_migrations() -> list[int]:
+    """Versions still to apply. An empty registry is stamped current without work."""
+    current = registry.schema_version()
+    if current >= registry.SCHEMA_VERSION:
+        return []
+    if not registry.snapshot().records:
+        registry.set_schema_version(registry.SCHEMA_VERSION)
+        return []
+    return [v for v in sorted(MIGRATIONS) if current < v <= registry.SCHEMA_VERSION]
+
+
+def _read_checkpoint() -> dict:
+    try:
+        return json.loads(CHECKPOINT_FILE.read_text())
+    except Exception:
+        return {}
+
+
+def _write_checkpoint(version: int, next_index: int) -> None:
+    tmp = CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": version, "next_index": next_index}))
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def run(batch_size: int = 1000, progress: Callable[[str], None] = print, dry_run: bool = False) -> dict:
+    """Apply all pending migrations, resuming from the checkpoint if one exists.
+
+    Each batch is applied with registry.update_media, i.e. to the current records
+    under the registry lock, so registrations and other writes made while the
+    migration runs (e.g. by a live server) are kept.
+    """
+    applied = {}
+    for version in pending_migrations():
+        description, make_ctx, step = MIGRATIONS[version]
+        progress(f"[migrate] v{version}: {description}")
+        ctx = make_ctx()
+        checkpoint = _read_checkpoint()
+        start = checkpoint.get("next_index", 0) if checkpoint.get("version") == version else 0
+        total = len(registry.snapshot().records)
+        if start:
+            progress(f"[migrate] v{version}: resuming at record {start}/{total}")
+        changed = 0
+        started = time.monotonic()
+        batch_start = start
+        while batch_start < total:
+            batch_end = min(batch_start + batch_size, total)
+            batch_changed = 0
+
+            def apply(items: list) -> bool:
+                nonlocal batch_changed
+                for item in items:
+                    if isinstance(item, dict) and step(item, ctx):
+                        batch_changed += 1
+                return batch_changed > 0
+
+            if dry_run:
+                records = registry.snapshot().records[batch_start:batch_end]
+                apply([dict(item) if isinstance(item, dict) else item for item in records])
+            else:
+                registry.update_media(lambda media: apply(media[batch_start:batch_end]))
+                _write_checkpoint(version, batch_end)
+            changed += batch_changed
+            elapsed = time.monotonic() - started
+            # Records appended while migrating are picked up by later batches.
+            total = len(registry.snapshot().records)
+            progress(f"[migrate] v{version}: {batch_end}/{total} records ({batch_end * 100 // max(total, 1)}%), "
+                     f"{changed} updated, {elapsed:.1f}s")
+            batch_start = batch_end
+        if not dry_run:
+            registry.set_schema_version(version)
+            CHECKPOINT_FILE.unlink(missing_ok=True)
+        applied[version] = {"records": total, "updated": changed}
+    return applied
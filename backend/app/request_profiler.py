@@ -0,0 +1,214 @@
+"""Opt-in sampling profiler for individual requests.
+
+A request is profiled when it carries ``X-Profile: <PROFILER_TOKEN>`` (or the
+``__profile=<PROFILER_TOKEN>`` query parameter), or when it is picked by the
+random PROFILE_SAMPLE_RATE (0 by default). Nothing is set up for other requests:
+the middleware is a plain ASGI wrapper that only looks at the headers.
+
+While a profiled request runs, a sampler thread snapshots every
+PROFILE_INTERVAL_MS the stacks of threads that are currently inside the routed
+endpoint function (the event loop thread for async handlers, a threadpool
+worker for sync ones). Work the handler pushes to other threads is not
+captured, and concurrent requests to the same endpoint can show up in each
+other's samples.
+
+Profiles are written to ``data/profiles/<id>.json`` (speedscope format, plus
+the collapsed stacks for flamegraph.pl) keeping the newest MAX_PROFILES; the id
+is returned in the ``X-Profile-Id`` response header. List and download them
+with ``GET /admin/profiles`` and ``GET /admin/profiles/{id}`` (admin role only).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Counter
+from urllib.parse import parse_qs
+
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = registry.DATA_PATH / "profiles"
+MAX_PROFILES = 50
+INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+MAX_DEPTH = 128
+
+
+def _token() -> str | None:
+    return os.getenv("PROFILER_TOKEN") or None
+
+
+class _Sampler:
+    def __init__(self, scope: dict, interval: float):
+        self.scope = scope
+        self.interval = interval
+        self.samples = _Counter()
+        self.count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            # The endpoint is only known once routing has happened.
+            endpoint = self.scope.get("endpoint")
+            code = getattr(getattr(endpoint, "__wrapped__", endpoint), "__code__", None)
+            if code is None:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                inside = False
+                f = frame
+                while f is not None and len(stack) < MAX_DEPTH:
+                    c = f.f_code
+                    if c is code:
+                        inside = True
+                    stack.append(f"{c.co_name} ({os.path.basename(c.co_filename)}:{c.co_firstlineno})")
+                    f = f.f_back
+                if inside:
+                    if ident not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    self.samples[tuple(reversed(stack))] += 1
+                    self.count += 1
+
+
+def _speedscope(name: str, samples: _Counter, interval: float, duration: float) -> dict:
+    frames, index = [], {}
+    sample_list, weights = [], []
+    for stack, count in samples.items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            ids.append(index[frame])
+        sample_list.append(ids)
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "proofchain request_profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": max(duration, sum(weights)),
+            "samples": sample_list,
+            "weights": weights,
+        }],
+    }
+
+
+def _save(profile_id: str, meta: dict, samples: _Counter, interval: float, duration: float) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    doc = {
+        "meta": meta,
+        "collapsed": "\n".join(f"{';'.join(stack)} {count}" for stack, count in samples.most_common()),
+        "speedscope": _speedscope(f"{meta['method']} {meta['path']}", samples, interval, duration),
+    }
+    tmp = PROFILE_DIR / f"{profile_id}.tmp"
+    tmp.write_text(json.dumps(doc))
+    os.replace(tmp, PROFILE_DIR / f"{profile_id}.json")
+    files = sorted(PROFILE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-MAX_PROFILES]:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    if not PROFILE_DIR.exists():
+        return []
+    out = []
+    for path in sorted(PROFILE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            out.append(json.loads(path.read_text())["meta"])
+        except Exception:
+            continue
+    return out
+
+
+def load_profile(profile_id: str) -> dict | None:
+    # Ids are uuid hex; anything else cannot name a stored profile.
+    if not profile_id.isalnum():
+        return None
+    path = PROFILE_DIR / f"{profile_id}.json"
+    try:
+        return json.loads(path.read_text())
+    except Exception:
+        return None
+
+
+class RequestProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _triggered(self, scope: dict) -> bool:
+        token = _token()
+        if token:
+            for key, value in scope.get("headers") or ():
+                if key == b"x-profile":
+                    return value.decode("latin-1") == token
+            if b"__profile=" in scope.get("query_string", b""):
+                qs = parse_qs(scope["query_string"].decode("latin-1"))
+                return qs.get("__profile", [None])[0] == token
+        return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status = {"code": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = _Sampler(scope, INTERVAL_SECONDS)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = sampler.stop()
+            endpoint = scope.get("endpoint")
+            meta = {
+                "id": profile_id,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "endpoint": getattr(endpoint, "__name__", None),
+                "status": status["code"],
+                "duration_ms": round(duration * 1000, 2),
+                "samples": sampler.count,
+                "interval_ms": INTERVAL_SECONDS * 1000,
+                "created_at": time.time(),
+            }
+            try:
+                await asyncio.to_thread(_save, profile_id, meta, sampler.samples, INTERVAL_SECONDS, duration)
+                logger.info("%s %s -> profile %s (%s samples, %s ms)", meta["method"], meta["path"],
+                            profile_id, sampler.count, meta["duration_ms"])
+            except Exception as e:
+                logger.error("failed to save profile %s: %s", profile_id, e)
@@ -5,6 +5,7 @@ import hashlib
 import base64
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from ..config import settings
 from cryptography.fernet import Fernet
 import requests
@@ -71,19 +72,31 @@ def _crop_watermark_with_info(img_bytes: bytes):
         return img_bytes, info
 
 
+def _runway_generate(payload: str, headers: dict):
+    """Blocking RunwayML call; returns (status, reason, body). Run off the event loop."""
+    conn = http.client.HTTPSConnection("runwayml.p.rapidapi.com", timeout=120)
+    try:
+        conn.request("POST", "/generate/text", payload, headers)
+        res = conn.getresponse()
+        return res.status, res.reason, res.read()
+    finally:
+        conn.close()
+
+
 @router.post("/ai/generate")
 async def ai_generate(req: AIGenerateRequest):
     if req.type == "image":
         try:
             # Generate image from Pollinations.ai
             url = f"https://image.pollinations.ai/prompt/{req.prompt.replace(' ', '+')}"
-            response = requests.get(url, timeout=30)  # Added timeout
+            # Blocking client: run it in the threadpool so the event loop keeps serving
+            response = await run_in_threadpool(requests.get, url, timeout=30)
             if response.status_code != 200:
                 raise HTTPException(status_code=502, detail=f"Pollinations.ai API call failed ({response.status_code}): {response.text}")
 
             raw_bytes = response.content
             # Process image (e.g., remove watermark)
-            cleaned_bytes, wm_info = _crop_watermark_with_info(raw_bytes)
+            cleaned_bytes, wm_info = await run_in_threadpool(_crop_watermark_with_info, raw_bytes)
             sha_hex = hashlib.sha256(cleaned_bytes).hexdigest()
 
             # Return base64-encoded image for frontend
@@ -95,6 +108,8 @@ async def ai_generate(req: AIGenerateRequest):
                 "watermark_info": wm_info,
                 "pinning_deferred": True
             }
+        except HTTPException:
+            raise
         except requests.exceptions.Timeout:
             raise HTTPException(status_code=504, detail="Pollinations.ai API request timed out.")
         except Exception as e:
@@ -107,7 +122,6 @@ async def ai_generate(req: AIGenerateRequest):
             if not api_key:
                 raise HTTPException(status_code=500, detail="RAPIDAPI_KEY_VIDEO not set")
 
-            conn = http.client.HTTPSConnection("runwayml.p.rapidapi.com")
             payload = json.dumps({
                 "text_prompt": req.prompt,
                 "model": "gen3",
@@ -124,18 +138,18 @@ async def ai_generate(req: AIGenerateRequest):
                 'Content-Type': "application/json"
             }
 
-            conn.request("POST", "/generate/text", payload, headers)
-            res = conn.getresponse()
-            if res.status != 200:
-                raise HTTPException(status_code=502, detail=f"RapidAPI Video generation failed ({res.status}): {res.reason}")
+            status, reason, data = await run_in_threadpool(_runway_generate, payload, headers)
+            if status != 200:
+                raise HTTPException(status_code=502, detail=f"RapidAPI Video generation failed ({status}): {reason}")
 
-            data = res.read()
             result_json = json.loads(data)
             video_url = result_json.get("video_url") or result_json.get("output_url")
             if not video_url:
                 raise HTTPException(status_code=502, detail="Video generation succeeded but no URL returned.")
 
             return {"result": video_url}
+        except HTTPException:
+            raise
         except http.client.HTTPException as e:
             raise HTTPException(status_code=502, detail=f"HTTP error during video generation: {e}")
         except Exception as e:
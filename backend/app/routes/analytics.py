@@ -1,34 +1,51 @@
-from fastapi import APIRouter, Query
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Query
+from datetime import date, datetime, time, timedelta, timezone
+
+from ..analytics_rollup import analytics_rollup
 
 router = APIRouter()
 
-# Mock data for demonstration purposes
-mock_analytics_data = {
-    "media_trends": [
-        {"date": "2025-11-01", "uploads": 10, "verifications": 5},
-        {"date": "2025-11-02", "uploads": 15, "verifications": 8},
-        {"date": "2025-11-03", "uploads": 20, "verifications": 12}
-    ],
-    "user_engagement": {
-        "active_users": 120,
-        "new_users": 15,
-        "returning_users": 105
-    }
-}
+
+def _resolve_range(start: date | None, end: date | None, days: int) -> tuple[date, date]:
+    end = end or datetime.now(timezone.utc).date()
+    start = start or (end - timedelta(days=max(1, days) - 1))
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Range too large (max 366 days)")
+    return start, end
+
 
 @router.get("/api/analytics/media_trends")
-def get_media_trends():
+def get_media_trends(
+    days: int = Query(30, ge=1, le=366),
+    start: date | None = None,
+    end: date | None = None,
+    granularity: str = Query("day", regex="^(day|hour)$", description="day or hour (hourly data is kept for 14 days)"),
+):
     """
     Endpoint to fetch media trends data.
-    Returns mock data for now.
+    Uploads, verifications (classify calls) and classify outcomes per bucket,
+    served from the analytics rollup store.
     """
-    return mock_analytics_data["media_trends"]
+    start, end = _resolve_range(start, end, days)
+    if granularity == "hour":
+        return analytics_rollup.hourly_series(
+            datetime.combine(start, time.min, tzinfo=timezone.utc),
+            datetime.combine(end, time.max, tzinfo=timezone.utc),
+        )
+    return analytics_rollup.daily_series(start, end)
+
 
 @router.get("/api/analytics/user_engagement")
-def get_user_engagement():
+def get_user_engagement(
+    days: int = Query(30, ge=1, le=366),
+    start: date | None = None,
+    end: date | None = None,
+):
     """
     Endpoint to fetch user engagement data.
-    Returns mock data for now.
+    Active signers are HyperLogLog estimates; new users are signers first seen in range.
     """
-    return mock_analytics_data["user_engagement"]
\ No newline at end of file
+    start, end = _resolve_range(start, end, days)
+    return analytics_rollup.engagement(start, end)
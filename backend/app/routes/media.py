@@ -1,22 +1,36 @@
-import sys
+import logging
+import os
 from ..config import settings
-print("[STARTUP] settings.PINATA_API_KEY:", getattr(settings, 'PINATA_API_KEY', None), file=sys.stderr)
-print("[STARTUP] settings.PINATA_API_SECRET:", getattr(settings, 'PINATA_API_SECRET', None), file=sys.stderr)
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request
 from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
 import requests
+from .. import registry
+from ..lineage_index import lineage_index
+from ..summary_counters import summary_counters
+from ..analytics_rollup import analytics_rollup
+from ..ipfs_gateways import FetchError, gateway_pool, public_url
+from ..metrics import stage_seconds, stage_timer
+from ..coalesce import SingleFlight, TTLCache
+from ..classify_scores import ScoreCache
+from ..conditional import cached_json
+from ..json_response import response_class
 from ..schemas import (
     GenerateRequest, UploadResponse, RegisterRequest, VerifySignatureRequest, DeriveKeysRequest,
-    BroadcastRequest, BroadcastAppRequest
+    BroadcastRequest, BroadcastAppRequest, RegisterGroupRequest, BroadcastGroupRequest
 )
 from typing import Dict
 import hashlib
+import math
 import time
 import secrets
 import tempfile
 import json
 import uuid
-from datetime import datetime
+from array import array
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
 
 # Optional ML analyzer import (provide graceful fallback if missing)
 try:
@@ -31,7 +45,22 @@ except Exception:
             'details': 'analyze_media_record unavailable'
         }
 
-# Diagnostic startup print to confirm env vars are loaded when module is imported
+# How long server_pay / generate wait for a batched payout's txid before
+# returning its job id instead.
+PAYOUT_WAIT_SECONDS = float(os.getenv("PAYOUT_WAIT_SECONDS", "10"))
+
+# Identical concurrent fetches/classifications share one computation. Classify
+# keeps two caches (see _classify_core): the canonical hash and embedding per
+# input, and the similarity scores per (query hash, registry generation), which
+# appends extend instead of invalidating. Bump EMBED_MODEL_VERSION when the
+# embedding model changes so old results are not reused.
+EMBED_MODEL_VERSION = os.getenv("EMBED_MODEL_VERSION", "mobilenetv2")
+CLASSIFY_CACHE_TTL = float(os.getenv("CLASSIFY_CACHE_TTL", "600"))
+_fetch_flight = SingleFlight("ipfs_fetch")
+_classify_flight = SingleFlight("classify")
+_query_cache = TTLCache("classify_query", maxsize=512, ttl=CLASSIFY_CACHE_TTL)
+
+# Masked startup diagnostics (DEBUG level) to confirm env vars are loaded
 def _mask_secret(s: str | None) -> str:
     if not s:
         return "<missing>"
@@ -50,8 +79,24 @@ def _mask_address(addr: str | None, prefix: int = 6, suffix: int = 4) -> str | N
         return a
     return f"{a[:prefix]}...{a[-suffix:]}"
 
-print(f"[STARTUP] PINATA_API_KEY={_mask_secret(settings.PINATA_API_KEY)}")
-print(f"[STARTUP] PINATA_API_SECRET={_mask_secret(settings.PINATA_API_SECRET)}")
+def _fetch_cid_bytes(cid: str, snap) -> tuple[bytes, str]:
+    """Fetch CID content through the gateway pool, preferring bytes that match the sha256 of a registered copy.
+
+    Analysis still runs on unverified bytes when no gateway returns a match (logged by the pool).
+    """
+    expected = [item.get("sha256_hash") for item in snap.by_cid.get(cid, [])]
+
+    def fetch():
+        try:
+            with stage_timer("fetch"):
+                return gateway_pool.fetch(cid, expected_sha256=expected, allow_unverified=True)
+        except FetchError as e:
+            raise HTTPException(status_code=502, detail=f"Failed to fetch cid file: {e}")
+
+    return _fetch_flight.do(cid, fetch)
+
+logger.debug("PINATA_API_KEY=%s", _mask_secret(settings.PINATA_API_KEY))
+logger.debug("PINATA_API_SECRET=%s", _mask_secret(settings.PINATA_API_SECRET))
 
 # Try to import Lute SDK verification helper
 try:
@@ -61,7 +106,7 @@ except Exception:
     lute_client = None
     LUTE_AVAILABLE = False
 
-router = APIRouter(prefix="/media", tags=["media"])
+router = APIRouter(prefix="/media", tags=["media"], default_response_class=response_class())
 
 # --- Embedding & similarity helpers ---
 def _cosine(a: list[float] | None, b: list[float] | None) -> float:
@@ -92,7 +137,8 @@ def _maybe_crop_watermark(img_bytes: bytes) -> bytes:
     try:
         from PIL import Image, ImageFilter  # type: ignore
         import io
-        im = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        with stage_timer("decode"):
+            im = Image.open(io.BytesIO(img_bytes)).convert("RGB")
         h = im.height
         band = max(8, int(h * 0.12))
         if band >= h or band < 8:
@@ -148,7 +194,8 @@ def _crop_watermark_with_info(img_bytes: bytes):
     try:
         from PIL import Image, ImageFilter  # type: ignore
         import io
-        im = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        with stage_timer("decode"):
+            im = Image.open(io.BytesIO(img_bytes)).convert("RGB")
         h = im.height
         info["original_height"] = h
         band = max(8, int(h * 0.12))
@@ -198,11 +245,15 @@ def _build_provenance_graph(
     best_similarity: float,
     match_candidates: list[tuple[dict, float]],
     match_summaries: list[dict],
-    media: list,
     similarity_threshold: float,
     graph_top_k: int,
+    depth: int = 1,
 ) -> dict | None:
-    """Build a trimmed provenance graph for visualization on the client."""
+    """Build a trimmed provenance graph for visualization on the client.
+
+    Lineage (same content, declared parents/children) comes from the in-memory
+    lineage index; `depth` controls how many ancestor/descendant hops are followed.
+    """
 
     def _node_identifier(item: dict | None) -> str | None:
         if not isinstance(item, dict):
@@ -324,11 +375,8 @@ def _build_provenance_graph(
     if candidate_pairs:
         anchor_id = add_node(candidate_pairs[0][0], "anchor", similarity=candidate_pairs[0][1])
 
-    unique_lookup = {
-        itm.get("unique_reg_key"): itm
-        for itm in media
-        if isinstance(itm, dict) and itm.get("unique_reg_key")
-    }
+    lineage_index.refresh()
+    depth = max(1, int(depth or 1))
 
     match_id_set = set()
     for summary in match_summaries:
@@ -356,32 +404,46 @@ def _build_provenance_graph(
 
     anchor_item = candidate_pairs[0][0] if candidate_pairs else best_item
     if anchor_id and isinstance(anchor_item, dict):
-        content_key = anchor_item.get("content_key")
-        if content_key:
-            for itm in media:
-                if itm is anchor_item:
+        for itm in lineage_index.same_content(anchor_item.get("content_key")):
+            if _node_identifier(itm) == anchor_id:
+                continue
+            dup_id = add_node(itm, "duplicate", similarity=1.0)
+            add_edge(anchor_id, dup_id, similarity=1.0, relationship="same_content")
+
+    # Declared descendants, breadth-first up to `depth` hops below the anchor
+    if anchor_id and isinstance(anchor_item, dict):
+        frontier = [(anchor_id, anchor_item.get("unique_reg_key"))]
+        visited: set[str] = set()
+        for _ in range(depth):
+            next_frontier = []
+            for parent_id, parent_key in frontier:
+                if not parent_key or parent_key in visited:
                     continue
-                if itm.get("content_key") == content_key:
-                    dup_id = add_node(itm, "duplicate", similarity=1.0)
-                    add_edge(anchor_id, dup_id, similarity=1.0, relationship="same_content")
-
-    if anchor_id:
-        anchor_key = None
-        if isinstance(anchor_item, dict):
-            anchor_key = anchor_item.get("unique_reg_key")
-        for itm in media:
-            parent_key = itm.get("near_duplicate_of")
-            if parent_key and parent_key == anchor_key:
-                child_id = add_node(itm, "declared", similarity=itm.get("near_duplicate_similarity"))
-                add_edge(anchor_id, child_id, similarity=itm.get("near_duplicate_similarity"), relationship="declared_lineage")
+                visited.add(parent_key)
+                for itm in lineage_index.children(parent_key):
+                    child_id = add_node(itm, "declared", similarity=itm.get("near_duplicate_similarity"))
+                    add_edge(parent_id, child_id, similarity=itm.get("near_duplicate_similarity"), relationship="declared_lineage")
+                    if child_id:
+                        next_frontier.append((child_id, itm.get("unique_reg_key")))
+            if not next_frontier:
+                break
+            frontier = next_frontier
 
+    # Declared ancestors, following near_duplicate_of up to `depth` hops
     if isinstance(anchor_item, dict):
-        parent_key = anchor_item.get("near_duplicate_of")
-        if parent_key:
-            parent_item = unique_lookup.get(parent_key)
+        child_item, child_id = anchor_item, anchor_id
+        seen_keys: set[str] = set()
+        for _ in range(depth):
+            parent_key = child_item.get("near_duplicate_of")
+            if not parent_key or parent_key in seen_keys:
+                break
+            seen_keys.add(parent_key)
+            parent_item = lineage_index.get(parent_key)
             parent_id = add_node(parent_item, "anchor")
-            if parent_id:
-                add_edge(parent_id, anchor_id or parent_id, similarity=anchor_item.get("near_duplicate_similarity"), relationship="declared_lineage")
+            if not parent_id:
+                break
+            add_edge(parent_id, child_id or parent_id, similarity=child_item.get("near_duplicate_similarity"), relationship="declared_lineage")
+            child_item, child_id = parent_item, parent_id
 
     if len(node_map) <= 1:
         return None
@@ -399,38 +461,10 @@ def _build_provenance_graph(
         "anchor_id": anchor_id,
         "threshold": similarity_threshold,
         "graph_top_k": graph_top_k,
+        "depth": depth,
     }
 
 
-def _build_summary_charts(media: list, similarity_threshold: float) -> dict:
-    """Generate summary data for pie/bar charts based on media relationships."""
-    summary = {
-        "query": 0,
-        "anchor": 0,
-        "near_match": 0,
-        "duplicate": 0,
-        "declared": 0,
-    }
-
-    for item in media:
-        try:
-            similarity = item.get("near_duplicate_similarity", 0)
-            if similarity >= similarity_threshold:
-                summary["near_match"] += 1
-            elif item.get("type") == "duplicate":
-                summary["duplicate"] += 1
-            elif item.get("type") == "declared":
-                summary["declared"] += 1
-            elif item.get("type") == "anchor":
-                summary["anchor"] += 1
-            else:
-                summary["query"] += 1
-        except Exception:
-            continue
-
-    return summary
-
-
 @router.post("/generate")
 def generate_media(payload: GenerateRequest):
     """Proxy a generation request to the AI generator configured via AI_API_URL/AI_API_KEY.
@@ -453,59 +487,27 @@ def generate_media(payload: GenerateRequest):
     # Algorand transaction logic: send 0.01 Algo from server wallet to user wallet
     algo_tx = None
     explorer_url = None
-    try:
-        from algosdk import account, mnemonic, transaction
-        from algosdk.v2client import algod
-        # Load server mnemonic (prefer DEPLOYER_MNEMONIC) and user wallet address
-        server_mnemonic = getattr(settings, 'DEPLOYER_MNEMONIC', None)
-        if server_mnemonic:
-            server_mnemonic = server_mnemonic.replace('"', '').strip()
-        user_address = getattr(payload, 'wallet_address', None)
-        if not server_mnemonic or not user_address:
-            raise Exception("Missing server DEPLOYER_MNEMONIC or user wallet address")
-
-        # Setup Algod client
-        algod_address = settings.ALGOD_ADDRESS
-        algod_token = settings.ALGOD_TOKEN
-        algod_client = algod.AlgodClient(algod_token, algod_address)
-
-        # Derive deployer keypair (compatible with newer SDKs without to_public_key)
-        clean_mnemonic = server_mnemonic.replace('"', '').strip()
-        sender_private_key = mnemonic.to_private_key(clean_mnemonic)
-        sender_address = account.address_from_private_key(sender_private_key)
-
-        # Get suggested params
-        params = algod_client.suggested_params()
-
+    payout_job_id = None
+    user_address = getattr(payload, 'wallet_address', None)
+    if not getattr(settings, 'DEPLOYER_MNEMONIC', None) or not user_address:
+        logger.warning("Skipping payout: missing server DEPLOYER_MNEMONIC or user wallet address")
+    else:
+        from ..payout_batcher import payout_batcher
         # Amount to send (0.01 Algo = 100000 microalgos)
-        amount = 100000
-
-        # Create transaction
-        unsigned_txn = transaction.PaymentTxn(
-            sender_address,
-            params,
-            user_address,
-            amount,
-            None,
-            "Image generation fee"
-        )
-
-        # Sign transaction
-        signed_txn = unsigned_txn.sign(sender_private_key)
-
-        # Send transaction
-        txid = algod_client.send_transaction(signed_txn)
-        algo_tx = txid
-        explorer_url = f"https://lora.algokit.io/testnet/transaction/{txid}"
-    except Exception as e:
-        print(f"Algorand transaction error: {e}")
-        algo_tx = None
-        explorer_url = None
+        job = payout_batcher.submit(user_address, 100000, b"Image generation fee")
+        payout_job_id = job.id
+        job.wait(PAYOUT_WAIT_SECONDS)
+        if job.status == "failed":
+            logger.error("Payout %s failed: %s", job.id, job.error)
+        elif job.txid:
+            algo_tx = job.txid
+            explorer_url = f"https://lora.algokit.io/testnet/transaction/{algo_tx}"
 
     return {
         "result": result.get("result"),
         "algo_tx": algo_tx,
         "algo_explorer_url": explorer_url,
+        "payout_job_id": payout_job_id,
         "receiver_address_masked": _mask_address(getattr(payload, 'wallet_address', None)),
         "detail": "Image generated and transaction processed"
     }
@@ -513,25 +515,17 @@ def generate_media(payload: GenerateRequest):
 
 @router.post("/upload", response_model=UploadResponse)
 def upload_file(file: UploadFile = File(...)):
-    # Masked debug (avoid printing full secrets)
-    def _mask(s: str | None) -> str:
-        if not s:
-            return "<missing>"
-        s = str(s)
-        return s if len(s) <= 8 else f"{s[:4]}...{s[-4:]}"
-        print("[UPLOAD] PINATA_API_KEY:", _mask(getattr(settings, 'PINATA_API_KEY', None)), file=sys.stderr)
-        print("[UPLOAD] PINATA_API_SECRET:", _mask(getattr(settings, 'PINATA_API_SECRET', None)), file=sys.stderr)
     """Upload a file to the storage provider (Pinata/IPFS) using the configured API.
 
     This endpoint pins the file to Pinata and returns the IPFS CID and gateway URL.
     """
     # Use Pinata pinFileToIPFS
     if not settings.PINATA_API_KEY or not settings.PINATA_API_SECRET:
-        print("[DEBUG] Pinata API keys not configured")
+        logger.error("Pinata API keys not configured")
         raise HTTPException(status_code=500, detail="Pinata API keys not configured")
 
     if not file or not file.filename:
-        print("[DEBUG] No file uploaded or filename missing")
+        logger.debug("No file uploaded or filename missing")
         raise HTTPException(status_code=400, detail="No file uploaded or filename missing")
 
     pinata_url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
@@ -544,7 +538,7 @@ def upload_file(file: UploadFile = File(...)):
     try:
         content_bytes = file.file.read()
     except Exception as e:
-        print(f"[ERROR] Unable to read uploaded file: {e}")
+        logger.warning("Unable to read uploaded file: %s", e)
         raise HTTPException(status_code=400, detail=f"Unable to read uploaded file: {e}")
     files = {"file": (file.filename, content_bytes, file.content_type or "application/octet-stream")}
     headers = {
@@ -553,47 +547,48 @@ def upload_file(file: UploadFile = File(...)):
     }
     # Keep request minimal; metadata is optional and sometimes restricted by account settings
     form_data = {}
-    print(f"[DEBUG] Sending file '{file.filename}' to Pinata...")
-    print(f"[DEBUG] Pinata headers: {headers}")
+    logger.debug("Sending file %r to Pinata", file.filename)
     try:
         resp = requests.post(pinata_url, files=files, data=form_data, headers=headers, timeout=120)
-        print(f"[DEBUG] Pinata response status: {resp.status_code}")
-        print(f"[DEBUG] Pinata response text: {resp.text}")
+        logger.debug("Pinata response status: %s", resp.status_code)
     except Exception as e:
-        print(f"[ERROR] Pinata upload request failed: {e}")
+        logger.error("Pinata upload request failed: %s", e)
         raise HTTPException(status_code=502, detail=f"Pinata upload request failed: {e}")
 
     if resp.status_code >= 400:
-        print(f"[ERROR] Pinata upload error: {resp.status_code} {resp.text}")
+        logger.error("Pinata upload error: %s %s", resp.status_code, resp.text)
         raise HTTPException(status_code=502, detail=f"Pinata upload error: {resp.status_code} {resp.text}")
 
     try:
         data_json = resp.json()
-        print(f"[DEBUG] Pinata response JSON: {data_json}")
+        logger.debug("Pinata response JSON: %s", data_json)
     except Exception as e:
-        print(f"[ERROR] Pinata response not JSON: {resp.text}")
+        logger.error("Pinata response not JSON: %s", resp.text)
         raise HTTPException(status_code=502, detail=f"Pinata response not JSON: {resp.text}")
 
     ipfs_hash = data_json.get("IpfsHash")
-    # Build file URL using custom gateway domain if provided in settings.
-    gateway_domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-    if gateway_domain:
-        # allow the env var to be either a full URL or just a host
-        if str(gateway_domain).startswith("http://") or str(gateway_domain).startswith("https://"):
-            base = str(gateway_domain).rstrip('/')
-        else:
-            base = f"https://{str(gateway_domain).rstrip('/')}"
-        file_url = f"{base}/ipfs/{ipfs_hash}" if ipfs_hash else None
-        print(f"[DEBUG] Using custom Pinata gateway domain: {base}")
-    else:
-        file_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}" if ipfs_hash else None
+    # Build file URL on the primary gateway (PINATA_GATEWAY_DOMAIN when set).
+    file_url = public_url(ipfs_hash)
     if not ipfs_hash:
-        print(f"[ERROR] Pinata response missing IpfsHash: {data_json}")
+        logger.error("Pinata response missing IpfsHash: %s", data_json)
         raise HTTPException(status_code=502, detail=f"Pinata response missing IpfsHash: {data_json}")
-    print(f"[DEBUG] Pinata upload successful. IPFS CID: {ipfs_hash}")
+    logger.info("Pinned upload as %s", ipfs_hash)
     return {"file_url": file_url, "ipfs_cid": ipfs_hash}
 
 
+def _fetch_registration_bytes(cid: str | None, file_url: str, sha256_hex: str) -> bytes | None:
+    """Bytes of a file being registered, for its embedding; None when unavailable or over 10 MB."""
+    if cid:
+        with stage_timer("fetch"):
+            content, _ = gateway_pool.fetch(cid, expected_sha256=sha256_hex, allow_unverified=True,
+                                            max_bytes=10_000_000 - 1)
+        return content
+    r = requests.get(file_url, timeout=30)
+    if r.status_code < 400 and len(r.content) < 10_000_000:
+        return r.content
+    return None
+
+
 @router.post("/register")
 def register_media(payload: RegisterRequest = None, file: UploadFile = None):
     """Register media metadata with the on-chain registry (Algorand) or store locally."""
@@ -605,25 +600,15 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
 
     # Fetch KYC info for wallet address
     user_address = getattr(payload, 'signer_address', None)
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    KYC_FILE = DATA_PATH / "kyc.json"
     kyc_status = "not_started"
-    if KYC_FILE.exists():
-        try:
-            raw = json.loads(KYC_FILE.read_text())
-            if isinstance(raw, dict):
-                kyc_records = list(raw.values())
-            else:
-                kyc_records = raw
-            for kyc in kyc_records:
-                try:
-                    if kyc.get("wallet_address", "").lower() == (user_address or "").lower():
-                        kyc_status = kyc.get("status", "not_started")
-                        break
-                except Exception:
-                    continue
-        except Exception:
-            pass
+    kyc = None
+    try:
+        from ..kyc_store import kyc_store
+        kyc = kyc_store.by_wallet(user_address)
+        if kyc:
+            kyc_status = kyc.get("status", "not_started")
+    except Exception:
+        pass
 
     if not user_address:
         return {"status": "wallet_not_connected", "message": "Please connect your wallet."}
@@ -654,12 +639,6 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
             raise HTTPException(status_code=502, detail=detail)
 
         # --- Save registration data ---
-        from pathlib import Path
-        import json
-        DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-        DATA_PATH.mkdir(parents=True, exist_ok=True)
-        MEDIA_FILE = DATA_PATH / "registered_media.json"
-
         ipfs_cid = getattr(payload, 'ipfs_cid', None)
         file_url = getattr(payload, 'file_url', None)
 
@@ -667,7 +646,12 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
         reg_data["ipfs_cid"] = ipfs_cid
         reg_data["file_url"] = file_url
         reg_data["algo_tx"] = algo_tx
+        if algo_tx:
+            reg_data["algo_tx_status"] = "pending"
         reg_data["algo_explorer_url"] = explorer_url
+        # Contact details are copied at registration time (legacy rows: scripts/migrate_registry.py).
+        reg_data["email"] = kyc.get("email")
+        reg_data["phone"] = kyc.get("phone")
         if 'reg_error' in locals():
             reg_data["algo_error"] = reg_error
 
@@ -689,68 +673,29 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
             reg_data["content_key"] = content_key_hex
             reg_data["unique_reg_key"] = reg_key_hex
         except Exception as e:
-            print(f"[WARN] Failed to compute content/registration keys: {e}")
+            logger.warning("Failed to compute content/registration keys: %s", e)
 
-        try:
-            if MEDIA_FILE.exists():
-                media = json.loads(MEDIA_FILE.read_text())
-            else:
-                media = []
-        except Exception:
-            media = []
+        # Read-only view for lineage detection; the record is appended under the registry lock below.
+        media = registry.snapshot().records
 
-        # Backfill email/phone for existing records if missing (handle existing legacy data)
-        try:
-            for item in media:
-                sa = item.get("signer_address")
-                if sa and (not item.get("email") or not item.get("phone")):
-                    # find kyc for signer
-                    if KYC_FILE.exists():
-                        try:
-                            raw = json.loads(KYC_FILE.read_text())
-                            if isinstance(raw, dict):
-                                kyc_records = list(raw.values())
-                            else:
-                                kyc_records = raw
-                            for kyc in kyc_records:
-                                if kyc.get("wallet_address", "").lower() == sa.lower():
-                                    item["email"] = item.get("email") or kyc.get("email")
-                                    item["phone"] = item.get("phone") or kyc.get("phone")
-                                    break
-                        except Exception:
-                            pass
-                # Compute and backfill missing content_key / unique_reg_key for legacy rows
-                try:
-                    if not item.get("content_key") and item.get("sha256_hash"):
-                        h_hex = item.get("sha256_hash")
-                        h_hex = h_hex[2:] if isinstance(h_hex, str) and h_hex.startswith('0x') else h_hex
-                        H = bytes.fromhex(h_hex)
-                        K = hashlib.sha256(H).hexdigest()
-                        item["content_key"] = K
-                    if not item.get("unique_reg_key") and item.get("content_key"):
-                        # Use txn id if present, else signer:created_time
-                        nonce_src = item.get("algo_tx") or f"{item.get('signer_address','')}:{time.time_ns()}:{secrets.token_hex(4)}"
-                        item["unique_reg_key"] = hashlib.sha256(bytes.fromhex(item["content_key"]) + nonce_src.encode('utf-8')).hexdigest()
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        # Legacy rows are upgraded offline by scripts/migrate_registry.py (app/registry_migrations.py).
 
         # --- Embedding computation (original + cropped) ---
         embedding = None
         embedding_source = None
         try:
             from ..light_detectors import get_embedding_from_bytes  # type: ignore
-            # Fetch file bytes from file_url (IPFS gateway). Avoid very large files (>10MB) for now.
+            # Fetch the pinned file (through the gateway pool when the CID is known). Avoid very large files (>10MB) for now.
             if file_url:
                 try:
-                    r = requests.get(file_url, timeout=30)
-                    if r.status_code < 400 and len(r.content) < 10_000_000:
-                        orig_bytes = r.content
-                        cleaned_bytes = _maybe_crop_watermark(orig_bytes)
+                    orig_bytes = _fetch_registration_bytes(ipfs_cid, file_url, unique_hash)
+                    if orig_bytes is not None:
+                        with stage_timer("canonicalize"):
+                            cleaned_bytes = _maybe_crop_watermark(orig_bytes)
                         use_bytes = cleaned_bytes if cleaned_bytes != orig_bytes else orig_bytes
                         embedding_source = "cleaned" if use_bytes is cleaned_bytes else "original"
-                        emb_vec = get_embedding_from_bytes(use_bytes)
+                        with stage_timer("embed"):
+                            emb_vec = get_embedding_from_bytes(use_bytes)
                         # Round floats for storage compactness
                         embedding = [round(float(x), 5) for x in emb_vec][:512]
                 except Exception as e:
@@ -758,13 +703,15 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
         except Exception as e:
             reg_data["embedding_error"] = f"embedding module unavailable: {e}"
 
+        reg_data["registered_at"] = datetime.now(timezone.utc).isoformat()
+
         if embedding:
             reg_data["embedding"] = embedding
             reg_data["embedding_source"] = embedding_source
 
         # Load existing media again if not already loaded (media variable present). Use for lineage detection.
         try:
-            existing = media if isinstance(media, list) else []
+            existing = media
             best_sim = -1.0
             best_reg = None
             if embedding:
@@ -784,13 +731,15 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
         except Exception:
             pass
 
-        media.append(reg_data)
         try:
-            MEDIA_FILE.write_text(json.dumps(media, indent=2))
+            registry.append_media([reg_data])
         except Exception as e:
-            import traceback as _tb, sys as _sys
-            _tb.print_exc(file=_sys.stderr)
+            logger.error("Failed to persist registration: %s", e, exc_info=True)
             raise HTTPException(status_code=500, detail=f"Failed to persist registration: {e}")
+        if algo_tx:
+            # Watched only once the record exists, so the confirmation can be written back.
+            from ..tx_tracker import tx_tracker
+            tx_tracker.track(algo_tx)
         # --- Prepare unsigned application call for on-chain registration ---
         unsigned_app_txn = None
         unsigned_app_txn_b64 = None
@@ -820,7 +769,7 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
                     media_key_hex = media_key.hex()
                     reg_key_hex = reg_key.hex()
         except Exception as e:
-            print(f"[WARN] Failed to prepare unsigned app call: {e}")
+            logger.warning("Failed to prepare unsigned app call: %s", e)
 
         response = {"status": "verified_locally", "payload": reg_data}
         if unsigned_app_txn:
@@ -839,18 +788,12 @@ def register_media(payload: RegisterRequest = None, file: UploadFile = None):
 def search_similar(suspect: UploadFile = File(None), ipfs_cid: str | None = None, threshold: float = 0.9, top_k: int = 5):
     """Return top-K registered media items with embedding similarity above a threshold.
 
-    Provide either an uploaded file (suspect) or an existing ipfs_cid to reuse stored file_url.
+    Provide either an uploaded file (suspect) or an existing ipfs_cid (fetched through the gateway pool).
     Response: { matches: [ { unique_reg_key, signer_address, similarity, file_url, ipfs_cid } ], count }
     """
-    from pathlib import Path
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    MEDIA_FILE = DATA_PATH / "registered_media.json"
-    if not MEDIA_FILE.exists():
+    snap = registry.snapshot()
+    if not snap.exists:
         return {"matches": [], "count": 0}
-    try:
-        media = json.loads(MEDIA_FILE.read_text())
-    except Exception:
-        media = []
     # Acquire bytes
     suspect_bytes = None
     if suspect:
@@ -859,44 +802,26 @@ def search_similar(suspect: UploadFile = File(None), ipfs_cid: str | None = None
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to read suspect upload: {e}")
     elif ipfs_cid:
-        # Find file_url from registry or build gateway URL
-        rec = next((m for m in media if m.get("ipfs_cid") == ipfs_cid and m.get("file_url")), None)
-        file_url = rec.get("file_url") if rec else None
-        if not file_url:
-            gateway_domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-            if gateway_domain:
-                if str(gateway_domain).startswith("http://") or str(gateway_domain).startswith("https://"):
-                    base = str(gateway_domain).rstrip('/')
-                else:
-                    base = f"https://{str(gateway_domain).rstrip('/')}"
-                file_url = f"{base}/ipfs/{ipfs_cid}"
-            else:
-                file_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_cid}"
-        try:
-            r = requests.get(file_url, timeout=30)
-            if r.status_code >= 400:
-                raise HTTPException(status_code=502, detail=f"Failed to fetch cid file: {r.status_code}")
-            suspect_bytes = r.content
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"Fetch error: {e}")
+        suspect_bytes, _ = _fetch_cid_bytes(ipfs_cid, snap)
     else:
         raise HTTPException(status_code=400, detail="Provide suspect upload or ipfs_cid")
 
     # Compute embedding
     try:
         from ..light_detectors import get_embedding_from_bytes  # type: ignore
-        cropped = _maybe_crop_watermark(suspect_bytes)
+        with stage_timer("canonicalize"):
+            cropped = _maybe_crop_watermark(suspect_bytes)
         use_bytes = cropped if cropped != suspect_bytes else suspect_bytes
-        emb_vec = get_embedding_from_bytes(use_bytes)
+        with stage_timer("embed"):
+            emb_vec = get_embedding_from_bytes(use_bytes)
         query_emb = [float(x) for x in emb_vec][:512]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embedding computation failed: {e}")
 
     # Compare
     matches = []
-    for m in media:
+    search_started = time.perf_counter()
+    for m in snap.records:
         try:
             emb2 = m.get("embedding")
             if not isinstance(emb2, list):
@@ -913,29 +838,109 @@ def search_similar(suspect: UploadFile = File(None), ipfs_cid: str | None = None
                 })
         except Exception:
             continue
+    stage_seconds.observe(time.perf_counter() - search_started, "search")
     matches.sort(key=lambda x: x.get("similarity", 0), reverse=True)
     return {"matches": matches[:top_k], "count": len(matches)}
 
 
 @router.get("/visualization_summary")
-def visualization_summary(similarity_threshold: float = 0.9):
-    """Endpoint to return summary data for pie/bar charts."""
-    from pathlib import Path
-    import json
+def visualization_summary(request: Request, similarity_threshold: float = 0.9):
+    """Endpoint to return summary data for pie/bar charts.
+
+    Served from incrementally maintained counters; no registry scan per request.
+    Unchanged polls get 304 via the registry ETag.
+    """
+    return cached_json(request, "visualization_summary", (similarity_threshold,),
+                       lambda snap: _visualization_summary(snap, similarity_threshold))
 
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    MEDIA_FILE = DATA_PATH / "registered_media.json"
 
-    if not MEDIA_FILE.exists():
+def _visualization_summary(snap, similarity_threshold: float) -> dict:
+    if not snap.exists:
         return {"summary": {}, "count": 0}
 
+    summary_counters.refresh()
+    summary = summary_counters.summary(similarity_threshold)
+    return {"summary": summary, "count": sum(summary.values())}
+
+
+_scores = ScoreCache("classify_scores", _cosine, maxsize=256, ttl=CLASSIFY_CACHE_TTL)
+
+
+def _compute_query(suspect_bytes: bytes, source_url: str | None, canonicalize: bool, snap) -> dict:
+    """Canonical hash of one input, plus its embedding unless it is an exact registry match."""
+    if not suspect_bytes:
+        raise HTTPException(status_code=500, detail="No suspect bytes loaded")
+
+    # Canonicalization (optional)
+    canonical_strategy = "inpaint_v1" if canonicalize else "raw"
+    with stage_timer("canonicalize"):
+        processed_bytes = _maybe_crop_watermark(suspect_bytes) if canonicalize else suspect_bytes
+    # If canonicalization made no change, treat as raw
+    if processed_bytes == suspect_bytes and canonicalize:
+        canonical_strategy = "raw_no_change"
+
+    # Compute sha256 of canonical bytes
+    query_sha256 = hashlib.sha256(processed_bytes).hexdigest()
+    query = {
+        "source_url": source_url,
+        "canonical_strategy": canonical_strategy,
+        "query_sha256": query_sha256,
+        "query_emb": None,
+    }
+    # Exact matches need no embedding
+    if snap.by_sha256.get(query_sha256.lower()):
+        return query
+
+    # Derivative detection via embeddings
     try:
-        media = json.loads(MEDIA_FILE.read_text())
-    except Exception:
-        media = []
+        from ..light_detectors import get_embedding_from_bytes  # type: ignore
+        with stage_timer("embed"):
+            emb_vec = get_embedding_from_bytes(processed_bytes)
+        query["query_emb"] = [float(x) for x in emb_vec][:512]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding computation failed: {e}")
+    return query
+
+
+def _scores_for(query: dict, snap) -> array:
+    """Similarity of the query to every record of `snap`, patched incrementally on appends."""
+    return _scores.scores((query["query_sha256"], EMBED_MODEL_VERSION), query["query_emb"], snap)
 
-    summary = _build_summary_charts(media, similarity_threshold)
-    return {"summary": summary, "count": sum(summary.values())}
+
+def _classify_core(source_key: str, load, canonicalize: bool) -> dict:
+    """Fetch, canonicalize, embed and score one input against the registry.
+
+    The input's canonical hash and embedding are cached per (source,
+    canonicalize, model); source keys are content addresses (CID or upload
+    sha256) so they never go stale. Scores come from :func:`_scores_for`, so a
+    repeat classification costs two lookups plus scoring any records appended
+    since. Concurrent identical requests share each step. `load(snap)` returns
+    (bytes, source_url). The result is threshold-independent; `sims` is
+    aligned with `snap.records` (zip truncates when it is longer).
+    """
+    snap = registry.snapshot()
+    key = (source_key, canonicalize, EMBED_MODEL_VERSION)
+    query = _query_cache.get(key, None)
+    exact_rec = snap.by_sha256.get(query["query_sha256"].lower()) if query else None
+    if query is None or (not exact_rec and query["query_emb"] is None):
+        # Not seen yet, or it was an exact match that has since left the registry.
+        def compute():
+            suspect_bytes, source_url = load(snap)
+            query = _compute_query(suspect_bytes, source_url, canonicalize, snap)
+            _query_cache.put(key, query, None)
+            return query
+
+        query = _classify_flight.do(key, compute)
+        exact_rec = snap.by_sha256.get(query["query_sha256"].lower())
+        if not exact_rec and query["query_emb"] is None:
+            # Joined a flight that still saw the exact match; embed for this snapshot.
+            query = _compute_query(*load(snap), canonicalize, snap)
+    return {
+        **query,
+        "snap": snap,
+        "exact_rec": exact_rec,
+        "sims": None if exact_rec else _scores_for(query, snap),
+    }
 
 
 @router.post("/classify")
@@ -948,13 +953,13 @@ def classify_media(
     top_k: int = 5,
     include_graph: bool = False,
     graph_top_k: int = 8,
+    graph_depth: int = 1,
     include_summary: bool = False,
 ):
     """Classify an input image and optionally include graph and summary data."""
-    from pathlib import Path
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    MEDIA_FILE = DATA_PATH / "registered_media.json"
-    if not MEDIA_FILE.exists():
+    snap = registry.snapshot()
+    if not snap.exists:
+        analytics_rollup.record_classification("unregistered")
         return {
             "status": "unregistered",
             "query_sha256": None,
@@ -965,69 +970,32 @@ def classify_media(
             "matches": [] if include_matches else None,
             "lineage_graph": None,
         }
-    try:
-        media = json.loads(MEDIA_FILE.read_text())
-    except Exception:
-        media = []
-
-    # Acquire suspect bytes
-    suspect_bytes = None
-    source_url = None
+    # Acquire suspect bytes; identical inputs share one fetch/embed/scan.
     if suspect:
         try:
             suspect_bytes = suspect.file.read()
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to read upload: {e}")
+        if not suspect_bytes:
+            raise HTTPException(status_code=500, detail="No suspect bytes loaded")
+        source_key = "sha256:" + hashlib.sha256(suspect_bytes).hexdigest()
+
+        def load(snap):
+            return suspect_bytes, None
     elif ipfs_cid:
-        # Attempt to reuse stored file_url; fallback to gateway construction
-        rec = next((m for m in media if m.get("ipfs_cid") == ipfs_cid and m.get("file_url")), None)
-        source_url = rec.get("file_url") if rec else None
-        if not source_url:
-            gateway_domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-            if gateway_domain:
-                if str(gateway_domain).startswith("http://") or str(gateway_domain).startswith("https://"):
-                    base = str(gateway_domain).rstrip('/')
-                else:
-                    base = f"https://{str(gateway_domain).rstrip('/')}"
-                source_url = f"{base}/ipfs/{ipfs_cid}"
-            else:
-                source_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_cid}"
-        try:
-            r = requests.get(source_url, timeout=30)
-            if r.status_code >= 400:
-                raise HTTPException(status_code=502, detail=f"Failed to fetch cid file: {r.status_code}")
-            suspect_bytes = r.content
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"Fetch error: {e}")
+        source_key = "cid:" + ipfs_cid
+
+        def load(snap):
+            return _fetch_cid_bytes(ipfs_cid, snap)
     else:
         raise HTTPException(status_code=400, detail="Provide suspect upload or ipfs_cid")
 
-    if not suspect_bytes:
-        raise HTTPException(status_code=500, detail="No suspect bytes loaded")
-
-    # Canonicalization (optional)
-    canonical_strategy = "inpaint_v1" if canonicalize else "raw"
-    processed_bytes = _maybe_crop_watermark(suspect_bytes) if canonicalize else suspect_bytes
-    # If canonicalization made no change, treat as raw
-    if processed_bytes == suspect_bytes and canonicalize:
-        canonical_strategy = "raw_no_change"
-
-    # Compute sha256 of canonical bytes
-    query_sha256 = hashlib.sha256(processed_bytes).hexdigest()
-
-    # Exact match search (by sha256_hash stored)
-    exact_rec = None
-    for item in media:
-        try:
-            item_sha = item.get('sha256_hash') or ''
-            item_sha = item_sha[2:] if item_sha.startswith('0x') else item_sha
-            if item_sha.lower() == query_sha256.lower():
-                exact_rec = item
-                break
-        except Exception:
-            continue
+    core = _classify_core(source_key, load, canonicalize)
+    snap = core["snap"]
+    source_url = core["source_url"]
+    canonical_strategy = core["canonical_strategy"]
+    query_sha256 = core["query_sha256"]
+    exact_rec = core["exact_rec"]
 
     # If exact match found, return immediately (no embedding computation needed)
     if exact_rec:
@@ -1050,10 +1018,11 @@ def classify_media(
                         "similarity": 1.0,
                     }
                 ],
-                media=media,
                 similarity_threshold=similarity_threshold,
                 graph_top_k=graph_top_k,
+                depth=graph_depth,
             )
+        analytics_rollup.record_classification("exact_registered")
         return {
             "status": "exact_registered",
             "query_sha256": query_sha256,
@@ -1072,38 +1041,25 @@ def classify_media(
             "lineage_graph": graph_payload,
         }
 
-    # Derivative detection via embeddings
-    try:
-        from ..light_detectors import get_embedding_from_bytes  # type: ignore
-        emb_vec = get_embedding_from_bytes(processed_bytes)
-        query_emb = [float(x) for x in emb_vec][:512]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Embedding computation failed: {e}")
-
     best_sim = -1.0
     best_item = None
     match_list = []
     match_candidates: list[tuple[dict, float]] = []
-    for item in media:
-        try:
-            emb2 = item.get("embedding")
-            if not isinstance(emb2, list):
-                continue
-            sim = _cosine(query_emb, emb2)
-            match_candidates.append((item, sim))
-            if sim >= similarity_threshold:
-                match_list.append({
-                    "unique_reg_key": item.get("unique_reg_key"),
-                    "signer_address": item.get("signer_address"),
-                    "file_url": item.get("file_url"),
-                    "ipfs_cid": item.get("ipfs_cid"),
-                    "similarity": round(sim, 5),
-                })
-            if sim > best_sim:
-                best_sim = sim
-                best_item = item
-        except Exception:
+    for item, sim in zip(snap.records, core["sims"]):
+        if sim != sim:  # NaN: record has no usable embedding
             continue
+        match_candidates.append((item, sim))
+        if sim >= similarity_threshold:
+            match_list.append({
+                "unique_reg_key": item.get("unique_reg_key"),
+                "signer_address": item.get("signer_address"),
+                "file_url": item.get("file_url"),
+                "ipfs_cid": item.get("ipfs_cid"),
+                "similarity": round(sim, 5),
+            })
+        if sim > best_sim:
+            best_sim = sim
+            best_item = item
 
     match_list.sort(key=lambda x: x.get("similarity", 0), reverse=True)
     best_match_payload = None
@@ -1129,15 +1085,17 @@ def classify_media(
             best_similarity=best_sim,
             match_candidates=match_candidates,
             match_summaries=match_list,
-            media=media,
             similarity_threshold=similarity_threshold,
             graph_top_k=graph_top_k,
+            depth=graph_depth,
         )
 
     summary_payload = None
     if include_summary:
-        summary_payload = _build_summary_charts(media, similarity_threshold)
+        summary_counters.refresh()
+        summary_payload = summary_counters.summary(similarity_threshold)
 
+    analytics_rollup.record_classification(status)
     return {
         "status": status,
         "query_sha256": query_sha256,
@@ -1173,30 +1131,14 @@ def remove_watermark(file: UploadFile = File(None), ipfs_cid: str | None = None,
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to read upload: {e}")
     else:
-        # Build gateway URL similar to upload
-        gateway_domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-        if gateway_domain:
-            if str(gateway_domain).startswith("http://") or str(gateway_domain).startswith("https://"):
-                base = str(gateway_domain).rstrip('/')
-            else:
-                base = f"https://{str(gateway_domain).rstrip('/')}"
-            original_url = f"{base}/ipfs/{ipfs_cid}"
-        else:
-            original_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_cid}"
-        try:
-            r = requests.get(original_url, timeout=30)
-            if r.status_code >= 400:
-                raise HTTPException(status_code=502, detail=f"Fetch CID failed: {r.status_code}")
-            original_bytes = r.content
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"Fetch error: {e}")
+        original_bytes, _ = _fetch_cid_bytes(ipfs_cid, registry.snapshot())
+        original_url = public_url(ipfs_cid)
 
     if not original_bytes:
         raise HTTPException(status_code=500, detail="No bytes loaded for processing")
 
-    cleaned_bytes, info = _crop_watermark_with_info(original_bytes)
+    with stage_timer("canonicalize"):
+        cleaned_bytes, info = _crop_watermark_with_info(original_bytes)
 
     cleaned_cid = None
     cleaned_url = None
@@ -1220,15 +1162,7 @@ def remove_watermark(file: UploadFile = File(None), ipfs_cid: str | None = None,
             cleaned_cid = data_json.get("IpfsHash")
             if not cleaned_cid:
                 raise HTTPException(status_code=502, detail=f"Pinata response missing IpfsHash: {data_json}")
-            gateway_domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-            if gateway_domain:
-                if str(gateway_domain).startswith("http://") or str(gateway_domain).startswith("https://"):
-                    base = str(gateway_domain).rstrip('/')
-                else:
-                    base = f"https://{str(gateway_domain).rstrip('/')}"
-                cleaned_url = f"{base}/ipfs/{cleaned_cid}"
-            else:
-                cleaned_url = f"https://gateway.pinata.cloud/ipfs/{cleaned_cid}"
+            cleaned_url = public_url(cleaned_cid)
         except HTTPException:
             raise
         except Exception as e:
@@ -1248,30 +1182,28 @@ def register_media_debug(payload: RegisterRequest):
     try:
         return register_media(payload)
     except Exception as e:
-        import traceback, sys as _sys
+        import traceback
         tb = traceback.format_exc()
-        print(f"[REGISTER DEBUG EXC] {tb}", file=_sys.stderr)
+        logger.error("register_debug failed: %s", e, exc_info=True)
         # Return the traceback to the client for local debugging
         raise HTTPException(status_code=500, detail=tb)
 
 
 @router.get("/registrants")
-def list_registrants(sha256_hash: str | None = None, cid: str | None = None):
+def list_registrants(request: Request, sha256_hash: str | None = None, cid: str | None = None):
     """Return a list of registrants for a given content, identified by sha256_hash (hex) or ipfs cid.
 
     When sha256_hash is provided, we compute content_key K = sha256(H) and match on stored content_key.
     When only cid is provided, we match records with the same ipfs_cid.
+    Unchanged polls get 304 via the registry ETag.
     """
-    from pathlib import Path
-    import json
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    MEDIA_FILE = DATA_PATH / "registered_media.json"
-    if not MEDIA_FILE.exists():
+    return cached_json(request, "registrants", (sha256_hash, cid),
+                       lambda snap: _registrants(snap, sha256_hash, cid))
+
+
+def _registrants(snap, sha256_hash: str | None, cid: str | None) -> dict:
+    if not snap.exists:
         return {"registrants": []}
-    try:
-        media = json.loads(MEDIA_FILE.read_text())
-    except Exception:
-        media = []
 
     target_key = None
     if sha256_hash:
@@ -1283,18 +1215,17 @@ def list_registrants(sha256_hash: str | None = None, cid: str | None = None):
         except Exception:
             target_key = None
 
+    if target_key:
+        candidates = snap.by_content_key.get(target_key, [])
+    elif cid:
+        candidates = snap.by_cid.get(cid, [])
+    else:
+        # Neither filter provided
+        candidates = []
+
     registrants = []
-    for item in media:
+    for item in candidates:
         try:
-            if target_key:
-                if item.get("content_key") != target_key:
-                    continue
-            elif cid:
-                if item.get("ipfs_cid") != cid:
-                    continue
-            else:
-                # Neither filter provided
-                continue
             signer_addr = item.get("signer_address")
             registrants.append({
                 "signer_address": signer_addr,
@@ -1367,27 +1298,37 @@ def verify_signature(payload: VerifySignatureRequest) -> Dict[str, str]:
 
 @router.get("/tx_status/{txid}")
 def tx_status(txid: str):
-    """Check whether an Algorand transaction id is known to the configured algod node.
+    """Confirmation state of an Algorand transaction id.
+
+    Served from the background tracker (app/tx_tracker.py); a txid the tracker
+    has not seen is looked up once and then watched. Prefer subscribing on
+    /websocket/ws/tx over polling this endpoint.
 
-    Returns JSON: { exists: bool, confirmed_round: int | None }
+    Returns JSON: { exists: bool, confirmed_round: int | None, status }
     """
-    try:
-        from algosdk.v2client import algod
-        algod_address = settings.ALGOD_ADDRESS
-        algod_token = settings.ALGOD_TOKEN
-        algod_client = algod.AlgodClient(algod_token, algod_address)
-        # pending_transaction_info raises if not found; wrap in try
+    from ..tx_tracker import tx_tracker
+    state = tx_tracker.status(txid)
+    if state is None:
         try:
-            info = algod_client.pending_transaction_info(txid)
-            # If 'confirmed-round' present and > 0, tx is confirmed
-            confirmed = info.get('confirmed-round') or info.get('confirmed_round')
-            return {"exists": True, "confirmed_round": confirmed}
-        except Exception:
-            # Not found yet
-            return {"exists": False, "confirmed_round": None}
-    except Exception as e:
-        # If algod client not configured or fails, return error
-        raise HTTPException(status_code=500, detail=f"Algod status check failed: {e}")
+            from ..algorand_app_utils import get_algod_client
+            algod_client = get_algod_client()
+            # pending_transaction_info raises if not found; wrap in try
+            try:
+                info = algod_client.pending_transaction_info(txid)
+            except Exception:
+                # Not found yet
+                return {"exists": False, "confirmed_round": None, "status": "unknown"}
+        except Exception as e:
+            # If algod client not configured or fails, return error
+            raise HTTPException(status_code=500, detail=f"Algod status check failed: {e}")
+        # If 'confirmed-round' present and > 0, tx is confirmed
+        confirmed = info.get('confirmed-round') or info.get('confirmed_round')
+        if confirmed:
+            tx_tracker.resolve(txid, {"status": "confirmed", "confirmed_round": confirmed})
+        else:
+            tx_tracker.track(txid)
+        state = tx_tracker.status(txid)
+    return {"exists": state["status"] != "expired", **state}
 
 
 @router.get("/algod_params")
@@ -1399,10 +1340,9 @@ def algod_params():
     """
     try:
         import base64
-        from ..algorand_app_utils import get_algod_client
+        from ..algorand_app_utils import algod_service
 
-        algod_client = get_algod_client()
-        params = algod_client.suggested_params()
+        params = algod_service.suggested_params()
 
         genesis_hash_data = params.gh
         if isinstance(genesis_hash_data, str):
@@ -1422,10 +1362,28 @@ def algod_params():
         return p
 
     except Exception as e:
-        print(f"Error fetching algod params: {e}")
+        logger.error("Error fetching algod params: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch Algod suggested params.")
 
 
+def _forward_signed_bytes(signed_bytes: bytes) -> str:
+    from ..algorand_app_utils import get_algod_client, send_raw_transaction_bytes
+    try:
+        with stage_timer("algod"):
+            return get_algod_client().send_raw_transaction(signed_bytes)
+    except Exception as e:
+        # If padding complaint or HTTP error occurs, try explicit HTTP binary fallback
+        logger.warning("SDK send_raw_transaction failed, retrying over HTTP: %s", e)
+        try:
+            txid = send_raw_transaction_bytes(signed_bytes)
+            logger.info("HTTP binary submit succeeded: %s", txid)
+            return txid
+        except Exception as e2:
+            logger.error("HTTP binary submit failed: %s", e2)
+            head_hex = signed_bytes[:8].hex() if len(signed_bytes) >= 8 else signed_bytes.hex()
+            raise HTTPException(status_code=502, detail=f"Algod error: {e2} bytes={len(signed_bytes)} head=0x{head_hex}")
+
+
 @router.post("/broadcast_signed_tx")
 async def broadcast_signed_tx(request: Request):
     """Accept base64 signed txn and forward raw bytes to Algod.
@@ -1459,22 +1417,12 @@ async def broadcast_signed_tx(request: Request):
         signed_bytes = await request.body()
 
     sha = hashlib.sha256(signed_bytes).hexdigest()
-    print(f"[FORWARD] raw_len={len(signed_bytes)} head=0x{signed_bytes[:8].hex()} sha256={sha}")
-
-    from ..algorand_app_utils import get_algod_client, send_raw_transaction_bytes
-    try:
-        txid = get_algod_client().send_raw_transaction(signed_bytes)
-    except Exception as e:
-        # If padding complaint or HTTP error occurs, try explicit HTTP binary fallback
-        print(f"[ALGOD ERROR] SDK send_raw_transaction failed: {e}")
-        try:
-            txid = send_raw_transaction_bytes(signed_bytes)
-            print("[ALGOD FALLBACK] HTTP binary submit succeeded", txid)
-        except Exception as e2:
-            print(f"[ALGOD FALLBACK ERROR] {e2}")
-            head_hex = signed_bytes[:8].hex() if len(signed_bytes) >= 8 else signed_bytes.hex()
-            raise HTTPException(status_code=502, detail=f"Algod error: {e2} bytes={len(signed_bytes)} head=0x{head_hex}")
+    logger.debug("forward raw_len=%d head=0x%s sha256=%s", len(signed_bytes), signed_bytes[:8].hex(), sha)
 
+    # The algod client is synchronous; keep it off the event loop.
+    txid = await run_in_threadpool(_forward_signed_bytes, signed_bytes)
+    from ..tx_tracker import tx_tracker
+    tx_tracker.track(txid)
     return {"txid": txid, "explorer_url": f"https://lora.algokit.io/testnet/transaction/{txid}"}
 
 
@@ -1525,7 +1473,8 @@ def broadcast_signed_app_tx(body: BroadcastAppRequest):
         algod_client = get_algod_client()
         # Use send_raw_transaction for raw signed bytes for compatibility
         try:
-            txid = algod_client.send_raw_transaction(signed_bytes)
+            with stage_timer("algod"):
+                txid = algod_client.send_raw_transaction(signed_bytes)
         except Exception as e:
             try:
                 from algosdk.error import AlgodHTTPError  # type: ignore
@@ -1536,6 +1485,8 @@ def broadcast_signed_app_tx(body: BroadcastAppRequest):
                 raise HTTPException(status_code=502, detail=f"Algod error: {err_text}")
             raise HTTPException(status_code=500, detail=f"Broadcast app-tx failed (send_raw_transaction): {e}")
         explorer_url = f"https://lora.algokit.io/testnet/transaction/{txid}"
+        from ..tx_tracker import tx_tracker
+        tx_tracker.track(txid)
 
         # Diagnostics similar to payment broadcast (added after successful send to avoid altering already valid bytes).
         first_byte = signed_bytes[0] if signed_bytes else None
@@ -1553,44 +1504,44 @@ def broadcast_signed_app_tx(body: BroadcastAppRequest):
                 "json_or_text" if first_byte in (0x7b, 0x5b) else
                 "other"
             )
-            print(f"[APP FIRST BYTE] {fb_hex} classification={classification} raw_len={len(signed_bytes)}")
+            logger.debug("app first byte %s classification=%s raw_len=%d", fb_hex, classification, len(signed_bytes))
         # Fingerprint
         fp_sha256 = hashlib.sha256(signed_bytes).hexdigest()
         head_hex = signed_bytes[:16].hex()
         tail_hex = signed_bytes[-16:].hex() if len(signed_bytes) >= 16 else signed_bytes.hex()
-        print(f"[APP FINGERPRINT] raw_len={len(signed_bytes)} head=0x{head_hex} tail=0x{tail_hex} sha256={fp_sha256}")
+        logger.debug("app fingerprint raw_len=%d head=0x%s tail=0x%s sha256=%s", len(signed_bytes), head_hex, tail_hex, fp_sha256)
 
         # If app tx came as JSON wrapper (rare), attempt repair BEFORE send would be ideal; for safety we only log if classification suggests JSON.
         if first_byte in (0x7b, 0x5b):
-            print("[APP JSON NOTICE] App transaction appears to be JSON-wrapped; ensure frontend sends raw signed msgpack bytes.")
+            logger.warning("App transaction appears to be JSON-wrapped; ensure frontend sends raw signed msgpack bytes.")
 
         # Optionally attach txid to stored registration by unique_reg_key or content_key
         unique_reg_key = body.unique_reg_key
         content_key = body.content_key
         updated = None
         try:
-            from pathlib import Path
-            import json
-            DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-            MEDIA_FILE = DATA_PATH / "registered_media.json"
-            if MEDIA_FILE.exists() and (unique_reg_key or content_key):
-                media = json.loads(MEDIA_FILE.read_text())
-                for item in media:
-                    try:
-                        if unique_reg_key and item.get('unique_reg_key') == unique_reg_key:
-                            item['app_tx'] = txid
-                            item['app_explorer_url'] = explorer_url
-                            updated = item
-                            break
-                        if content_key and item.get('content_key') == content_key:
-                            item['app_tx'] = txid
-                            item['app_explorer_url'] = explorer_url
-                            updated = item
-                            break
-                    except Exception:
-                        continue
-                if updated:
-                    MEDIA_FILE.write_text(json.dumps(media, indent=2))
+            if unique_reg_key or content_key:
+                def attach(media: list) -> bool:
+                    nonlocal updated
+                    for item in media:
+                        try:
+                            if unique_reg_key and item.get('unique_reg_key') == unique_reg_key:
+                                item['app_tx'] = txid
+                                item['app_explorer_url'] = explorer_url
+                                item['app_tx_status'] = "pending"
+                                updated = item
+                                break
+                            if content_key and item.get('content_key') == content_key:
+                                item['app_tx'] = txid
+                                item['app_explorer_url'] = explorer_url
+                                item['app_tx_status'] = "pending"
+                                updated = item
+                                break
+                        except Exception:
+                            continue
+                    return updated is not None
+
+                registry.update_media(attach, in_place=True)
         except Exception:
             # non-fatal: ignore persistence errors but return txid
             updated = None
@@ -1605,76 +1556,148 @@ def broadcast_signed_app_tx(body: BroadcastAppRequest):
         raise HTTPException(status_code=500, detail=f"Broadcast app-tx failed: {e}")
 
 
-@router.post("/server_pay")
-def server_pay():
-    """Send a 1 ALGO payment from the server's deployer account to the deployer address.
+@router.post("/build_register_group")
+def build_register_group(body: RegisterGroupRequest):
+    """Build unsigned register app calls for up to 16 media items as one atomic group.
 
-    This provides a txid nonce without requiring the client to sign. Requires
-    DEPLOYER_MNEMONIC to be set on the server. Returns { txid, explorer_url }.
+    The client signs every `txn_b64` in one pass and posts them back, in order,
+    to /media/broadcast_signed_group.
+
+    Returns: { group_id, count, txns: [ { txn, txn_b64, media_key, reg_key, unique_reg_key } ] }
     """
+    from ..algorand_app_utils import build_register_app_group, MAX_GROUP_SIZE
+    app_id_str = getattr(settings, 'proofchain_app_id', None)
+    if not app_id_str:
+        raise HTTPException(status_code=500, detail="proofchain_app_id not configured on server")
+    if not body.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(body.items) > MAX_GROUP_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_GROUP_SIZE} items per group")
     try:
-        # Ensure mnemonic is available
-        mn = getattr(settings, 'DEPLOYER_MNEMONIC', None)
-        if not mn:
-            raise HTTPException(status_code=500, detail="DEPLOYER_MNEMONIC not configured on server")
-        try:
-            from algosdk import mnemonic as _mn, account as _acct
-            from algosdk.v2client import algod
-            # Prefer building txn with whichever transaction module is available
-            try:
-                from algosdk.future import transaction as _txn  # type: ignore
-            except Exception:
-                from algosdk import transaction as _txn  # type: ignore
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Algorand SDK import failed: {e}")
+        entries, group_id = build_register_app_group(
+            sender=body.signer_address,
+            app_id=int(app_id_str),
+            items=[(it.sha256_hash, it.ipfs_cid, it.nonce) for it in body.items],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build register group: {e}")
+    for entry, it in zip(entries, body.items):
+        entry["unique_reg_key"] = it.unique_reg_key
+    return {"group_id": group_id, "count": len(entries), "txns": entries}
 
-        # Build algod client
-        from ..algorand_app_utils import get_algod_client
-        algod_client = get_algod_client()
 
-        # Derive deployer keypair (compatible with newer SDKs without to_public_key)
-        clean_mn = mn.replace('"', '').strip()
-        priv = _mn.to_private_key(clean_mn)
-        sender_addr = _acct.address_from_private_key(priv)
+@router.post("/broadcast_signed_group")
+def broadcast_signed_group(body: BroadcastGroupRequest):
+    """Submit a signed atomic group of register app calls in one algod request.
 
-        # Receiver is the configured deployer address (self-transfer)
-        recv_resp = get_deployer_address()
-        recv_addr = recv_resp.get('deployer_address')
-        if not recv_addr:
-            raise HTTPException(status_code=500, detail="DEPLOYER_ADDRESS not available from server")
+    Returns: { group_id, txids, txid, explorer_url, updated_records }
+    """
+    from ..algorand_app_utils import decode_signed_group, get_algod_client, MAX_GROUP_SIZE
+    if not body.signed_txns_b64:
+        raise HTTPException(status_code=400, detail="signed_txns_b64 must not be empty")
+    if len(body.signed_txns_b64) > MAX_GROUP_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_GROUP_SIZE} transactions per group")
+    try:
+        signed_bytes, txids, group_id = decode_signed_group([b.strip() for b in body.signed_txns_b64])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid signed group: {e}")
 
-        # Build and sign txn
+    try:
+        with stage_timer("algod"):
+            get_algod_client().send_raw_transaction(signed_bytes)
+    except Exception as e:
         try:
-            params = algod_client.suggested_params()
-            amount = 1_000_000  # 1 ALGO in microAlgos
-            note = b"ProofChain registration (server-pays)"
-            unsigned_txn = _txn.PaymentTxn(sender_addr, params, recv_addr, amount, None, note)
-            signed_txn = unsigned_txn.sign(priv)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to build/sign server payment: {e}")
+            from algosdk.error import AlgodHTTPError  # type: ignore
+        except Exception:
+            AlgodHTTPError = Exception  # type: ignore
+        if isinstance(e, AlgodHTTPError):
+            raise HTTPException(status_code=502, detail=f"Algod error: {e}")
+        raise HTTPException(status_code=500, detail=f"Broadcast group failed: {e}")
+    logger.info("submitted %d txns group=%s", len(txids), group_id)
+    from ..tx_tracker import tx_tracker
+    for txid in txids:
+        tx_tracker.track(txid)
 
-        # Send via send_transaction (SignedTransaction object)
+    updated = []
+    reg_keys = body.unique_reg_keys or []
+    wanted = {rk: i for i, rk in enumerate(reg_keys[:len(txids)]) if rk}
+    if wanted:
         try:
-            txid = algod_client.send_transaction(signed_txn)
+            def attach(media: list) -> bool:
+                for item in media:
+                    i = wanted.get(item.get('unique_reg_key')) if isinstance(item, dict) else None
+                    if i is not None:
+                        item['app_tx'] = txids[i]
+                        item['app_explorer_url'] = f"https://lora.algokit.io/testnet/transaction/{txids[i]}"
+                        item['app_group_id'] = group_id
+                        item['app_tx_status'] = "pending"
+                        updated.append(item)
+                return bool(updated)
+
+            registry.update_media(attach, in_place=True)
         except Exception as e:
-            try:
-                from algosdk.error import AlgodHTTPError  # type: ignore
-            except Exception:
-                AlgodHTTPError = Exception  # type: ignore
-            if isinstance(e, AlgodHTTPError):
-                raise HTTPException(status_code=502, detail=f"Algod error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Server payment failed: {e}")
+            # non-fatal: the group is already on its way
+            logger.warning("failed to attach group txids to registrations: %s", e)
+            updated = []
+
+    return {
+        "group_id": group_id,
+        "txids": txids,
+        "txid": txids[0],
+        "explorer_url": f"https://lora.algokit.io/testnet/transaction/{txids[0]}",
+        "updated_records": updated,
+    }
+
+
+@router.post("/server_pay")
+def server_pay(request: Request):
+    """Send a 1 ALGO payment from the server's deployer account to the deployer address.
+
+    This provides a txid nonce without requiring the client to sign. Requires
+    DEPLOYER_MNEMONIC to be set on the server. The payment goes through the payout
+    batcher; the call waits up to PAYOUT_WAIT_SECONDS for its txid. Returns
+    { txid, explorer_url, job_id } (txid is null while still queued; poll
+    /media/payouts/{job_id}). An Idempotency-Key header makes retries safe.
+    """
+    if not getattr(settings, 'DEPLOYER_MNEMONIC', None):
+        raise HTTPException(status_code=500, detail="DEPLOYER_MNEMONIC not configured on server")
+
+    # Receiver is the configured deployer address (self-transfer)
+    recv_resp = get_deployer_address()
+    recv_addr = recv_resp.get('deployer_address')
+    if not recv_addr:
+        raise HTTPException(status_code=500, detail="DEPLOYER_ADDRESS not available from server")
+
+    from ..payout_batcher import payout_batcher
+    job = payout_batcher.submit(
+        recv_addr,
+        1_000_000,  # 1 ALGO in microAlgos
+        b"ProofChain registration (server-pays)",
+        idempotency_key=request.headers.get("Idempotency-Key"),
+    )
+    job.wait(PAYOUT_WAIT_SECONDS)
+    if job.status == "failed":
+        raise HTTPException(status_code=502, detail=f"Server payment failed: {job.error}")
+
+    return {
+        "txid": job.txid,
+        "explorer_url": f"https://lora.algokit.io/testnet/transaction/{job.txid}" if job.txid else None,
+        "receiver_address_masked": _mask_address(recv_addr),
+        "job_id": job.id,
+        "status": job.status,
+    }
 
-        explorer_url = f"https://lora.algokit.io/testnet/transaction/{txid}"
-        return {
-            "txid": txid,
-            "explorer_url": explorer_url,
-            "receiver_address_masked": _mask_address(recv_addr)
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"server_pay error: {e}")
+
+@router.get("/payouts/{job_id}")
+def payout_status(job_id: str):
+    """State of a queued server payout (see server_pay / generate)."""
+    from ..payout_batcher import payout_batcher
+    job = payout_batcher.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown payout job")
+    return job.to_dict()
 
 
 @router.get("/cid_status/{cid}")
@@ -1684,16 +1707,8 @@ def cid_status(cid: str):
     Returns: { cid, available: bool, http_status: int | None, url: str }
     """
     try:
-        # Build the same gateway URL used on upload
-        gateway_domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-        if gateway_domain:
-            if str(gateway_domain).startswith("http://") or str(gateway_domain).startswith("https://"):
-                base = str(gateway_domain).rstrip('/')
-            else:
-                base = f"https://{str(gateway_domain).rstrip('/')}"
-            url = f"{base}/ipfs/{cid}"
-        else:
-            url = f"https://gateway.pinata.cloud/ipfs/{cid}"
+        # Same gateway URL used on upload
+        url = public_url(cid)
 
         # Issue a HEAD request first; if not supported, try GET with small range
         try:
@@ -1773,52 +1788,46 @@ def recompute_reg_key(body: DeriveKeysRequest):
     K_bytes = hashlib.sha256(H).digest()
     K_hex = K_bytes.hex()
 
-    from pathlib import Path
-    import json
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    MEDIA_FILE = DATA_PATH / "registered_media.json"
-    if not MEDIA_FILE.exists():
+    if not registry.snapshot().exists:
         raise HTTPException(status_code=404, detail="No registered_media.json found to update")
 
-    try:
-        media = json.loads(MEDIA_FILE.read_text())
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read media file: {e}")
-
     updated = []
     target_h = h_hex.lower()
-    for item in media:
-        try:
-            item_h = item.get('sha256_hash') or ''
-            item_h = item_h[2:] if isinstance(item_h, str) and item_h.startswith('0x') else item_h
-            if not item_h:
-                continue
-            if item_h.lower() != target_h:
-                continue
 
-            # Determine nonce source: prefer provided nonce, else fallback to signer-based seed
-            if body.nonce:
-                nonce_src = body.nonce
-            else:
-                nonce_src = f"{item.get('signer_address','')}:{time.time_ns()}:{secrets.token_hex(4)}"
-
-            reg_key = hashlib.sha256(K_bytes + nonce_src.encode('utf-8')).hexdigest()
-            item['content_key'] = K_hex
-            item['unique_reg_key'] = reg_key
-            if body.nonce:
-                item['algo_tx'] = body.nonce
-                item['algo_explorer_url'] = f"https://lora.algokit.io/testnet/transaction/{body.nonce}"
-
-            updated.append({
-                'signer_address': item.get('signer_address'),
-                'unique_reg_key': reg_key,
-                'algo_tx': item.get('algo_tx'),
-            })
-        except Exception:
-            continue
+    def recompute(media: list) -> bool:
+        for item in media:
+            try:
+                item_h = item.get('sha256_hash') or ''
+                item_h = item_h[2:] if isinstance(item_h, str) and item_h.startswith('0x') else item_h
+                if not item_h:
+                    continue
+                if item_h.lower() != target_h:
+                    continue
+
+                # Determine nonce source: prefer provided nonce, else fallback to signer-based seed
+                if body.nonce:
+                    nonce_src = body.nonce
+                else:
+                    nonce_src = f"{item.get('signer_address','')}:{time.time_ns()}:{secrets.token_hex(4)}"
+
+                reg_key = hashlib.sha256(K_bytes + nonce_src.encode('utf-8')).hexdigest()
+                item['content_key'] = K_hex
+                item['unique_reg_key'] = reg_key
+                if body.nonce:
+                    item['algo_tx'] = body.nonce
+                    item['algo_explorer_url'] = f"https://lora.algokit.io/testnet/transaction/{body.nonce}"
+
+                updated.append({
+                    'signer_address': item.get('signer_address'),
+                    'unique_reg_key': reg_key,
+                    'algo_tx': item.get('algo_tx'),
+                })
+            except Exception:
+                continue
+        return bool(updated)
 
     try:
-        MEDIA_FILE.write_text(json.dumps(media, indent=2))
+        registry.update_media(recompute)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to persist updates: {e}")
 
@@ -1832,18 +1841,10 @@ def media_trust(sha256_hash: str | None = None, cid: str | None = None, check_on
 
     Returns a per-registrant trust breakdown and an aggregate score.
     """
-    from pathlib import Path
-    import math
-    DATA_PATH = Path(__file__).resolve().parents[1] / "data"
-    MEDIA_FILE = DATA_PATH / "registered_media.json"
-    if not MEDIA_FILE.exists():
+    snap = registry.snapshot()
+    if not snap.exists:
         raise HTTPException(status_code=404, detail="No registered_media.json found")
 
-    try:
-        media = json.loads(MEDIA_FILE.read_text())
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read media file: {e}")
-
     target_key = None
     if sha256_hash:
         try:
@@ -1855,20 +1856,12 @@ def media_trust(sha256_hash: str | None = None, cid: str | None = None, check_on
             target_key = None
 
     # Gather matching records
-    matches = []
-    for item in media:
-        try:
-            if target_key:
-                if item.get("content_key") != target_key:
-                    continue
-            elif cid:
-                if item.get("ipfs_cid") != cid:
-                    continue
-            else:
-                continue
-            matches.append(item)
-        except Exception:
-            continue
+    if target_key:
+        matches = list(snap.by_content_key.get(target_key, []))
+    elif cid:
+        matches = list(snap.by_cid.get(cid, []))
+    else:
+        matches = []
 
     # Compute trust score
     trust_score = 0
@@ -1886,4 +1879,19 @@ def media_trust(sha256_hash: str | None = None, cid: str | None = None, check_on
             "algo_tx": match.get("algo_tx"),
         })
 
-    return {"trust_score": round(trust_score, 2), "matches": result}
+    response = {"trust_score": round(trust_score, 2), "matches": result}
+    if check_onchain:
+        # Answered from the local box mirror; no algod round trips per request.
+        from ..chain_mirror import chain_mirror
+        for entry, match in zip(result, matches):
+            onchain_cid = chain_mirror.media_cid(match.get("content_key"))
+            onchain_sender = chain_mirror.reg_sender(match.get("unique_reg_key"))
+            entry["onchain"] = {
+                "media_registered": onchain_cid is not None,
+                "cid_matches": onchain_cid is not None and onchain_cid == match.get("ipfs_cid"),
+                "reg_registered": onchain_sender is not None,
+                "reg_sender": onchain_sender,
+                "sender_matches": onchain_sender is not None and onchain_sender == match.get("signer_address"),
+            }
+        response["onchain_synced_round"] = chain_mirror.synced_round()
+    return response
@@ -1,36 +1,27 @@
-from fastapi import APIRouter, HTTPException, Query
-from pathlib import Path
-import json
+from fastapi import APIRouter, HTTPException, Query, Request
+import os
 import requests
-from ..config import settings
+from .. import registry
+from ..conditional import cached_json
+from ..json_response import EMBEDDING_MODES, response_class, shape_embeddings
+from ..ipfs_gateways import public_url
 
-router = APIRouter()
+router = APIRouter(default_response_class=response_class())
 
-DATA_PATH = Path(__file__).resolve().parents[1] / "data"
+DATA_PATH = registry.DATA_PATH
 DATA_PATH.mkdir(parents=True, exist_ok=True)
-MEDIA_FILE = DATA_PATH / "registered_media.json"
+MEDIA_FILE = registry.MEDIA_FILE
+# How long CID availability checks behind mark/filter listings are reused.
+AVAILABILITY_TTL = float(os.getenv("AVAILABILITY_TTL", "60"))
 
 def load_media():
-    if not MEDIA_FILE.exists():
-        return []
-    try:
-        return json.loads(MEDIA_FILE.read_text())
-    except Exception:
-        return []
-
-def _gateway_base() -> str:
-    domain = getattr(settings, 'PINATA_GATEWAY_DOMAIN', None)
-    if domain:
-        d = str(domain).rstrip('/')
-        if d.startswith('http://') or d.startswith('https://'):
-            return d
-        return f"https://{d}"
-    return "https://gateway.pinata.cloud"
+    """Mutable copy of the shared registry snapshot (no JSON parsing when unchanged)."""
+    return registry.load_media()
 
 def _cid_available(cid: str) -> tuple[bool, int | None]:
     if not cid:
         return False, None
-    url = f"{_gateway_base()}/ipfs/{cid}"
+    url = public_url(cid)
     try:
         r = requests.head(url, timeout=8)  # Added timeout
         status = r.status_code
@@ -47,20 +38,41 @@ def _cid_available(cid: str) -> tuple[bool, int | None]:
 
 
 @router.get("/api/registrations")
-def list_registrations(availability: str = Query("filter", description="none=don’t check, mark=include cid_available flag, filter=only available")):
+def list_registrations(
+    request: Request,
+    availability: str = Query("filter", description="none=don’t check, mark=include cid_available flag, filter=only available"),
+    embedding: str = Query("full", description="full | round (to `precision` decimals) | f16 (base64 float16) | omit"),
+    precision: int = Query(4, ge=0, le=8),
+):
     """Return registered media from local store, optionally checking IPFS availability.
 
     availability:
       - none   : no check
       - mark   : include field cid_available: true/false
       - filter : only return items where CID resolves via the configured gateway
+
+    embedding shrinks the per-record embedding vectors (see json_response.shape_embeddings).
+
+    Served with an ETag; unchanged polls get 304. Availability results are
+    reused for AVAILABILITY_TTL seconds.
     """
-    items = load_media()
     if availability not in {"none", "mark", "filter"}:
         availability = "filter"
+    if embedding not in EMBEDDING_MODES:
+        embedding = "full"
+    ttl = None if availability == "none" else AVAILABILITY_TTL
+    # precision only changes the body for embedding=round.
+    params = (availability, embedding, precision if embedding == "round" else None)
+    return cached_json(request, "registrations", params,
+                       lambda snap: shape_embeddings(_build_registrations(snap, availability), embedding, precision),
+                       ttl=ttl)
+
 
+def _build_registrations(snap, availability: str) -> list:
+    # Shared read-only snapshot; "mark" copies the records it annotates.
+    items = snap.records
     if availability == "none":
-        return items
+        return list(items)
 
     result = []
     for it in items:
@@ -70,27 +82,25 @@ def list_registrations(availability: str = Query("filter", description="none=don
                 if ok:
                     result.append(it)
             else:  # mark
-                it["cid_available"] = bool(ok)
-                result.append(it)
+                result.append({**it, "cid_available": bool(ok)})
         except Exception:
             if availability == "mark":
-                it["cid_available"] = False
-                result.append(it)
+                result.append({**it, "cid_available": False})
             continue
     return result
 
 @router.patch("/api/registrations/{sha256_hash}")
 def update_registration(sha256_hash: str, patch: dict):
     """Update a registration by sha256_hash (status, etc)."""
-    media = load_media()
     updated_items = []
-    found = False
-    for item in media:
-        if item.get("sha256_hash") == sha256_hash:
-            item.update(patch)
-            updated_items.append(item)
-            found = True
-    if not found:
+
+    def apply(media: list) -> bool:
+        for item in media:
+            if item.get("sha256_hash") == sha256_hash:
+                item.update(patch)
+                updated_items.append(item)
+        return bool(updated_items)
+
+    if not registry.update_media(apply):
         raise HTTPException(status_code=404, detail="Registration not found")
-    MEDIA_FILE.write_text(json.dumps(media, indent=2))
     return {"updated": updated_items}
@@ -1,28 +1,33 @@
 from fastapi import APIRouter, HTTPException
+from datetime import datetime, timedelta, timezone
 
-router = APIRouter()
+from ..analytics_rollup import analytics_rollup
 
-# Mock data for demonstration purposes
-mock_user_stats = {
-    "posts": 10,
-    "followers": 200,
-    "following": 150
-}
+router = APIRouter()
 
 @router.get("/api/user-stats")
 def get_user_stats():
     """
     Endpoint to fetch user statistics.
-    Returns mock data for now.
+    Served from the analytics rollup store; there is no follower graph yet.
     """
-    return mock_user_stats
+    totals = analytics_rollup.totals()
+    return {
+        "posts": totals.get("uploads", 0),
+        "verifications": totals.get("verifications", 0),
+        "followers": 0,
+        "following": 0,
+    }
 
 @router.get("/user-stats")
 def read_user_stats():
-    """Fetch user statistics."""
-    # Placeholder data
+    """Fetch user statistics (distinct signers; active = seen in the last 30 days)."""
+    today = datetime.now(timezone.utc).date()
+    total_users = analytics_rollup.totals().get("signers", 0)
+    active_users = analytics_rollup.engagement(today - timedelta(days=29), today)["active_users"]
+    active_users = min(active_users, total_users)
     return {
-        "total_users": 1500,
-        "active_users": 1200,
-        "inactive_users": 300
-    }
\ No newline at end of file
+        "total_users": total_users,
+        "active_users": active_users,
+        "inactive_users": total_users - active_users,
+    }
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class GenerateRequest(BaseModel):
@@ -92,3 +92,25 @@ class BroadcastAppRequest(BaseModel):
     unique_reg_key: Optional[str] = None
     content_key: Optional[str] = None
 
+
+
+class RegisterGroupItem(BaseModel):
+    sha256_hash: str
+    ipfs_cid: str
+    nonce: Optional[str] = None
+    unique_reg_key: Optional[str] = None
+
+
+class RegisterGroupRequest(BaseModel):
+    """Build up to 16 ProofChain register app calls as one atomic group."""
+    signer_address: str
+    items: List[RegisterGroupItem]
+
+
+class BroadcastGroupRequest(BaseModel):
+    """Signed group from /media/build_register_group, in group order.
+
+    - unique_reg_keys: optional, per transaction; records found get app_tx / app_group_id
+    """
+    signed_txns_b64: List[str]
+    unique_reg_keys: Optional[List[Optional[str]]] = None
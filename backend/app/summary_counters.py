@@ -0,0 +1,163 @@
+"""Incrementally maintained chart buckets for /media/visualization_summary.
+
+Each registry item lands in exactly one bucket for a given threshold:
+``near_match`` when its ``near_duplicate_similarity`` (default 0) is at or above
+the threshold, otherwise by its ``type`` (duplicate / declared / anchor, anything
+else counts as query). Items whose similarity is not a number are skipped.
+
+Per type we keep a cumulative histogram of similarities, so any threshold is
+answered with a couple of array lookups instead of a pass over the registry.
+"""
+import bisect
+import math
+import threading
+
+from . import registry
+
+_LOW = -1.0
+_HIGH = 1.0
+_BIN_WIDTH = 0.001
+_NBINS = int(round((_HIGH - _LOW) / _BIN_WIDTH)) + 1
+
+_TYPE_BUCKETS = ("duplicate", "declared", "anchor")
+_BUCKETS = _TYPE_BUCKETS + ("query",)
+
+
+def _bin_index(value: float) -> int:
+    if value <= _LOW:
+        return 0
+    if value >= _HIGH:
+        return _NBINS - 1
+    return min(int(math.floor((value - _LOW) / _BIN_WIDTH)), _NBINS - 1)
+
+
+class CumulativeHistogram:
+    """Fixed-width histogram answering count(value >= t) for arbitrary t.
+
+    Values are binned at 0.001 resolution; each bin also keeps its exact values
+    sorted so thresholds falling inside a bin are still answered exactly.
+    """
+
+    def __init__(self):
+        self._bins: list[list[float]] = [[] for _ in range(_NBINS)]
+        # _at_or_above[b] = number of values stored in bins b.._NBINS-1
+        self._at_or_above = [0] * (_NBINS + 1)
+        self.total = 0
+
+    def add(self, value: float) -> None:
+        b = _bin_index(value)
+        bisect.insort(self._bins[b], value)
+        for i in range(b + 1):
+            self._at_or_above[i] += 1
+        self.total += 1
+
+    def extend(self, values) -> None:
+        """Bulk insert; recomputes the cumulative array once."""
+        for value in values:
+            self._bins[_bin_index(value)].append(value)
+        running = 0
+        for b in range(_NBINS - 1, -1, -1):
+            self._bins[b].sort()
+            running += len(self._bins[b])
+            self._at_or_above[b] = running
+        self.total = running
+
+    def count_at_least(self, threshold: float) -> int:
+        if threshold != threshold:  # NaN never compares true
+            return 0
+        b = _bin_index(threshold)
+        in_bin = self._bins[b]
+        return self._at_or_above[b + 1] + len(in_bin) - bisect.bisect_left(in_bin, threshold)
+
+
+def _bucket_and_similarity(item) -> tuple[str, float] | None:
+    if not isinstance(item, dict):
+        return None
+    similarity = item.get("near_duplicate_similarity", 0)
+    if isinstance(similarity, bool):
+        similarity = int(similarity)
+    if not isinstance(similarity, (int, float)):
+        return None
+    item_type = item.get("type")
+    bucket = item_type if item_type in _TYPE_BUCKETS else "query"
+    return bucket, float(similarity)
+
+
+class SummaryCounters:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._hist: dict[str, CumulativeHistogram] = {}
+        # Items whose similarity is NaN: never a near match, always counted by type.
+        self._nan_counts: dict[str, int] = {}
+
+    def _reset(self, media, version) -> None:
+        grouped: dict[str, list[float]] = {bucket: [] for bucket in _BUCKETS}
+        self._nan_counts = {bucket: 0 for bucket in _BUCKETS}
+        for item in media:
+            parsed = _bucket_and_similarity(item)
+            if parsed is None:
+                continue
+            bucket, similarity = parsed
+            if similarity != similarity:
+                self._nan_counts[bucket] += 1
+            else:
+                grouped[bucket].append(similarity)
+        self._hist = {}
+        for bucket, values in grouped.items():
+            hist = CumulativeHistogram()
+            hist.extend(values)
+            self._hist[bucket] = hist
+        self._version = version
+        self._loaded = True
+
+    def _add(self, item) -> None:
+        parsed = _bucket_and_similarity(item)
+        if parsed is None:
+            return
+        bucket, similarity = parsed
+        if similarity != similarity:
+            self._nan_counts[bucket] += 1
+        else:
+            self._hist[bucket].add(similarity)
+
+    def on_registry_change(self, event: str, records, snapshot) -> None:
+        with self._lock:
+            if not self._loaded:
+                return
+            if event == "append":
+                for item in records:
+                    self._add(item)
+                self._version = snapshot.version
+            elif event == "update" and all(
+                    _bucket_and_similarity(old) == _bucket_and_similarity(new) for old, new in records):
+                # Status/bookkeeping updates leave every count as it was.
+                self._version = snapshot.version
+            else:
+                self._reset(snapshot.records, snapshot.version)
+
+    def refresh(self) -> None:
+        """Build lazily from the shared registry snapshot on first use.
+
+        Later changes (including reloads after out-of-process writes) arrive
+        through registry notifications.
+        """
+        snap = registry.snapshot()
+        with self._lock:
+            if self._loaded and snap.version == self._version:
+                return
+            self._reset(snap.records, snap.version)
+
+    def summary(self, similarity_threshold: float) -> dict:
+        with self._lock:
+            summary = {"query": 0, "anchor": 0, "near_match": 0, "duplicate": 0, "declared": 0}
+            for bucket, hist in self._hist.items():
+                near = hist.count_at_least(similarity_threshold)
+                summary["near_match"] += near
+                summary[bucket] += hist.total - near + self._nan_counts.get(bucket, 0)
+            return summary
+
+
+summary_counters = SummaryCounters()
+registry.subscribe(summary_counters.on_registry_change)
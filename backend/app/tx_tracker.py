@@ -0,0 +1,243 @@
+"""Background confirmation tracker for submitted Algorand transactions.
+
+Broadcast endpoints hand their txids to :data:`tx_tracker`. One asyncio task
+waits for each new block with ``status_after_block`` and checks every pending
+txid against it: the block's txid list is fetched once per round (falling back
+to one ``pending_transaction_info`` per pending txid when the node lacks that
+endpoint). No algod calls are made while nothing is pending.
+
+On confirmation the registry records carrying the txid (``algo_tx`` or
+``app_tx``) get ``<field>_status = "confirmed"`` and ``<field>_confirmed_round``
+(an in-place registry update, so indexes and caches are kept), and an event is
+pushed to ``/websocket/ws/tx`` subscribers. Transactions still unconfirmed after
+their last valid round (or after TRACK_ROUNDS) are reported as expired; ones the
+pool rejects as failed. The pool is asked again every POOL_CHECK_ROUNDS rounds,
+since block txid listings only show confirmations.
+
+Tracking state is in memory: on start, txids of registry records still marked
+``<field>_status = "pending"`` are tracked again.
+
+``/media/tx_status/{txid}`` is answered from this tracker's state.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+# Give up on txids that have not confirmed after this many rounds (1000 is the
+# protocol's maximum validity window).
+TRACK_ROUNDS = 1000
+MAX_RESULTS = 10_000
+# Replay at most this many missed rounds block by block after a stall.
+MAX_CATCHUP_ROUNDS = 20
+# Look a pending txid up in the pool at least this often to catch rejections.
+POOL_CHECK_ROUNDS = 10
+TX_FIELDS = ("algo_tx", "app_tx")
+
+
+def _algod():
+    from .algorand_app_utils import algod_service
+    return algod_service
+
+
+class TxTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict[str, dict] = {}
+        self._results: OrderedDict[str, dict] = OrderedDict()
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self._block_txids_supported = True
+        self.last_round = None
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        """Start the watcher task on the running loop (call on app startup)."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        if self._pending:
+            self._wake.set()
+
+    def _seed_from_registry(self) -> int:
+        """Track the txids of registry records still marked pending; returns how many."""
+        count = 0
+        for item in registry.snapshot().records:
+            if not isinstance(item, dict):
+                continue
+            for field in TX_FIELDS:
+                txid = item.get(field)
+                if txid and item.get(f"{field}_status") == "pending" and self.status(txid) is None:
+                    self.track(txid)
+                    count += 1
+        return count
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # --- producers (safe from any thread) ---
+
+    def track(self, txid: str, last_valid: int | None = None) -> None:
+        if not txid:
+            return
+        with self._lock:
+            if txid in self._pending or txid in self._results:
+                return
+            self._pending[txid] = {"submitted_at": time.time(), "last_valid": last_valid, "first_seen_round": None}
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def status(self, txid: str) -> dict | None:
+        """Tracked state for txid, or None if the tracker has never seen it."""
+        with self._lock:
+            if txid in self._results:
+                return dict(self._results[txid])
+            if txid in self._pending:
+                return {"status": "pending", "confirmed_round": None}
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "results": len(self._results), "last_round": self.last_round}
+
+    # --- watcher ---
+
+    def resolve(self, txid: str, result: dict) -> None:
+        """Record a final state ({status, confirmed_round, ...}) for txid."""
+        with self._lock:
+            self._pending.pop(txid, None)
+            self._results[txid] = result
+            self._results.move_to_end(txid)
+            while len(self._results) > MAX_RESULTS:
+                self._results.popitem(last=False)
+
+    def _block_txids(self, rnd: int) -> set | None:
+        if not self._block_txids_supported:
+            return None
+        try:
+            resp = _algod().client.algod_request("GET", f"/blocks/{rnd}/txids")
+            return set(resp.get("blockTxids") or [])
+        except Exception as e:
+            logger.info("/blocks/{round}/txids unavailable, falling back to per-txid lookups: %s", e)
+            self._block_txids_supported = False
+            return None
+
+    def _check_round(self, rnd: int, txids: list) -> list[dict]:
+        """Blocking: resolve pending txids against round `rnd`; returns finished events."""
+        events = []
+        in_block = self._block_txids(rnd)
+        client = _algod().client
+        for txid in txids:
+            with self._lock:
+                meta = self._pending.get(txid)
+            if meta is None:
+                continue
+            first_check = meta["first_seen_round"] is None
+            if first_check:
+                meta["first_seen_round"] = rnd
+            if in_block is not None and txid in in_block:
+                events.append({"txid": txid, "status": "confirmed", "confirmed_round": rnd})
+                continue
+            if in_block is None or first_check or (rnd - meta["first_seen_round"]) % POOL_CHECK_ROUNDS == 0:
+                # First look (it may have confirmed before it was tracked), no block
+                # txid listing, or the periodic check for a pool rejection.
+                try:
+                    info = client.pending_transaction_info(txid)
+                    confirmed = info.get("confirmed-round") or info.get("confirmed_round")
+                    if confirmed:
+                        events.append({"txid": txid, "status": "confirmed", "confirmed_round": confirmed})
+                        continue
+                    if info.get("pool-error"):
+                        events.append({"txid": txid, "status": "failed", "confirmed_round": None,
+                                       "error": info.get("pool-error")})
+                        continue
+                except Exception:
+                    pass
+            last_valid = meta["last_valid"] or meta["first_seen_round"] + TRACK_ROUNDS
+            if rnd > last_valid:
+                events.append({"txid": txid, "status": "expired", "confirmed_round": None})
+        return events
+
+    def _apply_to_registry(self, events: list[dict]) -> None:
+        by_txid = {e["txid"]: e for e in events}
+
+        def patch(media: list) -> bool:
+            changed = False
+            for item in media:
+                if not isinstance(item, dict):
+                    continue
+                for field in TX_FIELDS:
+                    event = by_txid.get(item.get(field))
+                    if event is not None:
+                        item[f"{field}_status"] = event["status"]
+                        if event["confirmed_round"]:
+                            item[f"{field}_confirmed_round"] = event["confirmed_round"]
+                        changed = True
+            return changed
+
+        registry.update_media(patch, in_place=True)
+
+    async def _publish(self, events: list[dict]) -> None:
+        from .websocket import tx_hub
+        for event in events:
+            await tx_hub.publish({"type": "tx_status", **event})
+
+    async def _run(self) -> None:
+        try:
+            seeded = await asyncio.to_thread(self._seed_from_registry)
+            if seeded:
+                logger.info("tracking %d txids still pending in the registry", seeded)
+        except Exception as e:
+            logger.warning("could not seed pending txids from the registry: %s", e)
+        while True:
+            try:
+                with self._lock:
+                    has_pending = bool(self._pending)
+                if not has_pending:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                algod = _algod()
+                if self.last_round is None:
+                    self.last_round = await asyncio.to_thread(algod.last_round)
+                # Long-polls algod until the round after last_round is committed.
+                status = await asyncio.to_thread(algod.client.status_after_block, self.last_round)
+                new_round = int(status.get("last-round") or status.get("lastRound") or self.last_round)
+                first = self.last_round + 1
+                if new_round - first > MAX_CATCHUP_ROUNDS:
+                    # Fell far behind (e.g. algod was unreachable): re-check every pending
+                    # txid individually at the current round instead of replaying blocks.
+                    with self._lock:
+                        for meta in self._pending.values():
+                            meta["first_seen_round"] = None
+                    first = new_round
+                for rnd in range(first, new_round + 1):
+                    with self._lock:
+                        txids = list(self._pending)
+                    events = await asyncio.to_thread(self._check_round, rnd, txids)
+                    for event in events:
+                        self.resolve(event["txid"], {k: v for k, v in event.items() if k != "txid"})
+                    if events:
+                        await asyncio.to_thread(self._apply_to_registry, events)
+                        await self._publish(events)
+                self.last_round = new_round
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("watcher error: %s", e)
+                self.last_round = None
+                await asyncio.sleep(5)
+
+
+tx_tracker = TxTracker()
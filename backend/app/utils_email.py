@@ -1,6 +1,9 @@
-# Simple wrapper for legacy compatibility
+# Simple wrapper for legacy compatibility. Messages go through the persistent
+# outbox (app/email_outbox.py) so callers never wait on the mail server.
 def send_email(to_email, subject, body):
-    return send_email_smtp(to_email, subject, body)
+    from app.email_outbox import email_outbox
+    return {"queued": True, "id": email_outbox.enqueue(to_email, subject, body)}
+import logging
 import os
 import ssl
 import mimetypes
@@ -10,11 +13,64 @@ import smtplib
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SMTP_SERVER = os.getenv('SMTP_SERVER')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
 SMTP_USER = os.getenv('SMTP_USER')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
 SMTP_FROM = os.getenv('SMTP_FROM', SMTP_USER)
+# Set SMTP_USE_TLS=false to talk to a plain local stand-in (e.g. scripts/smtp_sink.py).
+SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def _recipients(to_addrs, cc=None, bcc=None):
+    to_list = [to_addrs] if isinstance(to_addrs, str) else list(to_addrs or [])
+    cc_list = ([cc] if isinstance(cc, str) else list(cc)) if cc else []
+    bcc_list = ([bcc] if isinstance(bcc, str) else list(bcc)) if bcc else []
+    return to_list, cc_list, bcc_list
+
+
+def build_message(to_addrs, subject, body_text, html=None, cc=None):
+    """Compose an EmailMessage (no attachments) from the configured sender."""
+    to_list, cc_list, _ = _recipients(to_addrs, cc)
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = SMTP_FROM
+    msg['To'] = ', '.join(to_list)
+    if cc_list:
+        msg['Cc'] = ', '.join(cc_list)
+    if html:
+        msg.set_content(body_text or 'This email contains an HTML body')
+        msg.add_alternative(html, subtype='html')
+    else:
+        msg.set_content(body_text or '')
+    return msg
+
+
+def open_smtp_connection(timeout=30):
+    """Open a connected, authenticated SMTP session using the environment config.
+
+    The caller owns the connection and is responsible for quit()/close().
+    """
+    if not SMTP_SERVER:
+        raise RuntimeError('SMTP_SERVER must be set in environment (.env)')
+    context = ssl.create_default_context()
+    if SMTP_PORT == 465:
+        server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, context=context, timeout=timeout)
+    else:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=timeout)
+        server.ehlo()
+        if SMTP_USE_TLS:
+            server.starttls(context=context)
+            server.ehlo()
+    try:
+        if SMTP_USER and SMTP_PASSWORD:
+            server.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
 
 
 def send_email_smtp(to_addrs, subject, body_text, html=None, cc=None, bcc=None, attachments=None, timeout=30):
@@ -36,49 +92,23 @@ def send_email_smtp(to_addrs, subject, body_text, html=None, cc=None, bcc=None,
     Returns:
         dict: {"sent": True, "recipients": [...]} on success.
     """
-    print(f"SMTP config: SERVER={SMTP_SERVER}, PORT={SMTP_PORT}, USER={SMTP_USER}, FROM={SMTP_FROM}")
+    logger.debug("SMTP config: SERVER=%s, PORT=%s, USER=%s, FROM=%s", SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_FROM)
     if not SMTP_SERVER or not SMTP_USER:
         raise RuntimeError('SMTP_SERVER and SMTP_USER must be set in environment (.env)')
 
-    print(f"Preparing recipients: to={to_addrs}, cc={cc}, bcc={bcc}")
-    if isinstance(to_addrs, str):
-        to_list = [to_addrs]
-    else:
-        to_list = list(to_addrs or [])
-
-    cc_list = []
-    if cc:
-        cc_list = [cc] if isinstance(cc, str) else list(cc)
-
-    bcc_list = []
-    if bcc:
-        bcc_list = [bcc] if isinstance(bcc, str) else list(bcc)
-
+    to_list, cc_list, bcc_list = _recipients(to_addrs, cc, bcc)
     all_recipients = to_list + cc_list + bcc_list
-    print(f"All recipients: {all_recipients}")
+    logger.debug("Sending to %d recipient(s)", len(all_recipients))
     if not all_recipients:
         raise RuntimeError('No recipients provided')
 
-    print(f"Composing message: subject={subject}")
-    msg = EmailMessage()
-    msg['Subject'] = subject
-    msg['From'] = SMTP_FROM
-    msg['To'] = ', '.join(to_list)
-    if cc_list:
-        msg['Cc'] = ', '.join(cc_list)
-
-    # Set plain text and optional HTML
-    if html:
-        msg.set_content(body_text or 'This email contains an HTML body')
-        msg.add_alternative(html, subtype='html')
-    else:
-        msg.set_content(body_text or '')
+    msg = build_message(to_list, subject, body_text, html=html, cc=cc_list)
 
     # Attach files if any
     if attachments:
         for path in attachments:
             if not os.path.exists(path):
-                print(f"Attachment not found: {path}")
+                logger.error("Attachment not found: %s", path)
                 raise RuntimeError(f'Attachment not found: {path}')
             ctype, encoding = mimetypes.guess_type(path)
             if ctype is None:
@@ -87,35 +117,16 @@ def send_email_smtp(to_addrs, subject, body_text, html=None, cc=None, bcc=None,
             with open(path, 'rb') as f:
                 data = f.read()
             msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=os.path.basename(path))
-            print(f"Attached file: {path}")
+            logger.debug("Attached file: %s", path)
 
     # Connect to SMTP and send
     try:
-        context = ssl.create_default_context()
-        print(f"Connecting to SMTP server {SMTP_SERVER}:{SMTP_PORT}...")
-        if SMTP_PORT == 465:
-            with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, context=context, timeout=timeout) as server:
-                print("Connected via SSL.")
-                if SMTP_USER and SMTP_PASSWORD:
-                    print(f"Logging in as {SMTP_USER}...")
-                    server.login(SMTP_USER, SMTP_PASSWORD)
-                print("Sending message...")
-                server.send_message(msg, from_addr=SMTP_FROM, to_addrs=all_recipients)
-        else:
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=timeout) as server:
-                print("Connected via plain SMTP.")
-                server.ehlo()
-                print("Starting TLS...")
-                server.starttls(context=context)
-                server.ehlo()
-                if SMTP_USER and SMTP_PASSWORD:
-                    print(f"Logging in as {SMTP_USER}...")
-                    server.login(SMTP_USER, SMTP_PASSWORD)
-                print("Sending message...")
-                server.send_message(msg, from_addr=SMTP_FROM, to_addrs=all_recipients)
-        print("Email sent successfully.")
+        logger.debug("Connecting to SMTP server %s:%s", SMTP_SERVER, SMTP_PORT)
+        with open_smtp_connection(timeout=timeout) as server:
+            server.send_message(msg, from_addr=SMTP_FROM, to_addrs=all_recipients)
+        logger.debug("Email sent")
     except Exception as e:
-        print(f"Error sending email: {e}")
+        logger.error("Error sending email: %s", e)
         raise RuntimeError(f'Failed to send email: {e}')
 
     return {"sent": True, "recipients": all_recipients}
@@ -1,4 +1,7 @@
-from fastapi import FastAPI, WebSocket
+import asyncio
+import json
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 
 app = FastAPI()
@@ -36,4 +39,64 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     while True:
         data = await websocket.receive_text()
-        await websocket.send_text(f"Message text was: {data}")
\ No newline at end of file
+        await websocket.send_text(f"Message text was: {data}")
+
+
+class TxHub:
+    """Fan-out of transaction status events to /ws/tx subscribers.
+
+    A client receives every event unless it sends {"subscribe": [txid, ...]},
+    after which it only receives events for those txids.
+    """
+
+    def __init__(self):
+        self._clients: dict[WebSocket, set | None] = {}
+
+    def connect(self, websocket: WebSocket) -> None:
+        self._clients[websocket] = None
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        self._clients.pop(websocket, None)
+
+    def subscribe(self, websocket: WebSocket, txids) -> None:
+        current = self._clients.get(websocket) or set()
+        self._clients[websocket] = current | {str(t) for t in txids}
+
+    async def publish(self, event: dict) -> None:
+        txid = event.get("txid")
+        targets = [ws for ws, wanted in list(self._clients.items()) if wanted is None or txid in wanted]
+        if not targets:
+            return
+        message = json.dumps(event)
+        results = await asyncio.gather(*(ws.send_text(message) for ws in targets), return_exceptions=True)
+        for ws, result in zip(targets, results):
+            if isinstance(result, Exception):
+                self.disconnect(ws)
+
+
+tx_hub = TxHub()
+
+
+@app.websocket("/ws/tx")
+async def tx_status_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    tx_hub.connect(websocket)
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                msg = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(msg, dict) and isinstance(msg.get("subscribe"), list):
+                from .tx_tracker import tx_tracker
+                tx_hub.subscribe(websocket, msg["subscribe"])
+                # Reply with what is already known so late subscribers don't miss confirmations.
+                for txid in msg["subscribe"]:
+                    state = tx_tracker.status(str(txid))
+                    if state is not None:
+                        await websocket.send_text(json.dumps({"type": "tx_status", "txid": txid, **state}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tx_hub.disconnect(websocket)
@@ -0,0 +1,112 @@
+"""Minimal local algod stand-in serving ProofChain app boxes from a JSON file.
+
+    python scripts/algod_box_stub.py boxes.json [--port 4011] [--app-id 1] [--round 1000]
+
+boxes.json maps box names to values, both hex encoded:
+
+    {"<media_key hex>": "<cid bytes hex>", "<reg_key hex>": "<32-byte pubkey hex>"}
+
+The file is re-read on every request and the reported round advances by one
+each time it changes, so editing it simulates new registrations. Point the
+backend at it with ALGOD_ADDRESS=http://127.0.0.1:4011 to exercise the chain
+mirror (app/chain_mirror.py) without a real node. Implements only:
+GET /versions, /v2/status, /v2/status/wait-for-block-after/{round},
+/v2/applications/{id}/boxes and /v2/applications/{id}/box?name=b64:...
+"""
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENESIS = base64.b64encode(b"proofchain-local-stub".ljust(32, b"\0")).decode()
+_round_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    boxes_file = None
+    app_id = 1
+    base_round = 1000
+    _seen_mtime = 0.0
+
+    def _send(self, code: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _boxes(self) -> dict:
+        try:
+            with open(self.boxes_file) as f:
+                return {k.lower(): v for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def _round(self) -> int:
+        # Advance one round each time the boxes file changes.
+        try:
+            mtime = os.stat(self.boxes_file).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        cls = type(self)
+        with _round_lock:
+            if mtime != cls._seen_mtime:
+                cls._seen_mtime = mtime
+                cls.base_round += 1
+            return cls.base_round
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["versions"]:
+            return self._send(200, {"genesis_hash_b64": GENESIS, "genesis_id": "local-stub"})
+        if parts[:2] == ["v2", "status"]:
+            if len(parts) > 2:
+                # wait-for-block-after: a short pause stands in for the block interval.
+                time.sleep(1)
+            return self._send(200, {"last-round": self._round()})
+        if len(parts) >= 4 and parts[:2] == ["v2", "applications"] and parts[2] == str(self.app_id):
+            boxes = self._boxes()
+            if parts[3] == "boxes":
+                return self._send(200, {"boxes": [{"name": base64.b64encode(bytes.fromhex(k)).decode()} for k in boxes]})
+            if parts[3] == "box":
+                name = parse_qs(url.query).get("name", [""])[0]
+                if name.startswith("b64:"):
+                    name = name[4:]
+                key = base64.b64decode(name).hex()
+                if key not in boxes:
+                    return self._send(404, {"message": "box not found"})
+                return self._send(200, {
+                    "name": base64.b64encode(bytes.fromhex(key)).decode(),
+                    "value": base64.b64encode(bytes.fromhex(boxes[key])).decode(),
+                    "round": self._round(),
+                })
+        return self._send(404, {"message": f"not implemented: {url.path}"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local algod stand-in for the chain mirror")
+    parser.add_argument("boxes_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4011)
+    parser.add_argument("--app-id", type=int, default=1)
+    parser.add_argument("--round", type=int, default=1000)
+    args = parser.parse_args()
+    Handler.boxes_file = args.boxes_file
+    Handler.app_id = args.app_id
+    Handler.base_round = args.round
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"[ALGOD STUB] app {args.app_id} listening on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark response encoding for a registry listing (run from the backend directory).
+
+    python scripts/bench_serialization.py [--records 10000] [--dims 512] [--repeat 3]
+
+Builds synthetic registry records shaped like data/registered_media.json
+(512-float embeddings included) and times each way /api/registrations can
+encode them: FastAPI's default path (jsonable_encoder + stdlib json, when
+fastapi is installed), stdlib json alone, orjson, and orjson with the
+embedding modes from app/json_response.py. Also reports payload size raw and
+gzipped at the middleware's level.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.json_response import shape_embeddings
+
+
+def make_records(n: int, dims: int) -> list:
+    rng = random.Random(42)
+    records = []
+    for i in range(n):
+        records.append({
+            "file_url": f"https://gateway.pinata.cloud/ipfs/bafy{i:056d}",
+            "file_name": f"image_{i}.png",
+            "file_type": "image/png",
+            "sha256_hash": f"{rng.getrandbits(256):064x}",
+            "perceptual_hash": f"{rng.getrandbits(64):016x}",
+            "ipfs_cid": f"bafy{i:056d}",
+            "ai_model": "sdxl",
+            "status": "verified",
+            "signer_address": "A" * 58,
+            "content_key": f"{rng.getrandbits(256):064x}",
+            "unique_reg_key": f"{rng.getrandbits(256):064x}",
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "embedding": [round(rng.uniform(-0.2, 0.2), 5) for _ in range(dims)],
+            "embedding_source": "original",
+        })
+    return records
+
+
+def stdlib_dumps(content) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, repeat: int) -> tuple[float, bytes]:
+    best, out = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time JSON encoding of a synthetic registry listing")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--dims", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the best is reported")
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.dims)
+    cases = []
+    try:
+        from fastapi.encoders import jsonable_encoder
+        cases.append(("fastapi default (jsonable_encoder + json)", lambda: stdlib_dumps(jsonable_encoder(records))))
+    except ImportError:
+        print("fastapi not installed; skipping the jsonable_encoder case")
+    cases.append(("stdlib json", lambda: stdlib_dumps(records)))
+    try:
+        import orjson
+        cases.append(("orjson", lambda: orjson.dumps(records)))
+        for mode in ("round", "f16", "omit"):
+            cases.append((f"orjson, embedding={mode}", lambda mode=mode: orjson.dumps(shape_embeddings(records, mode))))
+    except ImportError:
+        print("orjson not installed; skipping orjson cases")
+
+    baseline = None
+    print(f"{args.records} records, {args.dims}-d embeddings, best of {args.repeat}")
+    print(f"{'case':44} {'ms':>9} {'speedup':>8} {'MB':>8} {'gzip MB':>8}")
+    for name, fn in cases:
+        seconds, body = timed(fn, args.repeat)
+        baseline = baseline or seconds
+        gz = len(gzip.compress(body, compresslevel=5))
+        print(f"{name:44} {seconds * 1000:9.1f} {baseline / seconds:7.1f}x "
+              f"{len(body) / 1e6:8.2f} {gz / 1e6:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
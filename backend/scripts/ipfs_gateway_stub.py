@@ -0,0 +1,76 @@
+"""Local IPFS gateway stand-in for exercising the gateway pool without the network.
+
+    python scripts/ipfs_gateway_stub.py <dir> [--port 8081] [--delay-ms 0] [--jitter-ms 0] [--fail-rate 0] [--corrupt]
+
+Serves GET /ipfs/<cid> with the bytes of <dir>/<cid> (404 when missing).
+--delay-ms/--jitter-ms add latency, --fail-rate answers that fraction of requests
+with 502, and --corrupt flips the last byte so sha256 verification rejects the
+response. Run several instances and point the backend at them with
+IPFS_GATEWAYS=http://127.0.0.1:8081,http://127.0.0.1:8082
+"""
+import argparse
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    root = "."
+    delay = 0.0
+    jitter = 0.0
+    fail_rate = 0.0
+    corrupt = False
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, code: int, body: bytes) -> None:
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.delay + random.uniform(0, self.jitter))
+        if not self.path.startswith("/ipfs/"):
+            return self._reply(404, b"not found")
+        if random.random() < self.fail_rate:
+            return self._reply(502, b"simulated gateway failure")
+        cid = os.path.basename(self.path[len("/ipfs/"):].split("?")[0])
+        try:
+            with open(os.path.join(self.root, cid), "rb") as f:
+                body = f.read()
+        except OSError:
+            return self._reply(404, b"not found")
+        if self.corrupt and body:
+            body = body[:-1] + bytes([body[-1] ^ 0xFF])
+        self._reply(200, body)
+
+    do_HEAD = do_GET
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local IPFS gateway stand-in")
+    parser.add_argument("root", help="directory with one file per CID")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0)
+    parser.add_argument("--corrupt", action="store_true")
+    args = parser.parse_args()
+    Handler.root = args.root
+    Handler.delay = args.delay_ms / 1000.0
+    Handler.jitter = args.jitter_ms / 1000.0
+    Handler.fail_rate = args.fail_rate
+    Handler.corrupt = args.corrupt
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"[IPFS STUB] serving {args.root} on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Apply pending registry schema migrations (run from the backend directory).
+
+    python scripts/migrate_registry.py [--batch-size 1000] [--dry-run]
+
+Safe to interrupt: progress is checkpointed after each batch and the next run
+resumes from there.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import registry
+from app.registry_migrations import pending_migrations, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate data/registered_media.json to the current schema")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    args = parser.parse_args()
+
+    print(f"Registry schema v{registry.schema_version()}, current v{registry.SCHEMA_VERSION}")
+    if not pending_migrations():
+        print("Nothing to migrate.")
+        return
+    applied = run(batch_size=args.batch_size, dry_run=args.dry_run)
+    for version, stats in applied.items():
+        print(f"v{version}: {stats['updated']}/{stats['records']} records updated")
+    if args.dry_run:
+        print("Dry run: no changes written.")
+
+
+if __name__ == "__main__":
+    main()
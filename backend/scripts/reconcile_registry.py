@@ -0,0 +1,34 @@
+"""Reconcile registry records against the chain (run from the backend directory).
+
+    python scripts/reconcile_registry.py [--page-size 1000] [--concurrency 32] [--rate 200] [--restart]
+
+Marks each record's transactions as confirmed/pending/failed/missing and its
+registration box as present/missing. Safe to interrupt: progress is
+checkpointed after each page and the next run resumes from there unless
+--restart is given.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.reconcile import CONCURRENCY, PAGE_SIZE, RATE_PER_SECOND, Reconciler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile data/registered_media.json with on-chain state")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="max in-flight algod/indexer calls")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SECOND, help="max algod/indexer calls per second")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and sweep from the start")
+    args = parser.parse_args()
+
+    reconciler = Reconciler(page_size=args.page_size, concurrency=args.concurrency, rate=args.rate)
+    status = asyncio.run(reconciler.run(restart=args.restart))
+    print(f"Done: {status.get('total', 0)} records, {status.get('counts', {})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Minimal local SMTP stand-in for exercising the email outbox without a real server.
+
+    python scripts/smtp_sink.py [--port 1025] [--fail-every N]
+
+Point the backend at it with SMTP_SERVER=127.0.0.1 SMTP_PORT=1025 SMTP_USE_TLS=false
+(leave SMTP_PASSWORD unset so no AUTH is attempted). Every received message is
+printed; --fail-every N answers every Nth DATA with a temporary 451 error so the
+retry path can be observed.
+"""
+import argparse
+import socketserver
+
+_received = 0
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    fail_every = 0
+
+    def reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        global _received
+        self.reply("220 smtp-sink ready")
+        mail_from, rcpts = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            cmd = line[:4].upper()
+            if cmd in ("EHLO", "HELO"):
+                self.reply("250 smtp-sink")
+            elif cmd == "MAIL":
+                mail_from, rcpts = line[10:].strip(), []
+                self.reply("250 OK")
+            elif cmd == "RCPT":
+                rcpts.append(line[8:].strip())
+                self.reply("250 OK")
+            elif cmd == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data.decode(errors="replace").rstrip("\r\n"))
+                _received += 1
+                if self.fail_every and _received % self.fail_every == 0:
+                    self.reply("451 Temporary failure (simulated)")
+                    continue
+                subject = next((l[9:] for l in lines if l.lower().startswith("subject: ")), "")
+                print(f"[SMTP-SINK] #{_received} from={mail_from} to={rcpts} subject={subject!r}")
+                self.reply("250 OK queued")
+            elif cmd == "RSET":
+                mail_from, rcpts = None, []
+                self.reply("250 OK")
+            elif cmd == "NOOP":
+                self.reply("250 OK")
+            elif cmd == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+    SMTPHandler.fail_every = args.fail_every
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((args.host, args.port), SMTPHandler) as server:
+        print(f"[SMTP-SINK] listening on {args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the backend as the ``app`` package, like scripts/ and uvicorn do.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.bulkhead import Bulkhead, Shed
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_interactive_waiters_are_served_before_batch():
+    async def scenario():
+        bulkhead = Bulkhead("test_lanes", limit=1, queue=4, max_wait=5.0)
+        await bulkhead.acquire("interactive")
+        order = []
+
+        async def request(name, lane):
+            await bulkhead.acquire(lane)
+            order.append(name)
+
+        tasks = [asyncio.create_task(request("batch", "batch"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("interactive", "interactive")))
+        await asyncio.sleep(0)
+        assert bulkhead.stats()["waiting"] == {"interactive": 1, "batch": 1}
+
+        bulkhead.release()
+        await asyncio.sleep(0.01)
+        assert order == ["interactive"]
+        bulkhead.release()
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "batch"]
+        assert bulkhead.active == 1
+        bulkhead.release()
+        assert bulkhead.active == 0
+
+    run(scenario())
+
+
+def test_batch_lane_only_fills_half_the_queue():
+    async def scenario():
+        bulkhead = Bulkhead("test_room", limit=1, queue=4, max_wait=5.0)
+        await bulkhead.acquire("interactive")
+        waiters = [asyncio.create_task(bulkhead.acquire("batch")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as shed:
+            await bulkhead.acquire("batch")
+        assert shed.value.reason == "queue_full"
+        waiters.append(asyncio.create_task(bulkhead.acquire("interactive")))
+        await asyncio.sleep(0)
+        assert bulkhead.waiting() == 3
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert bulkhead.waiting() == 0
+
+    run(scenario())
+
+
+def test_timed_out_waiter_is_shed_and_frees_nothing():
+    async def scenario():
+        bulkhead = Bulkhead("test_timeout", limit=1, queue=4, max_wait=0.02)
+        await bulkhead.acquire("interactive")
+        with pytest.raises(Shed) as shed:
+            await bulkhead.acquire("interactive")
+        assert shed.value.reason == "timeout"
+        assert shed.value.retry_after > 0
+        assert bulkhead.waiting() == 0
+        bulkhead.release()
+        assert bulkhead.active == 0
+        assert bulkhead.stats()["shed_timeout"] == 1
+
+    run(scenario())
+
+
+def test_slot_handed_to_a_cancelled_waiter_passes_to_the_next():
+    async def scenario():
+        bulkhead = Bulkhead("test_handoff", limit=1, queue=4, max_wait=5.0)
+        await bulkhead.acquire("interactive")
+        first = asyncio.create_task(bulkhead.acquire("interactive"))
+        second = asyncio.create_task(bulkhead.acquire("interactive"))
+        await asyncio.sleep(0)
+
+        # The slot is handed to `first`, which is cancelled before it resumes.
+        bulkhead.release()
+        first.cancel()
+        try:
+            await first
+            # Python 3.11's wait_for returns a result that beat the cancellation.
+            bulkhead.release()
+        except asyncio.CancelledError:
+            pass
+        await asyncio.wait_for(second, 1.0)
+        assert bulkhead.active == 1
+        bulkhead.release()
+        assert bulkhead.active == 0
+
+    run(scenario())
+
+
+def test_no_queue_sheds_immediately():
+    async def scenario():
+        bulkhead = Bulkhead("test_noqueue", limit=1, queue=0, max_wait=5.0)
+        await bulkhead.acquire("interactive")
+        with pytest.raises(Shed):
+            await bulkhead.acquire("interactive")
+
+    run(scenario())
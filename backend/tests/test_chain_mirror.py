@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import sqlite3
+
+import pytest
+
+from app.chain_mirror import ChainMirror
+
+APP_ID = 7
+
+
+def _key(label: str) -> bytes:
+    return hashlib.sha256(label.encode()).digest()
+
+
+class FakeAlgod:
+    """The algod calls the mirror makes, over an in-memory box map."""
+
+    def __init__(self):
+        self.round = 1000
+        self.genesis = "genesis-a"
+        self.boxes: dict[bytes, bytes] = {}
+        self.fetched: list[bytes] = []
+        self.listings = 0
+
+    def status(self):
+        return {"last-round": self.round}
+
+    def versions(self):
+        return {"genesis_hash_b64": self.genesis}
+
+    def application_boxes(self, app_id):
+        self.listings += 1
+        return {"boxes": [{"name": base64.b64encode(name).decode()} for name in self.boxes]}
+
+    def application_box_by_name(self, app_id, name):
+        self.fetched.append(name)
+        return {"name": base64.b64encode(name).decode(), "value": base64.b64encode(self.boxes[name]).decode()}
+
+
+@pytest.fixture
+def algod():
+    return FakeAlgod()
+
+
+@pytest.fixture
+def mirror(tmp_path, algod):
+    return ChainMirror(path=tmp_path / "mirror.sqlite3", client_factory=lambda: algod)
+
+
+def test_boxes_are_looked_up_by_the_callers_key(mirror, algod):
+    # A 32-byte media value (what value-length classification used to file as a reg box).
+    media_key, reg_key = _key("media"), _key("reg")
+    algod.boxes = {media_key: b"c" * 32, reg_key: bytes(range(32))}
+    assert mirror.sync_once(APP_ID) == {"synced": True, "round": 1000, "added": 2, "removed": 0}
+
+    assert mirror.media_cid(media_key.hex()) == "c" * 32
+    assert mirror.media_cid(media_key.hex().upper()) == "c" * 32
+    assert mirror.box_value(reg_key.hex()) == bytes(range(32))
+    assert mirror.media_cid(_key("unknown").hex()) is None
+    assert mirror.stats()["boxes"] == 2
+
+
+def test_reg_sender_requires_the_reg_box_size(mirror, algod):
+    media_key = _key("media")
+    algod.boxes = {media_key: b"bafy" + b"x" * 55}
+    mirror.sync_once(APP_ID)
+    assert mirror.reg_sender(media_key.hex()) is None
+
+
+def test_reg_sender_decodes_the_address(mirror, algod):
+    encoding = pytest.importorskip("algosdk.encoding")
+    reg_key, sender = _key("reg"), bytes(range(32))
+    algod.boxes = {reg_key: sender}
+    mirror.sync_once(APP_ID)
+    assert mirror.reg_sender(reg_key.hex()) == encoding.encode_address(sender)
+
+
+def test_sync_fetches_only_new_boxes_and_drops_removed_ones(mirror, algod):
+    first, second = _key("a"), _key("b")
+    algod.boxes = {first: b"cid-a"}
+    mirror.sync_once(APP_ID)
+
+    algod.round += 1
+    algod.boxes = {second: b"cid-b"}
+    algod.fetched.clear()
+    assert mirror.sync_once(APP_ID) == {"synced": True, "round": 1001, "added": 1, "removed": 1}
+    assert algod.fetched == [second]
+    assert mirror.media_cid(first.hex()) is None
+
+
+def test_idle_node_is_not_listed_but_stays_fresh(mirror, algod):
+    algod.boxes = {_key("a"): b"cid-a"}
+    mirror.sync_once(APP_ID)
+    mirror._db().execute("UPDATE meta SET value = '0' WHERE key = 'synced_at'")
+    assert not mirror.is_fresh()
+
+    assert mirror.sync_once(APP_ID)["added"] == 0
+    assert algod.listings == 1
+    assert mirror.is_fresh()
+
+
+def test_node_behind_checkpoint_wipes_and_rebuilds(mirror, algod):
+    kept, stale = _key("kept"), _key("stale")
+    algod.boxes = {kept: b"cid-kept", stale: b"cid-stale"}
+    mirror.sync_once(APP_ID)
+
+    # A reset network: the node is at an earlier round and the stale box is gone.
+    algod.round = 10
+    algod.boxes = {kept: b"cid-new"}
+    algod.fetched.clear()
+    assert mirror.sync_once(APP_ID) == {"synced": True, "round": 10, "added": 1, "removed": 0}
+    # Rebuilt from scratch, so even the surviving name is fetched again.
+    assert algod.fetched == [kept]
+    assert mirror.media_cid(kept.hex()) == "cid-new"
+    assert mirror.media_cid(stale.hex()) is None
+    assert mirror.synced_round() == 10
+
+
+def test_genesis_change_wipes_the_mirror(mirror, algod):
+    algod.boxes = {_key("a"): b"cid-a"}
+    mirror.sync_once(APP_ID)
+
+    algod.round += 1
+    algod.genesis = "genesis-b"
+    algod.boxes = {}
+    assert mirror.sync_once(APP_ID)["removed"] == 0
+    assert mirror.stats()["boxes"] == 0
+
+
+def test_mirror_with_kind_column_is_rebuilt(tmp_path, algod):
+    path = tmp_path / "mirror.sqlite3"
+    old = sqlite3.connect(str(path))
+    old.executescript("""
+        CREATE TABLE boxes (name_hex TEXT PRIMARY KEY, value BLOB NOT NULL, kind TEXT NOT NULL,
+                            synced_round INTEGER NOT NULL);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        INSERT INTO meta VALUES ('synced_round', '1000');
+    """)
+    old.commit()
+    old.close()
+
+    mirror = ChainMirror(path=path, client_factory=lambda: algod)
+    assert mirror.synced_round() is None
+    algod.boxes = {_key("a"): b"c" * 32}
+    mirror.sync_once(APP_ID)
+    assert mirror.media_cid(_key("a").hex()) == "c" * 32
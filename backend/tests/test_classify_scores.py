@@ -0,0 +1,64 @@
+import math
+
+from app.classify_scores import ScoreCache
+
+
+class Snap:
+    def __init__(self, records, generation):
+        self.records = tuple(records)
+        self.generation = generation
+
+
+def _rec(embedding):
+    return {"embedding": embedding} if embedding is not None else {"file_name": "no-embedding"}
+
+
+def _cache():
+    calls = []
+
+    def dot(a, b):
+        calls.append(tuple(b))
+        return sum(x * y for x, y in zip(a, b))
+
+    return ScoreCache("test_scores", dot, maxsize=8, ttl=60), calls
+
+
+def test_scores_align_with_records_and_are_reused():
+    cache, calls = _cache()
+    snap = Snap([_rec([1, 0]), _rec(None), _rec([0, 1])], generation=1)
+    sims = cache.scores("q", [1, 0], snap)
+    assert sims[0] == 1 and math.isnan(sims[1]) and sims[2] == 0
+    assert cache.scores("q", [1, 0], snap) is sims
+    assert len(calls) == 2
+
+
+def test_append_scores_only_new_records_and_keeps_alignment():
+    cache, calls = _cache()
+    base = [_rec([1, 0]), _rec([0, 1])]
+    old = cache.scores("q", [1, 0], Snap(base, generation=1))
+    calls.clear()
+
+    grown = Snap(base + [_rec([2, 0]), _rec([0, 3])], generation=1)
+    sims = cache.scores("q", [1, 0], grown)
+    assert list(sims) == [1, 0, 2, 0]
+    assert calls == [(2, 0), (0, 3)]
+    # Readers of the earlier array are unaffected by the patch.
+    assert list(old) == [1, 0]
+
+
+def test_new_generation_rescans_everything():
+    cache, calls = _cache()
+    cache.scores("q", [1, 0], Snap([_rec([1, 0]), _rec([0, 1])], generation=1))
+    calls.clear()
+
+    # Same length but rewritten: cached scores must not be reused.
+    rewritten = Snap([_rec([0, 1]), _rec([5, 0]), _rec([1, 1])], generation=2)
+    assert list(cache.scores("q", [1, 0], rewritten)) == [0, 5, 1]
+    assert len(calls) == 3
+
+
+def test_queries_are_cached_separately():
+    cache, _ = _cache()
+    snap = Snap([_rec([1, 2])], generation=1)
+    assert list(cache.scores("a", [1, 0], snap)) == [1]
+    assert list(cache.scores("b", [0, 1], snap)) == [2]
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from app import coalesce
+from app.coalesce import SingleFlight, TTLCache
+from app.metrics import cache_events
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers():
+    flight = SingleFlight("test_flight")
+    entered = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return object()
+
+    results = []
+
+    def call():
+        results.append(flight.do("k", fn))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    entered.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(4)]
+    for t in threads[1:]:
+        t.start()
+    while cache_events._values.get(("test_flight", "coalesced"), 0) < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 5 and len(set(map(id, results))) == 1
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_shares_exceptions_and_keys_are_independent():
+    flight = SingleFlight("test_flight_errors")
+    entered = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        entered.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("bad", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    entered.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    assert flight.do("other", lambda: 42) == 42
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+
+
+def test_ttl_cache_hits_only_for_matching_tag():
+    cache = TTLCache("test_tags", maxsize=4, ttl=60)
+    cache.put("k", "v", tag=1)
+    assert cache.get("k", 1) == "v"
+    assert cache.get("k", 2) is None
+    # A mismatched lookup drops the stale entry.
+    assert cache.get("k", 1) is None
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(coalesce.time, "monotonic", lambda: now[0])
+    cache = TTLCache("test_expiry", maxsize=4, ttl=10)
+    cache.put("k", "v", None)
+    now[0] += 9
+    assert cache.get("k", None) == "v"
+    now[0] += 2
+    assert cache.get("k", None) is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test_lru", maxsize=2, ttl=60)
+    cache.put("a", 1, None)
+    cache.put("b", 2, None)
+    cache.get("a", None)
+    cache.put("c", 3, None)
+    assert cache.get("b", None) is None
+    assert cache.get("a", None) == 1
+    assert cache.get("c", None) == 3
+
+
+def test_ttl_cache_with_zero_ttl_stores_nothing():
+    cache = TTLCache("test_off", maxsize=2, ttl=0)
+    cache.put("a", 1, None)
+    assert cache.get("a", None) is None
+
+
+def test_ttl_cache_byte_budget_evicts_oldest_and_skips_oversized_values():
+    cache = TTLCache("test_bytes", maxsize=10, ttl=60, max_bytes=10)
+    cache.put("a", b"12345", None)
+    cache.put("b", b"1234", None)
+    cache.put("a", b"123456", None)
+    assert cache.nbytes == 10
+    cache.put("c", b"12", None)
+    assert cache.get("b", None) is None
+    assert cache.get("a", None) == b"123456"
+    assert cache.nbytes == 8
+
+    cache.put("big", b"x" * 11, None)
+    assert cache.get("big", None) is None
+    assert cache.nbytes == 8
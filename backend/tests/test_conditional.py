@@ -0,0 +1,53 @@
+import types
+
+import pytest
+
+from app import conditional, registry
+from app.conditional import _etag_matches
+
+
+def test_etag_matches_uses_weak_comparison():
+    etag = 'W/"5f.abc-123"'
+    assert _etag_matches('W/"5f.abc-123"', etag)
+    assert _etag_matches('"5f.abc-123"', etag)
+    assert _etag_matches('"other", W/"5f.abc-123"', etag)
+    assert _etag_matches('W/"5f.abc-123"', '"5f.abc-123"')
+    assert _etag_matches("*", etag)
+    assert not _etag_matches('"5f.abc-124"', etag)
+    assert not _etag_matches("", etag)
+    assert not _etag_matches(None, etag)
+
+
+def test_cached_json_builds_once_and_answers_304(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    monkeypatch.setattr(registry, "DATA_PATH", tmp_path)
+    monkeypatch.setattr(registry, "MEDIA_FILE", tmp_path / "registered_media.json")
+    monkeypatch.setattr(registry, "LOCK_FILE", tmp_path / "registered_media.lock")
+    registry.invalidate()
+    registry.append_media([{"sha256_hash": "00"}])
+    conditional._cache.clear()
+    builds = []
+
+    def build(snap):
+        builds.append(1)
+        return {"count": len(snap.records)}
+
+    def request(if_none_match=None):
+        headers = {"if-none-match": if_none_match} if if_none_match else {}
+        return types.SimpleNamespace(headers=headers)
+
+    try:
+        first = conditional.cached_json(request(), "test", (), build)
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+        assert first.headers["vary"] == "Accept-Encoding"
+        assert conditional.cached_json(request(etag), "test", (), build).status_code == 304
+        assert len(builds) == 1
+
+        registry.append_media([{"sha256_hash": "01"}])
+        changed = conditional.cached_json(request(etag), "test", (), build)
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert len(builds) == 2
+    finally:
+        registry.invalidate()
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+
+import pytest
+
+from app import ipfs_gateways
+from app.ipfs_gateways import FetchError, GatewayPool, _Abandoned, hedges
+
+CONTENT = b"registered media bytes"
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+class StubGateways:
+    """Stands in for GatewayPool._request: per gateway host, a delay and a body or error."""
+
+    def __init__(self, behaviour: dict):
+        self.behaviour = behaviour
+        self.calls = []
+        self.abandoned = []
+        self._lock = threading.Lock()
+
+    def __call__(self, gw, url, timeout, abandoned, max_bytes):
+        host = gw.base.split("//")[1]
+        delay, result = self.behaviour[host]
+        with self._lock:
+            self.calls.append(host)
+        if abandoned.wait(delay):
+            with self._lock:
+                self.abandoned.append(host)
+            raise _Abandoned(f"{gw.base}: abandoned")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(ipfs_gateways, "HEDGE_DEFAULT_SECONDS", 0.05)
+    monkeypatch.setattr(ipfs_gateways, "HEDGE_MIN_SECONDS", 0.05)
+
+
+def _pool(behaviour: dict, workers: int = 8) -> tuple:
+    pool = GatewayPool([f"http://{host}" for host in behaviour], workers=workers)
+    stub = StubGateways(behaviour)
+    pool._request = stub
+    return pool, stub
+
+
+def _hedges(result: str) -> float:
+    return hedges._values.get((result,), 0)
+
+
+def test_slow_gateway_is_hedged_and_abandoned():
+    pool, stub = _pool({"slow": (2.0, CONTENT), "fast": (0.0, CONTENT)})
+    launched = _hedges("launched")
+
+    assert pool.fetch("cid", DIGEST, timeout=5) == (CONTENT, "http://fast/ipfs/cid")
+    assert _hedges("launched") == launched + 1
+    pool._executor.shutdown(wait=True)
+    assert stub.abandoned == ["slow"]
+    assert pool.load() == {"workers": 8, "in_flight": 0, "queued": 0}
+
+
+def test_hedges_are_capped_per_fetch(monkeypatch):
+    monkeypatch.setattr(ipfs_gateways, "MAX_HEDGES", 1)
+    pool, stub = _pool({"a": (0.3, CONTENT), "b": (0.3, CONTENT), "c": (0.0, CONTENT)})
+    capped = _hedges("capped")
+
+    content, url = pool.fetch("cid", DIGEST, timeout=5)
+    assert content == CONTENT and url in ("http://a/ipfs/cid", "http://b/ipfs/cid")
+    assert sorted(stub.calls) == ["a", "b"]
+    assert _hedges("capped") > capped
+
+
+def test_no_hedge_while_every_worker_is_busy():
+    pool, stub = _pool({"a": (0.2, CONTENT), "b": (0.0, CONTENT)}, workers=1)
+    saturated = _hedges("saturated")
+
+    assert pool.fetch("cid", DIGEST, timeout=5) == (CONTENT, "http://a/ipfs/cid")
+    assert stub.calls == ["a"]
+    assert _hedges("saturated") > saturated
+
+
+def test_failed_gateway_is_replaced_even_when_saturated():
+    pool, stub = _pool({"a": (0.0, FetchError("http://a: HTTP 504")), "b": (0.0, CONTENT)}, workers=1)
+    assert pool.fetch("cid", DIGEST, timeout=5) == (CONTENT, "http://b/ipfs/cid")
+    assert stub.calls == ["a", "b"]
+    assert {s["base"]: s["errors"] for s in pool.stats()} == {"http://a": 1, "http://b": 0}
+
+
+def test_sha256_mismatch_is_rejected_and_the_next_gateway_tried():
+    pool, _ = _pool({"bad": (0.0, b"tampered"), "good": (0.0, CONTENT)})
+    assert pool.fetch("cid", "0x" + DIGEST.upper(), timeout=5) == (CONTENT, "http://good/ipfs/cid")
+    assert {s["base"]: s["errors"] for s in pool.stats()} == {"http://bad": 1, "http://good": 0}
+    # The mismatching gateway now ranks last.
+    assert [gw.base for gw in pool.ranked()] == ["http://good", "http://bad"]
+
+
+def test_unverified_content_only_when_allowed():
+    behaviour = {"a": (0.0, b"tampered"), "b": (0.0, b"also tampered")}
+    pool, _ = _pool(behaviour)
+    with pytest.raises(FetchError, match="does not match"):
+        pool.fetch("cid", DIGEST, timeout=5)
+
+    pool, _ = _pool(behaviour)
+    assert pool.fetch("cid", DIGEST, timeout=5, allow_unverified=True) == (b"tampered", "http://a/ipfs/cid")
+
+
+def test_without_expected_digest_any_body_is_accepted():
+    pool, _ = _pool({"a": (0.0, b"anything")})
+    assert pool.fetch("cid", None, timeout=5) == (b"anything", "http://a/ipfs/cid")
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from app.kyc_store import KYCStore
+
+
+class ReversingFernet:
+    """Stand-in for cryptography's Fernet: tokens are the reversed plaintext."""
+
+    def encrypt(self, data: bytes) -> bytes:
+        return data[::-1]
+
+    def decrypt(self, token: bytes) -> bytes:
+        return token[::-1]
+
+
+def _store(path) -> KYCStore:
+    store = KYCStore(path)
+    store._fernet = ReversingFernet()
+    return store
+
+
+def test_writes_from_two_stores_keep_each_other(tmp_path):
+    path = tmp_path / "kyc.json"
+    first, second = _store(path), _store(path)
+    first.all()
+    second.all()
+    assert first.add({"id": "a", "wallet_address": "WA"})
+    assert second.add({"id": "b", "wallet_address": "WB"})
+    assert first.update("a", status="verified")["status"] == "verified"
+
+    assert {rec["id"]: rec.get("status") for rec in _store(path).all()} == {"a": "verified", "b": None}
+    assert second.by_wallet("wa")["status"] == "verified"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_concurrent_workers_do_not_drop_records(tmp_path):
+    path = tmp_path / "kyc.json"
+    pids = []
+    for worker in range(4):
+        pid = os.fork()
+        if pid == 0:
+            store = _store(path)
+            for i in range(20):
+                store.add({"id": f"{worker}-{i}", "wallet_address": f"W{worker}-{i}"})
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    assert len(_store(path).all()) == 80
@@ -0,0 +1,40 @@
+import logging
+
+from app import log_setup
+from app.log_setup import ContextFilter, _parse_rates, correlation_id
+
+
+def _record(name: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, "message", None, None)
+
+
+def test_filter_stamps_correlation_id():
+    token = correlation_id.set("req-1")
+    try:
+        record = _record("app.routes.media")
+        assert ContextFilter({}).filter(record)
+        assert record.correlation_id == "req-1"
+    finally:
+        correlation_id.reset(token)
+
+
+def test_rate_applies_to_logger_and_children_below_warning():
+    f = ContextFilter({"proofchain.access": 0.0, "app": 1.0})
+    assert not f.filter(_record("proofchain.access"))
+    assert not f.filter(_record("proofchain.access.slow", logging.DEBUG))
+    assert f.filter(_record("proofchain.access", logging.WARNING))
+    assert f.filter(_record("proofchain.accessor"))
+    assert f.filter(_record("app.routes.media"))
+
+
+def test_partial_rate_keeps_records_below_the_draw(monkeypatch):
+    f = ContextFilter({"app": 0.25})
+    monkeypatch.setattr(log_setup.random, "random", lambda: 0.2)
+    assert f.filter(_record("app.registry"))
+    monkeypatch.setattr(log_setup.random, "random", lambda: 0.3)
+    assert not f.filter(_record("app.registry"))
+
+
+def test_parse_rates_clamps_and_skips_bad_entries():
+    assert _parse_rates("a=0.5, b=2,c=x,=1,d") == {"a": 0.5, "b": 1.0}
+    assert _parse_rates(None) == {}
@@ -0,0 +1,65 @@
+import tracemalloc
+
+import pytest
+
+from app.memory_monitor import MemoryMonitor, request_peak, request_peak_skipped
+
+
+@pytest.fixture
+def tracing():
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    yield
+    if started:
+        tracemalloc.stop()
+
+
+def _measured(route: str) -> int:
+    state = request_peak._values.get((route,))
+    return 0 if state is None else sum(state[:-1])
+
+
+def _skipped() -> float:
+    return request_peak_skipped._values.get((), 0)
+
+
+def test_lone_request_records_its_peak(tracing):
+    monitor = MemoryMonitor()
+    start = monitor.request_started()
+    buf = bytearray(4 * 1024 * 1024)
+    del buf
+    monitor.request_finished(start, "/test/alone")
+
+    assert _measured("/test/alone") == 1
+    assert request_peak._values[("/test/alone",)][-1] >= 4 * 1024 * 1024
+
+
+def test_overlapping_requests_are_skipped_until_idle(tracing):
+    monitor = MemoryMonitor()
+    skipped = _skipped()
+
+    first = monitor.request_started()
+    second = monitor.request_started()
+    monitor.request_finished(first, "/test/first")
+    # Still overlapped: the peak since reset includes the first request.
+    third = monitor.request_started()
+    monitor.request_finished(second, "/test/second")
+    monitor.request_finished(third, "/test/third")
+
+    assert _measured("/test/first") == _measured("/test/second") == _measured("/test/third") == 0
+    assert _skipped() == skipped + 3
+
+    # Idle again: the next request runs alone and is measured.
+    start = monitor.request_started()
+    monitor.request_finished(start, "/test/after")
+    assert _measured("/test/after") == 1
+
+
+def test_nothing_measured_without_tracing():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc already tracing")
+    monitor = MemoryMonitor()
+    assert monitor.request_started() is None
+    with pytest.raises(RuntimeError):
+        monitor.snapshot()
@@ -0,0 +1,99 @@
+import hashlib
+
+import pytest
+
+from app import payout_batcher as batcher_module
+from app.payout_batcher import PayoutBatcher, PayoutJob
+
+
+class Rejected(Exception):
+    """Stands in for algosdk's AlgodHTTPError."""
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Batches passed to _send; a job whose note is b"bad" makes algod reject its batch."""
+    batches = []
+
+    def send(self, jobs):
+        batches.append([job.note for job in jobs])
+        if any(job.note == b"bad" for job in jobs):
+            raise Rejected("transaction rejected")
+        for job in jobs:
+            job._finish("submitted", txid=f"TX-{job.id}")
+
+    monkeypatch.setattr(PayoutBatcher, "_send", send)
+    monkeypatch.setattr(batcher_module, "_rejected_by_node", lambda e: isinstance(e, Rejected))
+    # Long enough for payments submitted back to back to join one group.
+    monkeypatch.setattr(batcher_module, "FLUSH_SECONDS", 0.2)
+    return batches
+
+
+def _submit_all(batcher, notes, **kwargs):
+    jobs = [batcher.submit("RECEIVER", 1000, note, **kwargs) for note in notes]
+    for job in jobs:
+        assert job.wait(2)
+    return jobs
+
+
+def test_payments_submitted_together_share_one_group(sent, monkeypatch):
+    monkeypatch.setattr(batcher_module, "MAX_GROUP_SIZE", 4)
+    batcher = PayoutBatcher()
+    jobs = _submit_all(batcher, [bytes([i]) for i in range(6)])
+    batcher.stop()
+
+    assert [len(batch) for batch in sent] == [4, 2]
+    assert all(job.status == "submitted" for job in jobs)
+    assert batcher.stats()["groups"] == 2
+
+
+def test_rejected_group_is_retried_one_payment_at_a_time(sent):
+    batcher = PayoutBatcher()
+    jobs = _submit_all(batcher, [b"a", b"bad", b"c"])
+    batcher.stop()
+
+    assert sent == [[b"a", b"bad", b"c"], [b"a"], [b"bad"], [b"c"]]
+    assert [job.status for job in jobs] == ["submitted", "failed", "submitted"]
+    assert batcher.stats()["fallbacks"] == 1
+
+
+def test_transport_error_fails_the_group_without_resending(sent, monkeypatch):
+    monkeypatch.setattr(batcher_module, "_rejected_by_node", lambda e: False)
+    batcher = PayoutBatcher()
+    jobs = _submit_all(batcher, [b"a", b"bad"])
+    batcher.stop()
+
+    assert sent == [[b"a", b"bad"]]
+    assert [job.status for job in jobs] == ["failed", "failed"]
+
+
+def test_lease_comes_from_the_idempotency_key():
+    keyed = PayoutJob("RECEIVER", 1000, None, "order-1")
+    assert keyed.lease == hashlib.sha256(b"proofchain-payout:order-1").digest()
+    assert PayoutJob("OTHER", 5, b"x", "order-1").lease == keyed.lease
+    # Without a key each job gets its own lease, so identical payments keep distinct txids.
+    assert PayoutJob("RECEIVER", 1000, None, None).lease != PayoutJob("RECEIVER", 1000, None, None).lease
+
+
+def test_resubmit_with_the_same_key_returns_the_existing_job(sent):
+    batcher = PayoutBatcher()
+    first, = _submit_all(batcher, [b"a"], idempotency_key="order-1")
+    again = batcher.submit("RECEIVER", 1000, b"a", idempotency_key="order-1")
+    batcher.stop()
+    assert again is first
+    assert sent == [[b"a"]]
+
+
+def test_failed_job_can_be_retried_and_eviction_keeps_the_retry(sent, monkeypatch):
+    monkeypatch.setattr(batcher_module, "MAX_JOBS", 2)
+    batcher = PayoutBatcher()
+    failed, = _submit_all(batcher, [b"bad"], idempotency_key="order-1")
+    assert failed.status == "failed"
+    retry, = _submit_all(batcher, [b"a"], idempotency_key="order-1")
+    assert retry is not failed and retry.status == "submitted"
+
+    # Pushes the failed job out of the bounded job table.
+    _submit_all(batcher, [b"b"])
+    assert batcher.job(failed.id) is None
+    assert batcher.submit("RECEIVER", 1000, b"a", idempotency_key="order-1") is retry
+    batcher.stop()
@@ -0,0 +1,109 @@
+import asyncio
+import fcntl
+import multiprocessing
+
+import pytest
+
+from app import rate_limit
+from app.rate_limit import MmapBucketStore, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    return now
+
+
+def test_take_spends_burst_then_refills(tmp_path, clock):
+    store = MmapBucketStore(tmp_path / "rl.bin", slots=64)
+    assert store.take("a", 3, 5, 1.0) == (True, 2.0)
+    assert store.take("a", 3, 5, 1.0) == (False, 2.0)
+    assert store.take("b", 3, 5, 1.0) == (True, 2.0)
+    clock[0] += 1.5
+    assert store.take("a", 3, 5, 1.0) == (True, 0.5)
+    clock[0] += 100
+    assert store.take("a", 0, 5, 1.0) == (True, 5.0)
+
+
+def test_buckets_are_shared_through_the_file(tmp_path, clock):
+    first = MmapBucketStore(tmp_path / "rl.bin", slots=64)
+    second = MmapBucketStore(tmp_path / "rl.bin", slots=64)
+    assert first.take("a", 5, 5, 1.0)[0]
+    assert second.take("a", 1, 5, 1.0) == (False, 0.0)
+
+
+def test_full_probe_window_reuses_least_recently_used_slot(tmp_path, clock):
+    # Fewer slots than the probe window: every key lands in the same 4 slots.
+    store = MmapBucketStore(tmp_path / "rl.bin", slots=4)
+    rate = 1e-9
+    for i in range(4):
+        clock[0] += 1
+        assert store.take(f"k{i}", 2, 5, rate)[0]
+    clock[0] += 1
+    assert store.take("k4", 2, 5, rate) == (True, 3.0)
+    # k1 kept its spent bucket; k0 was the oldest and lost its slot.
+    assert store.take("k1", 0, 5, rate)[1] == pytest.approx(3.0)
+    assert store.take("k0", 0, 5, rate)[1] == 5.0
+
+
+def test_nonblocking_take_returns_none_while_another_holder_has_the_lock(tmp_path):
+    store = MmapBucketStore(tmp_path / "rl.bin", slots=64)
+    store.take("a", 1, 5, 1.0)
+    with open(store.path, "r+b") as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        assert store.take("a", 1, 5, 1.0, blocking=False) is None
+        fcntl.flock(other, fcntl.LOCK_UN)
+    assert store.take("a", 1, 5, 1.0, blocking=False)[0]
+
+
+def _spend(path, attempts, results):
+    store = MmapBucketStore(path, slots=64)
+    results.put(sum(store.take("shared", 1, 100, 1e-9)[0] for _ in range(attempts)))
+
+
+def test_limit_holds_across_processes(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_spend, args=(tmp_path / "rl.bin", 60, results)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    allowed = sum(results.get(timeout=30) for _ in procs)
+    for p in procs:
+        p.join(timeout=30)
+    assert allowed == 100
+
+
+def test_acheck_defers_to_a_thread_when_the_lock_is_contended(tmp_path):
+    limiter = RateLimiter(capacity=5, per_minute=60, store=MmapBucketStore(tmp_path / "rl.bin", slots=64))
+    limiter.check("a", "/x")
+    other = open(limiter.store.path, "r+b")
+    fcntl.flock(other, fcntl.LOCK_EX)
+
+    async def run():
+        asyncio.get_running_loop().call_later(0.05, other.close)
+        return await limiter.acheck("a", "/x")
+
+    assert asyncio.run(run()) == (True, 0.0)
+    assert limiter.stats()["deferred"] == 1
+
+
+def test_store_errors_fail_open():
+    class Broken:
+        name, remote = "broken", False
+
+        def take(self, *args, **kwargs):
+            raise ConnectionError("down")
+
+    limiter = RateLimiter(store=Broken())
+    assert limiter.check("a", "/media/classify") == (True, 0.0)
+    assert limiter.stats()["store_errors"] == 1
+
+
+def test_unusable_backend_falls_back():
+    try:
+        import redis  # noqa: F401
+        pytest.skip("redis installed")
+    except ImportError:
+        pass
+    assert isinstance(rate_limit._make_store("redis"), MmapBucketStore)
@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+
+from app import registry
+
+
+@pytest.fixture
+def events(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "DATA_PATH", tmp_path)
+    monkeypatch.setattr(registry, "MEDIA_FILE", tmp_path / "registered_media.json")
+    monkeypatch.setattr(registry, "LOCK_FILE", tmp_path / "registered_media.lock")
+    registry.invalidate()
+    seen = []
+
+    def listener(event, records, snap):
+        seen.append((event, len(records), snap.generation))
+
+    registry.subscribe(listener)
+    registry.append_media([{"sha256_hash": "00"}])
+    seen.clear()
+    yield seen
+    registry._listeners.remove(listener)
+    registry.invalidate()
+
+
+def test_append_media_keeps_generation(events):
+    generation = registry.snapshot().generation
+    registry.append_media([{"sha256_hash": "01"}, {"sha256_hash": "02"}])
+    assert events == [("append", 2, generation)]
+    assert len(registry.snapshot().records) == 3
+
+
+def test_save_media_append_that_does_not_extend_current_records_is_a_reset(events):
+    generation = registry.snapshot().generation
+    first, second = registry.load_media(), registry.load_media()
+    first.append({"sha256_hash": "aa"})
+    registry.save_media(first, appended=[first[-1]])
+    second.append({"sha256_hash": "bb"})
+    registry.save_media(second, appended=[second[-1]])
+
+    assert events[0] == ("append", 1, generation)
+    assert events[1][0] == "reset"
+    assert registry.snapshot().generation > generation
+
+
+def test_save_media_append_with_modified_prefix_is_a_reset(events):
+    media = registry.load_media()
+    media[0]["status"] = "changed"
+    media.append({"sha256_hash": "aa"})
+    registry.save_media(media, appended=[media[-1]])
+    assert events[0][0] == "reset"
+
+
+def test_update_media_saves_only_when_patched(events):
+    assert registry.update_media(lambda media: False) is False
+    assert events == []
+
+    def patch(media):
+        media[0]["status"] = "confirmed"
+        return True
+
+    assert registry.update_media(patch) is True
+    assert events[0][0] == "reset"
+    assert json.loads(registry.MEDIA_FILE.read_text())[0]["status"] == "confirmed"
+    # The shared snapshot is never modified in place.
+    assert registry.snapshot().records[0]["status"] == "confirmed"
+
+
+def test_update_media_in_place_keeps_generation(events):
+    generation = registry.snapshot().generation
+
+    def patch(media):
+        media[0]["status"] = "confirmed"
+        return True
+
+    assert registry.update_media(patch, in_place=True) is True
+    assert events == [("update", 1, generation)]
+    assert registry.snapshot().records[0]["status"] == "confirmed"
+
+
+def test_update_media_in_place_that_adds_records_is_a_reset(events):
+    generation = registry.snapshot().generation
+
+    def patch(media):
+        media.append({"sha256_hash": "aa"})
+        return True
+
+    registry.update_media(patch, in_place=True)
+    assert events == [("reset", 2, generation + 1)]
+
+
+def test_concurrent_writers_do_not_lose_updates(events):
+    def append(i):
+        for j in range(10):
+            registry.append_media([{"sha256_hash": f"{i:02x}{j:02x}"}])
+
+    def bump(media):
+        media[0]["n"] = media[0].get("n", 0) + 1
+        return True
+
+    threads = [threading.Thread(target=append, args=(i,)) for i in range(4)]
+    threads += [threading.Thread(target=lambda: [registry.update_media(bump) for _ in range(10)]) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    registry.invalidate()
+    media = registry.load_media()
+    assert len(media) == 41
+    assert media[0]["n"] == 20
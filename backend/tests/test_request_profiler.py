@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from app import request_profiler
+
+
+def _endpoint():
+    time.sleep(0.05)
+
+
+async def _app(scope, receive, send):
+    scope["endpoint"] = _endpoint
+    await asyncio.to_thread(_endpoint)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(headers=(), query_string=b""):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/media/classify",
+             "headers": list(headers), "query_string": query_string}
+    asyncio.run(request_profiler.RequestProfilerMiddleware(_app)(scope, None, send))
+    return dict(sent[0]["headers"])
+
+
+def _configure(monkeypatch, tmp_path):
+    monkeypatch.setattr(request_profiler, "PROFILE_DIR", tmp_path)
+    monkeypatch.setattr(request_profiler, "INTERVAL_SECONDS", 0.002)
+    monkeypatch.setattr(request_profiler, "SAMPLE_RATE", 0.0)
+    monkeypatch.setenv("PROFILER_TOKEN", "secret")
+
+
+def test_token_header_profiles_request(monkeypatch, tmp_path):
+    _configure(monkeypatch, tmp_path)
+    headers = _call(headers=[(b"x-profile", b"secret")])
+
+    profile_id = headers[b"x-profile-id"].decode()
+    doc = request_profiler.load_profile(profile_id)
+    assert doc["meta"]["status"] == 200
+    assert doc["meta"]["endpoint"] == "_endpoint"
+    assert doc["meta"]["samples"] > 0
+    frames = [f["name"] for f in doc["speedscope"]["shared"]["frames"]]
+    assert any(name.startswith("_endpoint ") for name in frames)
+    profile = doc["speedscope"]["profiles"][0]
+    assert len(profile["samples"]) == len(profile["weights"])
+    assert "_endpoint" in doc["collapsed"]
+    assert [p["id"] for p in request_profiler.list_profiles()] == [profile_id]
+
+
+def test_query_parameter_token_profiles_request(monkeypatch, tmp_path):
+    _configure(monkeypatch, tmp_path)
+    headers = _call(query_string=b"ipfs_cid=x&__profile=secret")
+    assert b"x-profile-id" in headers
+
+
+def test_wrong_or_missing_token_is_not_profiled(monkeypatch, tmp_path):
+    _configure(monkeypatch, tmp_path)
+    assert b"x-profile-id" not in _call(headers=[(b"x-profile", b"guess")])
+    assert b"x-profile-id" not in _call()
+    assert request_profiler.list_profiles() == []
+
+
+def test_load_profile_rejects_path_like_ids(monkeypatch, tmp_path):
+    _configure(monkeypatch, tmp_path)
+    assert request_profiler.load_profile("../registered_media") is None
@@ -0,0 +1,119 @@
+import math
+import random
+
+import pytest
+
+from app import registry
+from app.summary_counters import CumulativeHistogram, SummaryCounters, _BIN_WIDTH, _LOW
+
+# Bin edges and their float neighbours, values outside [-1, 1], infinities.
+EDGES = [_LOW + k * _BIN_WIDTH for k in (0, 1, 500, 999, 1000, 1300, 1999, 2000)]
+SPECIAL = [v for edge in EDGES for v in (edge, math.nextafter(edge, -math.inf), math.nextafter(edge, math.inf))]
+SPECIAL += [-5.0, -1.5, 1.5, 5.0, 0.0, -0.0, math.inf, -math.inf]
+
+
+def brute_force_summary(media, threshold):
+    summary = {"query": 0, "anchor": 0, "near_match": 0, "duplicate": 0, "declared": 0}
+    for item in media:
+        similarity = item.get("near_duplicate_similarity", 0)
+        if isinstance(similarity, bool):
+            similarity = int(similarity)
+        if not isinstance(similarity, (int, float)):
+            continue
+        if similarity >= threshold:
+            summary["near_match"] += 1
+        else:
+            item_type = item.get("type")
+            summary[item_type if item_type in ("duplicate", "declared", "anchor") else "query"] += 1
+    return summary
+
+
+def _media(rng, n):
+    values = SPECIAL + [rng.uniform(-1.2, 1.2) for _ in range(n)] + [math.nan, math.nan, True, False, 1, "0.9", None]
+    types = ["duplicate", "declared", "anchor", "query", None, "other"]
+    media = [{"type": rng.choice(types), "near_duplicate_similarity": v} for v in values]
+    media.append({"type": "anchor"})  # no similarity: counts as 0
+    return media
+
+
+def test_histogram_matches_sorted_count():
+    rng = random.Random(7)
+    values = SPECIAL + [rng.uniform(-1.2, 1.2) for _ in range(500)]
+    bulk, incremental = CumulativeHistogram(), CumulativeHistogram()
+    bulk.extend(values)
+    for value in values:
+        incremental.add(value)
+    for threshold in SPECIAL + [rng.uniform(-1.2, 1.2) for _ in range(200)]:
+        expected = sum(v >= threshold for v in values)
+        assert bulk.count_at_least(threshold) == expected, threshold
+        assert incremental.count_at_least(threshold) == expected, threshold
+    assert bulk.count_at_least(math.nan) == 0
+
+
+class _Snapshot:
+    def __init__(self, records, version):
+        self.records = tuple(records)
+        self.version = version
+
+
+def test_summary_matches_brute_force_across_bin_edges():
+    rng = random.Random(11)
+    media = _media(rng, 300)
+    counters = SummaryCounters()
+    counters._reset(media, 1)
+    for threshold in SPECIAL + [rng.uniform(-1.2, 1.2) for _ in range(100)] + [math.nan]:
+        assert counters.summary(threshold) == brute_force_summary(media, threshold), threshold
+
+
+@pytest.fixture
+def counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "DATA_PATH", tmp_path)
+    monkeypatch.setattr(registry, "MEDIA_FILE", tmp_path / "registered_media.json")
+    monkeypatch.setattr(registry, "LOCK_FILE", tmp_path / "registered_media.lock")
+    registry.invalidate()
+    counters = SummaryCounters()
+    registry.subscribe(counters.on_registry_change)
+    yield counters
+    registry._listeners.remove(counters.on_registry_change)
+    registry.invalidate()
+
+
+def test_append_then_reset(counters):
+    rng = random.Random(3)
+    registry.append_media(_media(rng, 50))
+    counters.refresh()
+
+    registry.append_media(_media(rng, 50))
+    media = list(registry.snapshot().records)
+    assert counters.summary(0.5) == brute_force_summary(media, 0.5)
+
+    def rewrite(records):
+        for item in records[:40]:
+            item["near_duplicate_similarity"] = 0.99
+        del records[-10:]
+        return True
+
+    registry.update_media(rewrite)
+    media = list(registry.snapshot().records)
+    for threshold in (0.5, 0.99, math.nextafter(0.99, math.inf)):
+        assert counters.summary(threshold) == brute_force_summary(media, threshold)
+
+
+def test_in_place_update_that_moves_a_similarity_rebuilds(counters):
+    registry.append_media([{"type": "anchor", "near_duplicate_similarity": 0.1, "algo_tx_status": "pending"}])
+    counters.refresh()
+
+    def confirm(records):
+        records[0]["algo_tx_status"] = "confirmed"
+        return True
+
+    registry.update_media(confirm, in_place=True)
+    assert counters.summary(0.5)["anchor"] == 1
+
+    def move(records):
+        records[0]["near_duplicate_similarity"] = 0.9
+        return True
+
+    registry.update_media(move, in_place=True)
+    assert counters.summary(0.5)["near_match"] == 1
+    assert counters.summary(0.5)["anchor"] == 0
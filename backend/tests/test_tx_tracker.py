@@ -0,0 +1,122 @@
+import pytest
+
+from app import registry, tx_tracker as tracker_module
+from app.tx_tracker import POOL_CHECK_ROUNDS, TxTracker
+
+
+class FakeClient:
+    def __init__(self):
+        self.blocks = {}
+        self.pool = {}
+        self.lookups = []
+
+    def algod_request(self, method, path):
+        return {"blockTxids": sorted(self.blocks.get(int(path.split("/")[2]), ()))}
+
+    def pending_transaction_info(self, txid):
+        self.lookups.append(txid)
+        if txid not in self.pool:
+            raise Exception("txn not found")
+        return self.pool[txid]
+
+
+class FakeAlgod:
+    def __init__(self):
+        self.client = FakeClient()
+
+
+@pytest.fixture
+def algod(monkeypatch):
+    fake = FakeAlgod()
+    monkeypatch.setattr(tracker_module, "_algod", lambda: fake)
+    return fake.client
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "DATA_PATH", tmp_path)
+    monkeypatch.setattr(registry, "MEDIA_FILE", tmp_path / "registered_media.json")
+    monkeypatch.setattr(registry, "LOCK_FILE", tmp_path / "registered_media.lock")
+    registry.invalidate()
+    seen = []
+
+    def listener(event, records, snap):
+        seen.append((event, records, snap.generation))
+
+    registry.subscribe(listener)
+    registry.append_media([
+        {"sha256_hash": "00", "algo_tx": "TX1", "algo_tx_status": "pending"},
+        {"sha256_hash": "01", "algo_tx": "TX2", "algo_tx_status": "confirmed",
+         "app_tx": "TX3", "app_tx_status": "pending"},
+        {"sha256_hash": "02"},
+    ])
+    seen.clear()
+    yield seen
+    registry._listeners.remove(listener)
+    registry.invalidate()
+
+
+def test_confirmation_from_block_txids(algod):
+    tracker = TxTracker()
+    tracker.track("TX1")
+    tracker.track("TX2")
+    algod.pool["TX1"] = {}
+    algod.blocks[100] = {"TX2"}
+
+    events = tracker._check_round(100, ["TX1", "TX2"])
+
+    assert events == [{"txid": "TX2", "status": "confirmed", "confirmed_round": 100}]
+    # Only the txid not in the block is looked up, on its first check.
+    assert algod.lookups == ["TX1"]
+    algod.lookups.clear()
+    assert tracker._check_round(101, ["TX1"]) == []
+    assert algod.lookups == []
+
+
+def test_pool_rejection_is_noticed_on_the_periodic_recheck(algod):
+    tracker = TxTracker()
+    tracker.track("TX1")
+    algod.pool["TX1"] = {}
+    assert tracker._check_round(100, ["TX1"]) == []
+
+    algod.pool["TX1"] = {"pool-error": "overspend"}
+    for rnd in range(101, 100 + POOL_CHECK_ROUNDS):
+        assert tracker._check_round(rnd, ["TX1"]) == []
+    events = tracker._check_round(100 + POOL_CHECK_ROUNDS, ["TX1"])
+    assert events == [{"txid": "TX1", "status": "failed", "confirmed_round": None, "error": "overspend"}]
+
+
+def test_expires_after_last_valid_round(algod):
+    tracker = TxTracker()
+    tracker.track("TX1", last_valid=101)
+    assert tracker._check_round(101, ["TX1"]) == []
+    assert tracker._check_round(102, ["TX1"]) == [{"txid": "TX1", "status": "expired", "confirmed_round": None}]
+
+
+def test_resolve_moves_txid_from_pending_to_results():
+    tracker = TxTracker()
+    tracker.track("TX1")
+    assert tracker.status("TX1") == {"status": "pending", "confirmed_round": None}
+    tracker.resolve("TX1", {"status": "confirmed", "confirmed_round": 7})
+    assert tracker.status("TX1") == {"status": "confirmed", "confirmed_round": 7}
+    assert tracker.stats()["pending"] == 0
+
+
+def test_apply_to_registry_is_an_in_place_update(media):
+    generation = registry.snapshot().generation
+    TxTracker()._apply_to_registry([{"txid": "TX3", "status": "confirmed", "confirmed_round": 42}])
+
+    assert [(event, generation_seen) for event, _, generation_seen in media] == [("update", generation)]
+    (old, new), = media[0][1]
+    assert old["app_tx_status"] == "pending"
+    assert new["app_tx_status"] == "confirmed" and new["app_tx_confirmed_round"] == 42
+    assert registry.snapshot().records[1] is new
+
+
+def test_seed_from_registry_tracks_pending_txids(media):
+    tracker = TxTracker()
+    tracker.resolve("TX3", {"status": "confirmed", "confirmed_round": 42})
+    assert tracker._seed_from_registry() == 1
+    assert tracker.stats()["pending"] == 1
+    assert tracker.status("TX1") == {"status": "pending", "confirmed_round": None}
+    assert tracker.status("TX2") is None